@@ -1,14 +1,27 @@
 import os
-import json
-import msvcrt
+import queue
+import shlex
+import threading
 import time
-import subprocess
-from datetime import datetime
 from typing import Callable, List, Optional, Dict, Tuple, Any, Union, Set
+from bisect import bisect_left
 from functools import partial
 
-ESCAPE: bytes = b'\x1b'
-BACKSPACE: bytes = b'\x08'
+from adb_core import ADBCore
+from apk_deploy import DEPLOY_DIRECTIVE, parse_deploy
+from command_stream import OutputBuffer
+from connection import ConnectionResult, poll_until
+from command_catalog import CatalogError, CommandGroup
+from command_plan import PlanError, parse_plan
+from device_info import DeviceInfo
+from execution import SKIPPED_EXIT_CODE, CancelToken
+from list_index import SearchIndex
+from logcat_capture import LogQuery
+from provisioning import DEFAULT_NAME_TEMPLATE, NAME_FIELDS, ProvisionResult
+from tracing import BUCKETS_MS, TRACE_ENV, Tracer, busy_time, command_key, get_tracer
+from terminal import (ANSI_PATTERN, BACKSPACE, ENTER, ESCAPE, EXTENDED, InputBackend, Screen, clear_screen,
+                      enable_vt_mode, get_input_backend, get_screen, visible_width)
+
 TERM_STYLES: Dict[str, str] = {
     'RESET': '\033[0m',
     'BOLD': '\033[1m',
@@ -18,8 +31,6 @@ TERM_STYLES: Dict[str, str] = {
     'WHITE': '\033[97m'
 }
 
-os.system('')
-
 class Menu:
     def __init__(
         self,
@@ -28,218 +39,520 @@ class Menu:
         on_select: Optional[Callable[[int], None]] = None,
         on_delete: Optional[Callable[[int], None]] = None,
         on_quit: Optional[Callable[[], None]] = None,
-        non_deletable_indices: List[int] = []
+        non_deletable_indices: List[int] = [],
+        multi_select: bool = False,
+        max_output_lines: int = 2000,
+        input_backend: Optional[InputBackend] = None,
+        screen: Optional[Screen] = None,
+        tracer: Optional[Tracer] = None
     ) -> None:
-        self.items: List[str] = items
         self.title: str = title
         self.on_select: Optional[Callable[[int], None]] = on_select
         self.on_delete: Optional[Callable[[int], None]] = on_delete
         self.on_quit: Optional[Callable[[], None]] = on_quit
-        self.current: int = 0
-        self.last_command_output: str = ""
+        self.query: str = ""
+        self.searching: bool = False
+        self.top: int = 0
+        self._cursor: int = 0
+        self._visible: List[int] = []
+        self._index: Optional[SearchIndex] = None
+        self.tracer: Tracer = tracer or get_tracer()
+        self.items = items
+        self.output: OutputBuffer = OutputBuffer(max_output_lines)
+        self.output_pane_ratio: float = 0.4
+        self.repaint_interval: float = 0.05
+        self._last_paint: float = 0.0
+        self._page_size: int = 1
+        self._posted: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self._pending_output: List[str] = []
+        self._output_lock = threading.Lock()
+        self.task: Optional[threading.Thread] = None
+        self.task_token: Optional[CancelToken] = None
+        self.task_started: float = 0.0
+        self.progress_interval: float = 0.5
         self.pending_delete: Optional[int] = None
         self.running: bool = True
         self.non_deletable_indices: List[int] = non_deletable_indices or []
+        self.multi_select: bool = multi_select
+        self.selected: Set[int] = set()
+        self.input: InputBackend = input_backend or get_input_backend()
+        self.screen: Screen = screen or get_screen()
         
         self.key_handlers: Dict[bytes, Callable[[], None]] = {
-            b'\xe0': self._handle_extended_key,
             b'w': lambda: self._move_cursor(-1),
             b'W': lambda: self._move_cursor(-1),
             b's': lambda: self._move_cursor(1),
             b'S': lambda: self._move_cursor(1),
-            b'\r': self._handle_select,
-            b'\n': self._handle_select,
+            b'\r': self._handle_confirm,
+            b'\n': self._handle_confirm,
             b'\x20': self._handle_select,
             b' ': self._handle_select,
             b'd': self._handle_select,
             b'D': self._handle_select,
+            b'/': self._start_search,
+            b'o': self._browse_output,
+            b'O': self._browse_output,
             b'q': self._handle_quit,
             b'a': self._handle_quit,
             b'A': self._handle_quit,
-            ESCAPE: self._handle_quit,
+            ESCAPE: self._handle_escape,
             BACKSPACE: self._handle_delete
         }
+        if multi_select:
+            self.key_handlers[b'*'] = self._toggle_all
+
+    @property
+    def items(self) -> List[str]:
+        return self._items
+
+    @items.setter
+    def items(self, items: List[str]) -> None:
+        self._items: List[str] = items
+        self._items_changed()
+
+    def _items_changed(self) -> None:
+        current = self.current
+        self._index = None
+        self._apply_filter()
+        if current >= 0:
+            self._cursor = min(bisect_left(self._visible, current), max(0, len(self._visible) - 1))
+
+    @property
+    def current(self) -> int:
+        return self._visible[self._cursor] if self._visible else -1
+
+    @current.setter
+    def current(self, idx: int) -> None:
+        position = bisect_left(self._visible, idx)
+        if position == len(self._visible) or self._visible[position] != idx:
+            if not self.query or not 0 <= idx < len(self._items):
+                self._cursor = max(0, min(position, len(self._visible) - 1))
+                return
+            self.query = ""
+            self._apply_filter()
+            position = idx
+        self._cursor = position
+
+    def _apply_filter(self) -> None:
+        with self.tracer.span('ui', 'filter'):
+            self._filter()
+
+    def _filter(self) -> None:
+        if not self.query:
+            self._visible = list(range(len(self._items)))
+        else:
+            if self._index is None:
+                self._index = SearchIndex(self._items)
+            self._visible = self._index.search(self.query)
+        self._cursor = min(self._cursor, max(0, len(self._visible) - 1))
+
+    def _set_query(self, query: str) -> None:
+        current = self.current
+        self.query = query
+        self._apply_filter()
+        if current >= 0:
+            self._cursor = min(bisect_left(self._visible, current), max(0, len(self._visible) - 1))
+        self.top = 0
+        self.pending_delete = None
+        self._render()
+
+    @property
+    def last_command_output(self) -> str:
+        return self.output.text()
+
+    @last_command_output.setter
+    def last_command_output(self, text: str) -> None:
+        self.output.clear()
+        self.output.write(text)
+
+    def post(self, callback: Callable[[], None]) -> None:
+        self._posted.put(callback)
+        self.input.wake()
+
+    def _run_posted(self) -> None:
+        while True:
+            try:
+                callback = self._posted.get_nowait()
+            except queue.Empty:
+                return
+            callback()
+
+    def append_output(self, text: str) -> None:
+        self.output.write(text)
+        if time.monotonic() - self._last_paint >= self.repaint_interval:
+            self._render()
+
+    def post_output(self, text: str) -> None:
+        with self._output_lock:
+            self._pending_output.append(text)
+            if len(self._pending_output) > 1:
+                return
+        self.post(self._flush_output)
+
+    def _flush_output(self) -> None:
+        with self._output_lock:
+            text = "".join(self._pending_output)
+            self._pending_output.clear()
+        self.append_output(text)
+
+    @property
+    def busy(self) -> bool:
+        return self.task is not None
+
+    def run_task(
+        self,
+        work: Callable[[CancelToken], Any],
+        on_done: Optional[Callable[[Any], None]] = None,
+        timeout: Optional[float] = None
+    ) -> bool:
+        if self.busy:
+            return False
+        token = CancelToken(timeout)
+
+        def target() -> None:
+            result, error = None, None
+            with self.tracer.span('ui', 'task') as span:
+                try:
+                    result = work(token)
+                    span.code = 0
+                except Exception as e:
+                    error = e
+                    span.code = 1
+            self.post(partial(self._finish_task, token, result, error, on_done))
+
+        self.task_token = token
+        self.task_started = time.monotonic()
+        self.task = threading.Thread(target=target, name="menu-task", daemon=True)
+        self.task.start()
+        self._render()
+        return True
+
+    def _finish_task(
+        self,
+        token: CancelToken,
+        result: Any,
+        error: Optional[Exception],
+        on_done: Optional[Callable[[Any], None]]
+    ) -> None:
+        token.dispose()
+        self.task = None
+        self.task_token = None
+        self._flush_output()
+        if error is not None:
+            self.append_output(f"{TERM_STYLES['RED']}{error}{TERM_STYLES['RESET']}\n")
+        elif on_done:
+            on_done(result)
+        self._render()
+
+    def cancel_task(self, wait: float = 0.0) -> None:
+        task, token = self.task, self.task_token
+        if task is None or token is None:
+            return
+        if not token.cancelled:
+            token.cancel()
+            self.append_output(f"{TERM_STYLES['YELLOW']}Cancelling...{TERM_STYLES['RESET']}\n")
+        if wait:
+            task.join(wait)
+
+    def _output_lines(self, columns: int, budget: int) -> List[str]:
+        if not self.output or budget <= 0:
+            return []
+        lines = self.output.text().split('\n')
+        tail: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            height = max(1, -(-visible_width(line) // columns))
+            if used + height > budget - 1 and len(tail) < len(lines):
+                break
+            tail.append(line)
+            used += height
+        tail.reverse()
+        hidden = len(lines) - len(tail)
+        if hidden:
+            tail.insert(0, f"{TERM_STYLES['YELLOW']}... {hidden} earlier lines (o to browse){TERM_STYLES['RESET']}")
+        return tail
+
+    def _fit(self, item: str, width: int) -> str:
+        if len(item) <= width or '\033' in item:
+            return item
+        return item[:max(1, width - 1)] + '…'
 
     def _render(self) -> None:
-        os.system('cls' if os.name == 'nt' else 'clear')
-        tooltip = " (esc·QA·← | ↑↓·WS | Enter·Space·→)"
-        print(f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}{self.title}{TERM_STYLES['RESET']}{tooltip}\n")
+        with self.tracer.span('ui', 'render'):
+            self._paint()
+
+    def _paint(self) -> None:
+        self._last_paint = time.monotonic()
+        columns, rows = self.screen.size()
+        columns = max(columns, 20)
+        if self.multi_select:
+            tooltip = f" (esc·QA·← | ↑↓·WS | Space·→ toggle | * all | / find | Enter run) [{len(self.selected)} selected]"
+        else:
+            tooltip = " (esc·QA·← | ↑↓·WS | PgUp/PgDn | / find | Enter·Space·→)"
+        if self.busy:
+            tooltip += (f" {TERM_STYLES['YELLOW']}[running {time.monotonic() - self.task_started:.0f}s · "
+                        f"esc cancel]{TERM_STYLES['RESET']}")
+        
+        output = self._output_lines(columns, int(rows * self.output_pane_ratio)) if self.output else []
+        height = max(1, rows - 4 - len(output) - (1 if self.query or self.searching else 0))
+        self._page_size = height
+        if self._cursor < self.top:
+            self.top = self._cursor
+        elif self._cursor >= self.top + height:
+            self.top = self._cursor - height + 1
+        self.top = max(0, min(self.top, len(self._visible) - height))
+        window = self._visible[self.top:self.top + height]
+
+        position = ""
+        if len(self._visible) > height or self.query:
+            position = f" [{self.top + 1}-{self.top + len(window)}/{len(self._visible)}]" if window else " [0/0]"
+            if self.query:
+                position += f" of {len(self._items)}"
+        lines: List[str] = [f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}{self.title}{TERM_STYLES['RESET']}{tooltip}{position}", ""]
+        if self.query or self.searching:
+            cursor = '_' if self.searching else ''
+            lines.insert(1, f"{TERM_STYLES['WHITE']}/{self.query}{cursor}{TERM_STYLES['RESET']}")
         
-        for idx, item in enumerate(self.items):
-            prefix = '→ ' if idx == self.current else '  '
+        width = columns - (8 if self.multi_select else 4)
+        current = self.current
+        for idx in window:
+            prefix = '→ ' if idx == current else '  '
+            if self.multi_select:
+                prefix += '[x] ' if idx in self.selected else '[ ] '
             style = ''
-            if idx == self.current:
+            if idx == current:
                 style = TERM_STYLES['RED' if self.pending_delete == idx and self.on_delete and 
                                     idx not in self.non_deletable_indices else 'GREEN'] + TERM_STYLES['BOLD']
-            print(f"{style}{prefix}{item}{TERM_STYLES['RESET']}")
+            lines.append(f"{style}{prefix}{self._fit(self._items[idx], width)}{TERM_STYLES['RESET']}")
+        if not window and self.query:
+            lines.append(f"  {TERM_STYLES['RED']}No matches{TERM_STYLES['RESET']}")
             
-        if self.last_command_output:
-            print("\n" + self.last_command_output)
-        else:
-            print()
+        lines.append("")
+        lines.extend(output)
+        self.screen.render(lines)
     
     def refresh(self) -> None:
+        self.screen.invalidate()
+        self._render()
+
+    def redraw(self) -> None:
         self._render()
         
     def _move_cursor(self, direction: int) -> None:
-        self.current = (self.current + direction) % len(self.items)
+        if not self._visible:
+            return
+        self._cursor = (self._cursor + direction) % len(self._visible)
         self.pending_delete = None
         self._render()
+
+    def _jump(self, position: int) -> None:
+        if not self._visible:
+            return
+        self._cursor = max(0, min(position, len(self._visible) - 1))
+        self.pending_delete = None
+        self._render()
+
+    def _page(self, direction: int) -> None:
+        self.top += direction * self._page_size
+        self._jump(self._cursor + direction * self._page_size)
         
-    def _handle_extended_key(self) -> None:
+    def _handle_extended_key(self, extended_key: bytes) -> None:
         key_map: Dict[bytes, Callable[[], None]] = {
             b'H': partial(self._move_cursor, -1),
             b'P': partial(self._move_cursor, 1),
             b'M': self._handle_select,
             b'K': self._handle_quit,
-            b'I': partial(self._move_cursor, -1),
-            b'Q': partial(self._move_cursor, 1),
+            b'I': partial(self._page, -1),
+            b'Q': partial(self._page, 1),
+            b'G': partial(self._jump, 0),
+            b'O': lambda: self._jump(len(self._visible) - 1),
             b'S': self._handle_delete
         }
         
-        extended_key: bytes = msvcrt.getch()
         if extended_key in key_map:
             key_map[extended_key]()
+
+    def _start_search(self) -> None:
+        self.searching = True
+        self.screen.invalidate()
+        self._render()
+
+    def _handle_search_key(self, key: bytes) -> None:
+        if key == ESCAPE:
+            self.searching = False
+            self._set_query("")
+        elif key in (ENTER, b'\n'):
+            self.searching = False
+            self._render()
+        elif key == BACKSPACE:
+            if self.query:
+                self._set_query(self.query[:-1])
+            else:
+                self.searching = False
+                self._render()
+        else:
+            try:
+                char = key.decode('utf-8')
+            except UnicodeDecodeError:
+                return
+            if char.isprintable():
+                self._set_query(self.query + char)
+
+    def _handle_escape(self) -> None:
+        if self.busy:
+            self.cancel_task()
+            self._render()
+        elif self.query:
+            self._set_query("")
+        else:
+            self._handle_quit()
+
+    def _browse_output(self) -> None:
+        if not self.output:
+            return
+        viewer = Menu(ANSI_PATTERN.sub('', self.output.text()).split('\n'), title=f"{self.title} · output",
+                      input_backend=self.input, screen=self.screen)
+        viewer.current = len(viewer.items) - 1
+        viewer.start()
+        self.refresh()
         
     def _handle_select(self) -> None:
-        if self.on_select:
+        if not self._visible or (self.busy and not self.multi_select):
+            return
+        if self.multi_select:
+            self.selected ^= {self.current}
+        elif self.on_select:
             self.on_select(self.current)
+            self.screen.invalidate()
         self.pending_delete = None
         self._render()
+
+    def _handle_confirm(self) -> None:
+        if not self.multi_select:
+            self._handle_select()
+        elif self.selected:
+            self.running = False
+
+    def _toggle_all(self) -> None:
+        visible = set(self._visible)
+        if visible <= self.selected:
+            self.selected -= visible
+        else:
+            self.selected |= visible
+        self._render()
         
     def _handle_delete(self) -> None:
-        if self.current in self.non_deletable_indices:
+        current = self.current
+        if current < 0 or current in self.non_deletable_indices:
             self.pending_delete = None
-        elif self.pending_delete == self.current and self.on_delete:
-            self.on_delete(self.current)
-            if self.items:
-                del self.items[self.current]
-                self.current = min(self.current, len(self.items) - 1)
+        elif self.pending_delete == current and self.on_delete:
+            self.on_delete(current)
+            self.screen.invalidate()
+            if self._items:
+                del self._items[current]
+                self._items_changed()
             self.pending_delete = None
         elif self.on_delete:
-            self.pending_delete = self.current
+            self.pending_delete = current
         self._render()
         
     def _handle_quit(self) -> None:
+        self.cancel_task(wait=2.0)
         if self.on_quit:
             self.on_quit()
+        self.selected.clear()
         self.running = False
 
     def start(self) -> None:
+        self.screen.invalidate()
         self._render()
         
         while self.running:
-            if msvcrt.kbhit():
-                key = msvcrt.getch()
-                handler: Optional[Callable[[], None]] = self.key_handlers.get(key)
-                if handler:
-                    handler()
-                elif key.lower() in [b'q', ESCAPE]:
-                    self._handle_quit()
-            time.sleep(0.01)
+            self._run_posted()
+            if not self.running:
+                break
+            key = self.input.read_key(self.progress_interval if self.busy else None)
+            if key is None:
+                if self.busy:
+                    self._render()
+                continue
+            if len(key) == 2 and key.startswith(EXTENDED):
+                self._handle_extended_key(key[1:])
+                continue
+            if self.searching:
+                self._handle_search_key(key)
+                continue
+            handler: Optional[Callable[[], None]] = self.key_handlers.get(key)
+            if handler:
+                handler()
+            elif key.lower() in [b'q', ESCAPE]:
+                self._handle_quit()
 
 
-class ADBTool:
+class ADBTool(ADBCore):
     def __init__(self) -> None:
-        self.devices_dir = './config/devices'
-        self.commands_file = './config/commands.conf'
-        self.adb_path = './bin/adb.exe' if os.name == 'nt' else 'adb'
-        self.current_device: Optional[str] = None
+        super().__init__('./config')
+        self.output_lines: int = 2000
+        self.group_timeout: Optional[float] = None
         
         os.makedirs(self.devices_dir, exist_ok=True)
         self.run_adb_command('disconnect')
 
-    def run_adb_command(self, command: str) -> Tuple[str, int]:
-        cmd = [self.adb_path]
-        
-        if self.current_device and not command.startswith(('connect', 'disconnect')):
-            cmd.extend(['-s', self.current_device])
-        
-        cmd.extend(command.split())
-        
-        try:
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            return result.stdout, result.returncode
-        except Exception as e:
-            return str(e), 1
-
-    def get_device_files(self) -> List[str]:
-        if not os.path.exists(self.devices_dir):
-            return []
-        files = [
-            (f, os.path.getmtime(os.path.join(self.devices_dir, f)))
-            for f in os.listdir(self.devices_dir)
-            if f.endswith('.json')
-        ]
-        return [os.path.join(self.devices_dir, f[0]) for f in sorted(files, key=lambda x: x[1], reverse=True)]
-
-    def load_device(self, path: str) -> Optional[Dict[str, str]]:
-        try:
-            with open(path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"{TERM_STYLES['RED']}Error loading device file {path}: {str(e)}{TERM_STYLES['RESET']}")
-            return None
+    def load_devices(self) -> List[Dict[str, str]]:
+        devices = self.registry.devices()
+        for error in self.registry.errors:
+            print(f"{TERM_STYLES['RED']}{error}{TERM_STYLES['RESET']}")
+        self.registry.errors.clear()
+        return devices
 
     def save_device(self, name: str, ip: str, port: str, serial: str) -> bool:
-        path = os.path.join(self.devices_dir, f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
         try:
-            with open(path, 'w') as f:
-                json.dump({"name": name, "serial": serial, "ip": ip, "port": port}, f)
+            self.registry.add(name, ip, port, serial)
             return True
         except Exception as e:
             print(f"{TERM_STYLES['RED']}Error saving device: {str(e)}{TERM_STYLES['RESET']}")
             return False
 
-    def get_available_usb_devices(self) -> List[str]:
-        output, _ = self.run_adb_command("devices")
-        return [l.split()[0] for l in output.splitlines()[1:] if 'device' in l]
-
-    def get_device_ip(self, device_id: str) -> Optional[str]:
-        out, code = self.run_adb_command(f"-s {device_id} shell ip route")
-        if code == 0:
-            import re
-            match = re.search(r'src (\d+\.\d+\.\d+\.\d+)', out)
-            return match.group(1) if match else None
-        return None
-
-    def connect_to_device(self, ip: str, port: str) -> bool:
-        device_id = f"{ip}:{port}"
-        out, code = self.run_adb_command(f"connect {device_id}")
-        if code == 0 and 'connected' in out.lower():
-            self.current_device = device_id
-            return True
-        return False
+    def device_label(self, data: Dict[str, str]) -> str:
+        state = self.device_state(data)
+        return f"{data['name']} ({data['ip']}:{data['port']})" + (f" [{state}]" if state else "")
 
     def read_user_input(self, prompt: str = "", allowed_keys: Optional[List[bytes]] = None, hide_input: bool = False) -> Optional[str]:
         print(prompt, end="", flush=True)
         result = ""
+        backend = get_input_backend()
         
         while True:
-            if msvcrt.kbhit():
-                key = msvcrt.getch()
-                
-                if key == ESCAPE:
-                    return None
-                elif key in [b'\r', b'\n']:
-                    print()
-                    return result
-                elif key == BACKSPACE:
-                    if result:
-                        result = result[:-1]
-                        print("\b \b", end="", flush=True)
-                elif not allowed_keys or key in allowed_keys or key.isalnum():
-                    try:
-                        char = key.decode('utf-8', errors='ignore')
-                        result += char
-                        if not hide_input:
-                            print(char, end="", flush=True)
-                        else:
-                            print("*", end="", flush=True)
-                    except:
-                        pass
+            key = backend.read_key()
+            if key is None or (len(key) == 2 and key.startswith(EXTENDED)):
+                continue
             
-            time.sleep(0.01)
+            if key == ESCAPE:
+                return None
+            elif key in [ENTER, b'\n']:
+                print()
+                return result
+            elif key == BACKSPACE:
+                if result:
+                    result = result[:-1]
+                    print("\b \b", end="", flush=True)
+            elif not allowed_keys or key in allowed_keys or key.isalnum():
+                try:
+                    char = key.decode('utf-8', errors='ignore')
+                    result += char
+                    if not hide_input:
+                        print(char, end="", flush=True)
+                    else:
+                        print("*", end="", flush=True)
+                except:
+                    pass
+
+    def pause(self, prompt: str = "Press Enter to continue...") -> None:
+        print(prompt, end="", flush=True)
+        backend = get_input_backend()
+        while backend.read_key() not in (ENTER, b'\n', ESCAPE):
+            pass
+        print()
 
     def display_message(self, message: str, color: str = 'GREEN', wait: float = 1.0) -> None:
         print(f"{TERM_STYLES[color]}{message}{TERM_STYLES['RESET']}")
@@ -248,235 +561,372 @@ class ADBTool:
 
     def device_menu(self) -> None:
         def build_items() -> Tuple[List[str], Dict[str, str]]:
-            files = self.get_device_files()
             items = []
-            file_map: Dict[str, str] = {}
-            for path in files:
-                data = self.load_device(path)
-                if data:
-                    label = f"{data['name']} ({data['ip']}:{data['port']})"
-                else:
-                    label = f"Broken: {os.path.basename(path)}"
+            name_map: Dict[str, str] = {}
+            for data in self.load_devices():
+                label = self.device_label(data)
                 items.append(label)
-                file_map[label] = path
+                name_map[label] = data['name']
             items.append("[+] Register new device")
+            items.append("[*] Run command group on multiple devices")
+            items.append("[⏱] Timing statistics")
             items.append("[-] Disconnect all devices")
-            return items, file_map
+            return items, name_map
 
         def on_select(idx: int) -> None:
-            if idx == len(menu.items) - 2:
+            if idx == len(menu.items) - 4:
                 self.register_device()
-                new_items, new_file_map = build_items()
+                new_items, new_name_map = build_items()
                 menu.items = new_items
-                nonlocal file_map
-                file_map = new_file_map
+                nonlocal name_map
+                name_map = new_name_map
                 menu.current = 0
                 menu.refresh()
                 return
+            elif idx == len(menu.items) - 3:
+                self.fleet_menu()
+                menu.refresh()
+                return
+            elif idx == len(menu.items) - 2:
+                self.stats_menu()
+                menu.refresh()
+                return
             elif idx == len(menu.items) - 1:
                 self.display_message("\nDisconnecting all devices...", 'YELLOW')
-                self.run_adb_command('disconnect')
+                self.disconnect_all()
                 self.display_message("All devices disconnected.", 'GREEN')
                 menu.refresh()
                 return
 
             selected_label = menu.items[idx]
-            if selected_label in file_map:
-                self._handle_device_connection(file_map[selected_label])
-                menu.refresh()
+            data = self.registry.get(name_map.get(selected_label, ''))
+            if data:
+                self._handle_device_connection(data, menu)
 
         def on_delete(idx: int) -> None:
-            if idx < len(menu.items) - 2:
+            if idx < len(menu.items) - 4:
                 selected_label = menu.items[idx]
-                if selected_label in file_map:
+                if selected_label in name_map:
                     try:
-                        os.remove(file_map[selected_label])
+                        self.registry.remove(name_map[selected_label])
                     except Exception as e:
-                        self.display_message(f"\nError deleting file: {str(e)}", 'RED')
+                        self.display_message(f"\nError deleting device: {str(e)}", 'RED')
 
         def on_quit() -> None:
-            self.run_adb_command('disconnect')
+            self.disconnect_all()
 
-        items, file_map = build_items()
+        def refresh_states() -> None:
+            nonlocal name_map
+            new_items, name_map = build_items()
+            if new_items != menu.items:
+                menu.items = new_items
+                menu.current = min(menu.current, len(new_items) - 1)
+                menu.redraw()
+
+        items, name_map = build_items()
         menu: Menu = Menu(
             items=items, 
             title="ADB Device Manager", 
             on_select=on_select, 
             on_delete=on_delete,
             on_quit=on_quit,
-            non_deletable_indices=[len(items) - 2, len(items) - 1])
+            non_deletable_indices=[len(items) - 4, len(items) - 3, len(items) - 2, len(items) - 1])
+        listener = lambda: menu.post(refresh_states)
+        self.device_listeners.append(listener)
+        self.watcher.start()
+        try:
+            menu.start()
+        finally:
+            self.device_listeners.remove(listener)
+            self.watcher.stop()
+
+    def fleet_menu(self) -> None:
+        devices = self.load_devices()
+        if not devices:
+            self.display_message("\nNo registered devices.", 'YELLOW')
+            return
+
+        selector: Menu = Menu(
+            items=[self.device_label(data) for data in devices],
+            title="Select Devices",
+            multi_select=True)
+        selector.start()
+        if not selector.selected:
+            return
+        targets = [devices[idx] for idx in sorted(selector.selected)]
+        commands = self.load_commands()
+
+        def run_on_targets(name: str, lines: List[str]) -> None:
+            parameters = self.prompt_parameters(name, lines)
+            menu.refresh()
+            if parameters is None:
+                return
+            menu.last_command_output = (f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Executing: {name} "
+                                        f"on {len(targets)} devices{TERM_STYLES['RESET']}\n")
+            menu.refresh()
+            started = time.monotonic()
+            succeeded = 0
+
+            def on_result(data: Dict[str, str], results: List[Tuple[str, int]], elapsed: float) -> None:
+                nonlocal succeeded
+                code = next((code for _, code in results if code != 0), 0)
+                if code == 0:
+                    succeeded += 1
+                    header = f"{TERM_STYLES['GREEN']}✓ {data['name']} ({elapsed:.1f}s){TERM_STYLES['RESET']}"
+                else:
+                    header = f"{TERM_STYLES['RED']}✗ {data['name']} ({elapsed:.1f}s) Error (code {code}){TERM_STYLES['RESET']}"
+                body = "".join(out for out, _ in results).rstrip('\n')
+                menu.post_output(header + "\n" + "".join(f"    {line}\n" for line in body.splitlines()))
+
+            def work(token: CancelToken) -> None:
+                self.run_group_on_devices(lines, targets, max_workers=self.fleet_workers,
+                                          on_result=on_result, token=token, parameters=parameters)
+
+            def done(_: None) -> None:
+                color = 'GREEN' if succeeded == len(targets) else 'RED'
+                menu.append_output(f"\n{TERM_STYLES[color] + TERM_STYLES['BOLD']}{succeeded}/{len(targets)} devices "
+                                   f"succeeded in {time.monotonic() - started:.1f}s{TERM_STYLES['RESET']}\n")
+
+            menu.run_task(work, done, timeout=self.group_timeout)
+
+        def on_select(idx: int) -> None:
+            if idx == len(commands):
+                line = self.prompt_deploy()
+                menu.refresh()
+                if line:
+                    run_on_targets(line, [line])
+                return
+            run_on_targets(commands[idx].name, list(commands[idx].commands))
+
+        menu: Menu = Menu(
+            items=[group.name for group in commands] + ["[⇪] Deploy APKs"],
+            title=f"ADB Commands ({len(targets)} devices)",
+            on_select=on_select,
+            max_output_lines=self.output_lines)
         menu.start()
 
-    def _handle_device_connection(self, device_path: str) -> None:
-        data: Optional[Dict[str, str]] = self.load_device(device_path)
+    def prompt_deploy(self) -> Optional[str]:
+        clear_screen()
+        print(f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Deploy APKs{TERM_STYLES['RESET']}\n")
+        print(" - Enter APK files or directories of APKs, separated by spaces (quote paths with spaces).")
+        print(" - Packages whose installed versionCode already matches are skipped; add --force to reinstall.")
+        print(" - Packages with a newer version on the device are skipped; add --allow-downgrade to roll them back.")
+        print(f" - Add '{DEPLOY_DIRECTIVE} <path>...' to a command group to reuse a deployment.")
+        print("Press ESC to cancel at any time.\n")
+
+        while True:
+            text = self.read_user_input("APK paths: ")
+            if not text or not text.strip():
+                return None
+            line = f"{DEPLOY_DIRECTIVE} {text.strip()}"
+            if parse_deploy(line):
+                return line
+            self.display_message("Please enter at least one path (check the quoting).", 'RED')
+
+    def _handle_device_connection(self, data: Optional[Dict[str, str]], menu: Menu) -> None:
         if not data:
             self.display_message("\nInvalid device data!", 'RED')
             return
-            
-        connected: bool = self.connect_to_device(data['ip'], data['port'])
-        
-        if not connected:
-            self.display_message(f"\nAttempting wireless reconnection to {data['name']}...", 'YELLOW')
-            self.run_adb_command('disconnect')
-            time.sleep(1)
-            connected = self.connect_to_device(data['ip'], data['port'])
-        
-        if not connected:
-            usb_devices = self.get_available_usb_devices()
-            device_serial = next(
-                (dev for dev in usb_devices if data.get('serial') == self.run_adb_command(f"-s {dev} get-serialno")[0].strip()), None)
-                
-            if device_serial:
-                self.display_message(f"Re-enabling tcpip over USB for {data['name']}...", 'YELLOW')
-                self.run_adb_command(f"-s {device_serial} tcpip {data['port']}")
-                time.sleep(2)
-                connected = self.connect_to_device(data['ip'], data['port'])
-                
-                if not connected:
-                    self.display_message(f"\nFailed to connect to {data['name']} after re-enabling USB tcpip.", 'RED')
-            else:
-                self.display_message(f"\nDevice {data['name']} not found via USB. Please ensure it's plugged in and try again.", 'RED')
-        
-        if connected:
+
+        menu.last_command_output = f"{TERM_STYLES['YELLOW']}Connecting to {data['name']}...{TERM_STYLES['RESET']}\n"
+        menu.refresh()
+
+        def on_status(message: str, color: str) -> None:
+            menu.post_output(f"{TERM_STYLES[color]}{message}{TERM_STYLES['RESET']}\n")
+
+        def work(token: CancelToken) -> ConnectionResult:
+            return self.connector.connect(data, on_status, stop=lambda: token.cancelled)
+
+        def done(result: ConnectionResult) -> None:
+            self.last_connection = result
+            if not result.connected:
+                menu.append_output(f"{TERM_STYLES['RED']}{result.message}{TERM_STYLES['RESET']}\n")
+                return
+            menu.last_command_output = ""
+            self.current_device = result.device_id
             self.command_menu()
+            menu.refresh()
+
+        menu.run_task(work, done)
 
     def register_device(self) -> None:
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_screen()
         print(f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Registering new device...{TERM_STYLES['RESET']}\n")
         print("Press ESC to cancel")
-        self.run_adb_command("usb")
-        time.sleep(2)
+        if self.run_adb_command("usb")[1] == 0:
+            poll_until(lambda: any(d.online and d.transport == 'usb' for d in self.enumerate_devices()), 2.0)
 
-        known_devices: Dict[str, Dict[str, str]] = {}
-        for path in self.get_device_files():
-            data = self.load_device(path)
-            if data:
-                if 'serial' in data:
-                    known_devices[data['serial']] = data
-                if 'ip' in data and 'port' in data:
-                    known_devices[f"{data['ip']}:{data['port']}"] = data
-
-        available_usb_devices = [device for device in self.get_available_usb_devices() if ':' not in device]
-        unregistered_usb_devices: List[str] = []
-
-        for device_id in available_usb_devices:
-            serial = self.run_adb_command(f"-s {device_id} get-serialno")[0].strip()
-            if device_id not in known_devices and serial not in known_devices:
-                unregistered_usb_devices.append(device_id)
+        unregistered_usb_devices: List[DeviceInfo] = self.unregistered_usb_devices()
         
         if not unregistered_usb_devices:
             self.display_message("No new unregistered USB devices found.", 'GREEN')
-            input("Press Enter to continue...")
+            self.pause()
             return
 
         device = unregistered_usb_devices[0] if len(unregistered_usb_devices) == 1 else None
         if not device:
+            provision_all = False
+
             def on_select(idx: int) -> None:
-                nonlocal device
-                device = unregistered_usb_devices[idx]
+                nonlocal device, provision_all
+                if idx == 0:
+                    provision_all = True
+                else:
+                    device = unregistered_usb_devices[idx - 1]
                 selector.running = False
 
             selector: Menu = Menu(
-                items=unregistered_usb_devices,
+                items=[f"[⇉] Provision all {len(unregistered_usb_devices)} devices"]
+                      + [device.label for device in unregistered_usb_devices],
                 title="Select New USB Device to Register",
                 on_select=on_select)
             selector.start()
 
+            if provision_all:
+                self.provision_devices(unregistered_usb_devices)
+                return
             if not device:
                 return
 
-        ip = self.get_device_ip(device)
+        serial = device.serial
+        ip = self.get_device_ip(serial)
         if not ip:
-            self.display_message(f"Unable to get IP address for {device}. Ensure USB debugging is enabled.", 'RED')
-            input("Press Enter to continue...")
-            return
-
-        serial = self.run_adb_command(f"-s {device} get-serialno")[0].strip()
-        if not serial:
-            self.display_message(f"Could not retrieve serial number for {device}.", 'RED')
-            input("Press Enter to continue...")
+            self.display_message(f"Unable to get IP address for {serial}. Ensure USB debugging is enabled.", 'RED')
+            self.pause()
             return
 
         name = self.read_user_input(
             "Device name (press ESC to cancel): ", allowed_keys=[b' ', b'-', b'_', b'.'])
         if not name:
             self.display_message("\nRegistration cancelled or empty name.", 'RED')
-            input("Press Enter to continue...")
+            self.pause()
             return
 
-        for path in self.get_device_files():
-            data = self.load_device(path)
-            if data and data.get('name') == name:
-                self.display_message(f"\nA device with name '{name}' already exists.", 'RED')
-                input("Press Enter to continue...")
-                return
+        if self.registry.get(name):
+            self.display_message(f"\nA device with name '{name}' already exists.", 'RED')
+            self.pause()
+            return
 
         port = "5555"
-        print(f"Setting up device connection for {name} ({device})...")
-        self.run_adb_command(f"-s {device} tcpip {port}")
-        time.sleep(2)
+        print(f"Setting up device connection for {name} ({serial})...")
+        self.run_adb_command(f"-s {serial} tcpip {port}")
 
         if self.save_device(name, ip, port, serial):
             self.display_message(f"Device {name} registered.", 'GREEN')
-            if self.connect_to_device(ip, port):
+            if poll_until(lambda: self.connect_to_device(ip, port), self.connector.tcpip_timeout, initial_interval=0.1):
                 self.display_message(f"Connected to {name}!", 'GREEN')
         else:
             self.display_message(f"Failed to connect to {name} after registration. Try selecting it from the device list.", 'YELLOW')
 
-        input("Press Enter to continue...")
+        self.pause()
+
+    def provision_devices(self, devices: List[DeviceInfo]) -> None:
+        print(f"\nNames are built from a template using {NAME_FIELDS}.")
+        template = self.read_user_input(f"Name template (Enter for {DEFAULT_NAME_TEMPLATE}): ",
+                                        allowed_keys=[b' ', b'-', b'_', b'.', b'{', b'}', b':'])
+        if template is None:
+            self.display_message("\nProvisioning cancelled.", 'RED')
+            self.pause()
+            return
+
+        print(f"\nProvisioning {len(devices)} devices...")
+        started = time.monotonic()
 
-    def load_commands(self) -> List[str]:
-        if not os.path.exists(self.commands_file):
+        def on_result(result: ProvisionResult) -> None:
+            color = 'GREEN' if result.connected else 'RED' if not result.ip else 'YELLOW'
+            print(f"{TERM_STYLES[color]}  {result.name:<24} {result.serial:<20} {result.ip or '-':<16} "
+                  f"{result.message}{TERM_STYLES['RESET']}")
+
+        try:
+            results = self.provision_usb_devices(devices, template.strip() or DEFAULT_NAME_TEMPLATE, on_result=on_result)
+        except ValueError as e:
+            self.display_message(f"\n{e}", 'RED')
+            self.pause()
+            return
+
+        registered = sum(1 for result in results if result.registered)
+        connected = sum(1 for result in results if result.connected)
+        color = 'GREEN' if registered == len(results) else 'YELLOW'
+        self.display_message(f"\n{registered}/{len(results)} devices registered, {connected} connected over Wi-Fi "
+                             f"in {time.monotonic() - started:.1f}s.", color, wait=0)
+        for result in results:
+            if not result.registered and result.ip:
+                print(f"{TERM_STYLES['RED']}  {result.serial}: {result.message}{TERM_STYLES['RESET']}")
+        self.pause()
+
+    def load_commands(self) -> List[CommandGroup]:
+        try:
+            return self.catalog.groups()
+        except Exception as e:
+            print(f"{TERM_STYLES['RED']}Error loading commands: {str(e)}{TERM_STYLES['RESET']}")
             return []
-        with open(self.commands_file, 'r', encoding='utf-8') as f:
-            groups = f.read().split('\n\n')
-        return [g.strip() for g in groups if g.strip()]
 
     def command_menu(self) -> None:
-        commands = self.load_commands()
-        items = [g.splitlines()[0] for g in commands] if commands else []
-        items.append("[+] Add new command")
+        actions = ["[≡] Logcat capture", "[⇅] Transfer files", "[+] Add new command"]
+
+        def build_items() -> List[str]:
+            return [group.name for group in self.load_commands()] + actions
+
+        def action_indices(count: int) -> List[int]:
+            return list(range(count - len(actions), count))
+
+        def run_lines(name: str, commands: List[str]) -> None:
+            parameters = self.prompt_parameters(name, commands)
+            if parameters is None:
+                menu.refresh()
+                return
+            menu.last_command_output = f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Executing: {name}{TERM_STYLES['RESET']}\n"
+            menu.refresh()
+
+            def work(token: CancelToken) -> List[Tuple[str, int]]:
+                return self.run_command_group(commands, on_output=menu.post_output, token=token, parameters=parameters)
+
+            def done(results: List[Tuple[str, int]]) -> None:
+                for out, code in results:
+                    separator = "\n" if menu.output.partial else ""
+                    if code == SKIPPED_EXIT_CODE:
+                        menu.append_output(f"{separator}{TERM_STYLES['YELLOW']}{out}{TERM_STYLES['RESET']}")
+                    elif code != 0:
+                        menu.append_output(f"{separator}{TERM_STYLES['RED']}Error (code {code}){TERM_STYLES['RESET']}\n{out}")
+
+            menu.run_task(work, done, timeout=self.group_timeout)
 
         def on_select(idx: int) -> None:
-            if idx == len(menu.items) - 1:
+            action = idx - (len(menu.items) - len(actions))
+            if action == 2:
                 self.add_command()
                 
-                commands = self.load_commands()
-                new_items = [g.splitlines()[0] for g in commands] if commands else []
-                new_items.append("[+] Add new command")
-                menu.items = new_items
-                menu.current = len(menu.items) - 2 if len(menu.items) > 1 else 0
+                menu.items = build_items()
+                menu.non_deletable_indices = action_indices(len(menu.items))
+                menu.current = len(menu.items) - len(actions) - 1 if len(menu.items) > len(actions) else 0
+                menu.refresh()
+                return
+
+            if action == 1:
+                request = self.prompt_transfer()
+                menu.refresh()
+                if request:
+                    run_lines(f"{request[0]} {request[1]} -> {request[2]}", [" ".join(shlex.quote(arg) for arg in request)])
+                return
+
+            if action == 0:
+                self.logcat_menu()
                 menu.refresh()
                 return
                 
-            commands = self.load_commands()
-            selected_command: str = commands[idx]
-            menu.last_command_output = f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Executing: {menu.items[idx]}{TERM_STYLES['RESET']}\n"
-            menu.refresh()
-            
-            output: List[str] = []
-            for cmd in selected_command.splitlines()[1:]:
-                if not cmd.strip():
-                    continue
-                out: str
-                code: int
-                out, code = self.run_adb_command(cmd)
-                if code == 0:
-                    output.append(out)
-                else:
-                    output.append(f"{TERM_STYLES['RED']}Error (code {code}):{TERM_STYLES['RESET']}\n{out}")
-                    break
-            
-            menu.last_command_output += "".join(output)
-            menu.refresh()
+            try:
+                group = self.catalog.get(menu.items[idx])
+            except CatalogError as e:
+                menu.last_command_output = f"{TERM_STYLES['RED']}{e}{TERM_STYLES['RESET']}\n"
+                return
+            if group:
+                run_lines(group.name, list(group.commands))
 
         def on_delete(idx: int) -> None:
-            commands = self.load_commands()
-            if idx < len(commands):
+            if idx < len(menu.items) - len(actions):
                 try:
-                    del commands[idx]
-                    with open(self.commands_file, 'w', encoding='utf-8') as f:
-                        f.write('\n\n'.join(commands))
+                    self.catalog.remove(menu.items[idx])
+                    menu.non_deletable_indices = action_indices(len(menu.items) - 1)
                     print(f"\r{TERM_STYLES['RED']}Command removed!{TERM_STYLES['RESET']}", end='')
                     time.sleep(0.75)
                     menu.last_command_output = ""
@@ -488,25 +938,219 @@ class ADBTool:
                     menu.refresh()
         
         def on_quit() -> None:
+            self.close_shell_sessions()
             self.current_device = None
         
-        commands = self.load_commands()
-        items = [g.splitlines()[0] for g in commands] if commands else []
-        items.append("[+] Add new command")
-
+        items = build_items()
         menu: Menu = Menu(
             items=items, 
             title="ADB Commands", 
             on_select=on_select, 
             on_delete=on_delete,
             on_quit=on_quit,
-            non_deletable_indices=[len(items) - 1])
+            non_deletable_indices=action_indices(len(items)),
+            max_output_lines=self.output_lines)
+        menu.start()
+
+    def logcat_menu(self) -> None:
+        if not self.current_device:
+            return
+        capture = self.logcat_capture(self.current_device)
+        following = [False]
+
+        def build_items() -> List[str]:
+            return ["[■] Stop capture" if capture.running else "[●] Start capture",
+                    "[⌕] Search captured log",
+                    "[↓] Stop following" if following[0] else "[↓] Follow live log"]
+
+        def follow(enabled: bool) -> None:
+            if menu.post_output in capture.listeners:
+                capture.listeners.remove(menu.post_output)
+            following[0] = enabled
+            if enabled:
+                menu.last_command_output = capture.tail.text()
+                capture.listeners.append(menu.post_output)
+
+        def search() -> None:
+            clear_screen()
+            print(f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Search Captured Log{TERM_STYLES['RESET']}\n")
+            print(" - Filters: tag:NAME level:W pid:1234 since:12:30 until:12:45 (or since:-10m, since:10-17_12:30).")
+            print(" - Any other words must appear in the line.")
+            print("Press ESC to cancel.\n")
+            text = self.read_user_input("Query: ")
+            menu.refresh()
+            if text is None:
+                return
+            try:
+                query = LogQuery.parse(text)
+            except ValueError as e:
+                menu.last_command_output = f"{TERM_STYLES['RED']}{e}{TERM_STYLES['RESET']}\n"
+                return
+            follow(False)
+            menu.items = build_items()
+            menu.last_command_output = f"{TERM_STYLES['YELLOW']}Searching {capture.directory}...{TERM_STYLES['RESET']}\n"
+
+            def done(lines: List[str]) -> None:
+                header = f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}{len(lines)} matching lines{TERM_STYLES['RESET']}"
+                menu.last_command_output = header + "".join(f"\n{line}" for line in lines) + "\n"
+
+            menu.run_task(lambda token: capture.search(query, limit=self.output_lines), done)
+
+        def on_select(idx: int) -> None:
+            if idx == 0:
+                if capture.running:
+                    capture.stop()
+                    menu.last_command_output = f"{TERM_STYLES['YELLOW']}Capture stopped after {capture.lines} lines.{TERM_STYLES['RESET']}\n"
+                else:
+                    capture.start()
+                    follow(True)
+                    menu.last_command_output = f"{TERM_STYLES['GREEN']}Capturing to {capture.directory}{TERM_STYLES['RESET']}\n"
+            elif idx == 1:
+                search()
+            else:
+                follow(not following[0])
+                if capture.error and not capture.running:
+                    menu.append_output(f"{TERM_STYLES['RED']}{capture.error}{TERM_STYLES['RESET']}\n")
+            menu.items = build_items()
+            menu.refresh()
+
+        menu: Menu = Menu(
+            items=build_items(),
+            title=f"Logcat · {self.current_device}",
+            on_select=on_select,
+            on_quit=lambda: follow(False),
+            max_output_lines=self.output_lines)
+        if capture.running:
+            follow(True)
         menu.start()
 
+    def timing_report(self) -> str:
+        tracer = self.tracer
+
+        def ms(value: float) -> str:
+            if value < 10:
+                return f"{value:.1f}ms"
+            return f"{value:.0f}ms" if value < 1000 else f"{value / 1000:.2f}s"
+
+        if tracer.enabled:
+            state = f"{TERM_STYLES['GREEN']}Recording{TERM_STYLES['RESET']} " + (
+                f"to {tracer.path}" if tracer.path else f"in memory (set {TRACE_ENV} to write a trace file)")
+        else:
+            state = f"{TERM_STYLES['YELLOW']}Not recording{TERM_STYLES['RESET']}"
+        lines = [f"{state} · since {time.strftime('%H:%M:%S', time.localtime(tracer.since))}"]
+        if tracer.error:
+            lines.append(f"{TERM_STYLES['RED']}{tracer.error}{TERM_STYLES['RESET']}")
+
+        connection = tracer.last('connect')
+        if connection:
+            color = 'GREEN' if connection.code == 0 else 'RED'
+            lines += ["", f"{TERM_STYLES['BOLD']}Last connection{TERM_STYLES['RESET']} · {connection.device} "
+                          f"{TERM_STYLES[color]}{ms(connection.duration * 1000)}{TERM_STYLES['RESET']}"]
+            for phase in tracer.children(connection):
+                adb = busy_time(tracer.children(phase)) if phase.kind == 'phase' else phase.duration
+                lines.append(f"  {command_key(phase.name)[:14]:<14}{ms(phase.duration * 1000):>8}   adb {ms(adb * 1000):>7}   "
+                             f"waiting {ms(max(0.0, phase.duration - adb) * 1000):>7}")
+
+        summary = tracer.summary()
+        lines += ["", f"{TERM_STYLES['BOLD']}Latency by command{TERM_STYLES['RESET']} (most total time first, "
+                      f"buckets ≤{' '.join(f'{bound:g}' for bound in BUCKETS_MS)}ms)"]
+        if not summary:
+            lines.append("  No calls recorded yet.")
+        else:
+            lines.append(f"  {'COMMAND':<32}{'COUNT':>7}{'FAIL':>6}{'P50':>8}{'P95':>8}{'MAX':>8}{'TOTAL':>9}  HISTOGRAM")
+        for key, histogram in summary:
+            failures = f"{TERM_STYLES['RED']}{histogram.failures:>6}{TERM_STYLES['RESET']}" if histogram.failures \
+                else f"{0:>6}"
+            lines.append(f"  {key[:31]:<32}{histogram.count:>7}{failures}{ms(histogram.percentile(0.5)):>8}"
+                         f"{ms(histogram.percentile(0.95)):>8}{ms(histogram.max_ms):>8}{ms(histogram.total_ms):>9}  "
+                         f"{histogram.sparkline()}")
+        return "\n".join(lines) + "\n"
+
+    def stats_menu(self) -> None:
+        def build_items() -> List[str]:
+            return ["[■] Stop recording" if self.tracer.enabled else "[●] Start recording",
+                    "[↻] Refresh", "[✗] Reset statistics"]
+
+        def on_select(idx: int) -> None:
+            if idx == 0:
+                if self.tracer.enabled:
+                    self.tracer.stop()
+                else:
+                    self.tracer.start()
+            elif idx == 2:
+                self.tracer.reset()
+            menu.items = build_items()
+            menu.last_command_output = self.timing_report()
+            menu.refresh()
+
+        menu: Menu = Menu(
+            items=build_items(),
+            title="Timing Statistics",
+            on_select=on_select,
+            max_output_lines=self.output_lines)
+        menu.output_pane_ratio = 0.75
+        menu.last_command_output = self.timing_report()
+        menu.start()
+
+    def prompt_parameters(self, name: str, commands: List[str]) -> Optional[Dict[str, str]]:
+        try:
+            plan = parse_plan(commands)
+        except PlanError as e:
+            self.display_message(f"\n{e}", 'RED')
+            return None
+        if not plan.parameters:
+            return {}
+
+        clear_screen()
+        print(f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}{name}{TERM_STYLES['RESET']}\n")
+        print("Enter a value for each parameter (Enter keeps the default). Press ESC to cancel.\n")
+        values: Dict[str, str] = {}
+        for parameter in plan.parameters:
+            default = plan.defaults.get(parameter)
+            while True:
+                value = self.read_user_input(f"{parameter}{f' [{default}]' if default is not None else ''}: ",
+                                             allowed_keys=[b' ', b'-', b'_', b'.', b'/', b':', b'=', b','])
+                if value is None:
+                    return None
+                if value.strip():
+                    values[parameter] = value.strip()
+                    break
+                if default is not None:
+                    break
+                self.display_message("A value is required.", 'RED', wait=0)
+        return values
+
+    def prompt_transfer(self) -> Optional[Tuple[str, str, str]]:
+        clear_screen()
+        print(f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Transfer Files{TERM_STYLES['RESET']}\n")
+        print(" - push copies a local directory tree to the device, pull copies a device tree here.")
+        print(" - Files that already match are skipped; partially pulled files are resumed.")
+        print(" - Add 'push-tree <local> <remote>' or 'pull-tree <remote> <local>' to a command group to reuse a transfer.")
+        print("Press ESC to cancel at any time.\n")
+
+        while True:
+            direction = self.read_user_input("Direction (push/pull): ")
+            if direction is None:
+                return None
+            if direction.strip().lower() in ('push', 'pull'):
+                break
+            self.display_message("Please enter push or pull.", 'RED')
+
+        push = direction.strip().lower() == 'push'
+        source = self.read_user_input("Local directory: " if push else "Device directory: ")
+        if not source:
+            return None
+        destination = self.read_user_input("Device directory: " if push else "Local directory: ")
+        if not destination:
+            return None
+        return ('push-tree' if push else 'pull-tree'), source.strip(), destination.strip()
+
     def add_command(self) -> None:
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_screen()
         print(f"{TERM_STYLES['YELLOW'] + TERM_STYLES['BOLD']}Add New Command Group{TERM_STYLES['RESET']}\n")
         print(" - Enter commands. First line is the group name.")
+        print(" - Use {name} placeholders and '@param name=default' lines for values asked at run time.")
+        print(" - Prefix a line with [id] to run it alongside other [id] steps, or [id after a,b] to wait for a and b.")
         print("Press ESC to cancel at any time.")
         print("Enter empty line to finish.\n")
         
@@ -525,7 +1169,7 @@ class ADBTool:
                 self.display_message("Command group name cannot be empty.", 'RED')
                 continue
             
-            if line_num == 1 and line in (command.splitlines()[0] for command in self.load_commands()):
+            if line_num == 1 and line in self.catalog:
                 self.display_message("Command group name cannot be a duplicate.", 'RED')
                 continue
             
@@ -536,16 +1180,15 @@ class ADBTool:
             return
                 
         try:
-            with open(self.commands_file, 'a', encoding='utf-8') as f:
-                if os.path.exists(self.commands_file) and os.path.getsize(self.commands_file) > 0:
-                    f.write('\n\n')
-                f.write('\n'.join(lines))
+            parse_plan(lines[1:])
+            self.catalog.add(lines[0], lines[1:])
             self.display_message("\nCommand group added successfully.", 'GREEN')
         except Exception as e:
             self.display_message(f"\nError adding command: {str(e)}", 'RED')    
-            input("\nPress Enter to continue...")
+            self.pause("\nPress Enter to continue...")
 
     def run(self) -> None:
+        enable_vt_mode()
         try:
             print(f"{TERM_STYLES['BOLD']}=== ADB Tool ==={TERM_STYLES['RESET']}\n")
             print("Checking ADB installation...")
@@ -553,7 +1196,7 @@ class ADBTool:
             if code != 0:
                 self.display_message(f"ADB not found or not working.", 'RED')
                 print(f"Make sure {self.adb_path} is in the PATH or in the same directory.")
-                input("Press Enter to exit...")
+                self.pause("Press Enter to exit...")
                 return
                 
             print(f"{TERM_STYLES['GREEN']}ADB found:{TERM_STYLES['RESET']} {out.splitlines()[0]}")
@@ -562,12 +1205,12 @@ class ADBTool:
             self.device_menu()
             
             print("\nDisconnecting all devices...")
-            self.run_adb_command('disconnect')
+            self.disconnect_all()
             self.display_message("\nAll devices disconnected. Goodbye!", 'GREEN', wait=2.0)
             
         except Exception as e:
             self.display_message(f"\nAn error occurred: {str(e)}", 'RED')
-            input("Press Enter to exit...")
+            self.pause("Press Enter to exit...")
 
 if __name__ == '__main__':
     ADBTool().run()
\ No newline at end of file
@@ -0,0 +1,254 @@
+import argparse
+import json
+import shlex
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+from adb_core import ADBCore
+from command_catalog import CatalogError
+from connection import ConnectionResult
+from provisioning import DEFAULT_NAME_TEMPLATE, NAME_FIELDS
+from command_plan import DEPLOY_DIRECTIVE, PlanError, parse_plan
+from execution import SKIPPED_EXIT_CODE, CancelToken
+from tracing import TRACE_ENV
+
+EXIT_OK = 0
+EXIT_STEP_FAILED = 1
+EXIT_USAGE = 2
+EXIT_UNREACHABLE = 3
+
+EPILOG = """exit codes:
+  0  every step succeeded on every device
+  1  at least one step returned a non-zero exit code
+  2  usage error, unknown group or unknown device
+  3  at least one device could not be reached
+"""
+
+
+class JsonLinesWriter:
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def emit(self, event: str, **fields: Any) -> None:
+        self.stream.write(json.dumps({"event": event, **fields}) + "\n")
+        self.stream.flush()
+
+
+def resolve_devices(core: ADBCore, names: List[str]) -> Tuple[List[Dict[str, str]], List[str]]:
+    if 'all' in names:
+        return core.registry.devices(), []
+    devices: List[Dict[str, str]] = []
+    missing: List[str] = []
+    for name in names:
+        data = core.registry.find(name)
+        if data is None:
+            missing.append(name)
+        elif data not in devices:
+            devices.append(data)
+    return devices, missing
+
+
+def run_group(core: ADBCore, args: argparse.Namespace, out: JsonLinesWriter) -> int:
+    try:
+        group = core.catalog.get(args.group)
+    except CatalogError as e:
+        out.emit("error", message=str(e))
+        return EXIT_USAGE
+    if group is None:
+        out.emit("error", message=f"Unknown command group '{args.group}'")
+        return EXIT_USAGE
+    parameters: Dict[str, str] = {}
+    for assignment in args.param or []:
+        key, sep, value = assignment.partition('=')
+        if not sep or not key:
+            out.emit("error", message=f"Parameters must look like NAME=VALUE, got '{assignment}'")
+            return EXIT_USAGE
+        parameters[key.strip()] = value
+    return run_commands(core, group.name, list(group.commands), args, out, parameters)
+
+
+def deploy(core: ADBCore, args: argparse.Namespace, out: JsonLinesWriter) -> int:
+    options = (["--force"] if args.force else []) + (["--allow-downgrade"] if args.allow_downgrade else [])
+    line = " ".join([DEPLOY_DIRECTIVE] + options + [shlex.quote(path) for path in args.apk])
+    return run_commands(core, DEPLOY_DIRECTIVE, [line], args, out)
+
+
+def run_commands(
+    core: ADBCore,
+    name: str,
+    commands: List[str],
+    args: argparse.Namespace,
+    out: JsonLinesWriter,
+    parameters: Optional[Dict[str, str]] = None
+) -> int:
+    try:
+        steps = [step.command for step in parse_plan(commands).bind(parameters or {}).steps]
+    except PlanError as e:
+        out.emit("error", message=str(e))
+        return EXIT_USAGE
+    devices, missing = resolve_devices(core, args.device)
+    if missing:
+        out.emit("error", message=f"Unknown device(s): {', '.join(missing)}")
+        return EXIT_USAGE
+    if not devices:
+        out.emit("error", message="No devices registered")
+        return EXIT_USAGE
+
+    token = CancelToken(args.group_timeout)
+
+    def run_on(data: Dict[str, str]) -> Tuple[ConnectionResult, List[Tuple[str, int]], float]:
+        started = time.monotonic()
+        connection, results = core.run_group_on_device(commands, data, token=token, parameters=parameters)
+        return connection, results, time.monotonic() - started
+
+    exit_code = EXIT_OK
+    counts = {"ok": 0, "failed": 0, "unreachable": 0}
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(args.workers, len(devices)))) as pool:
+        futures = {pool.submit(run_on, data): data for data in devices}
+        for future in as_completed(futures):
+            data = futures[future]
+            try:
+                connection, results, elapsed = future.result()
+            except Exception as e:
+                connection, results, elapsed = ConnectionResult(core.registry.address(data), message=str(e)), [], 0.0
+
+            if not connection.connected:
+                status = "unreachable"
+                exit_code = max(exit_code, EXIT_UNREACHABLE)
+            else:
+                for idx, (output, code) in enumerate(results):
+                    out.emit("step", device=data['name'], target=connection.device_id, index=idx,
+                             command=steps[idx], exit_code=code, output=output)
+                status = "ok" if all(code == 0 for _, code in results) else "failed"
+                if status == "failed":
+                    exit_code = max(exit_code, EXIT_STEP_FAILED)
+            counts[status] += 1
+            out.emit("device", device=data['name'], target=connection.device_id, status=status,
+                     message=connection.message, steps=len(results) if connection.connected else 0,
+                     skipped=(len(steps) - len(results) + sum(1 for _, code in results if code == SKIPPED_EXIT_CODE)
+                              if connection.connected else len(steps)),
+                     elapsed=round(elapsed, 3), phases={name: round(duration, 3) for name, duration in connection.phases})
+
+    token.dispose()
+    out.emit("summary", group=name, devices=len(devices), elapsed=round(time.monotonic() - started, 3),
+             exit_code=exit_code, **counts)
+    return exit_code
+
+
+def provision(core: ADBCore, args: argparse.Namespace, out: JsonLinesWriter) -> int:
+    devices = core.unregistered_usb_devices()
+    started = time.monotonic()
+    try:
+        results = core.provision_usb_devices(devices, args.template, args.port)
+    except ValueError as e:
+        out.emit("error", message=str(e))
+        return EXIT_USAGE
+    for result in results:
+        out.emit("device", serial=result.serial, model=result.model, ip=result.ip, name=result.name, port=result.port,
+                 registered=result.registered, connected=result.connected, message=result.message)
+    registered = sum(1 for result in results if result.registered)
+    exit_code = EXIT_OK if registered == len(results) else EXIT_UNREACHABLE
+    out.emit("summary", devices=len(results), registered=registered,
+             connected=sum(1 for result in results if result.connected),
+             elapsed=round(time.monotonic() - started, 3), exit_code=exit_code)
+    return exit_code
+
+
+def list_groups(core: ADBCore, args: argparse.Namespace, out: JsonLinesWriter) -> int:
+    for name in core.catalog.duplicates():
+        out.emit("warning", message=f"Command group '{name}' is defined more than once; rename the copies to run it")
+    for group in core.catalog.groups():
+        out.emit("group", name=group.name, commands=list(group.commands))
+    return EXIT_OK
+
+
+def list_devices(core: ADBCore, args: argparse.Namespace, out: JsonLinesWriter) -> int:
+    states = {device.serial: device.state for device in core.enumerate_devices()} if args.state else {}
+    for data in core.registry.devices():
+        fields: Dict[str, Any] = dict(data)
+        if args.state:
+            fields["state"] = states.get(core.registry.address(data)) or states.get(data.get('serial', '')) or "absent"
+        out.emit("device", **fields)
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="adb_batch", description="Run ADB Tool command groups without the interactive menu.",
+        epilog=EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="./config", help="configuration directory (default: ./config)")
+    parser.add_argument("--adb", help="adb executable used when the native client cannot serve a command")
+    parser.add_argument("--no-native", action="store_true", help="always run commands through the adb executable")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per command (default: 120)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help=f"append a JSONL span per adb call to FILE and report per-command latency (or set {TRACE_ENV})")
+    commands = parser.add_subparsers(dest="action", required=True)
+
+    run = commands.add_parser("run", help="run a command group on one or more devices")
+    run.add_argument("group", help="command group name as listed in commands.conf")
+    run.add_argument("-d", "--device", action="append", required=True,
+                     help="registered device name, serial or ip:port; repeatable; 'all' for every device")
+    run.add_argument("-j", "--workers", type=int, default=8, help="devices processed in parallel (default: 8)")
+    run.add_argument("-p", "--param", action="append", metavar="NAME=VALUE",
+                     help="value for a {NAME} placeholder in the group; repeatable")
+    run.add_argument("--group-timeout", type=float, help="seconds before the whole run is cancelled on every device")
+    run.set_defaults(handler=run_group)
+
+    deploy_apks = commands.add_parser("deploy", help="install APKs whose versionCode differs from the device's")
+    deploy_apks.add_argument("apk", nargs="+", help="APK file or directory of APKs")
+    deploy_apks.add_argument("-d", "--device", action="append", required=True,
+                             help="registered device name, serial or ip:port; repeatable; 'all' for every device")
+    deploy_apks.add_argument("-j", "--workers", type=int, default=8, help="devices processed in parallel (default: 8)")
+    deploy_apks.add_argument("--force", action="store_true",
+                             help="reinstall even when the version already matches or is newer on the device")
+    deploy_apks.add_argument("--allow-downgrade", action="store_true",
+                             help="install APKs older than the device's version (skipped by default)")
+    deploy_apks.add_argument("--group-timeout", type=float, help="seconds before the whole deployment is cancelled")
+    deploy_apks.set_defaults(handler=deploy)
+
+    provision_usb = commands.add_parser("provision", help="register every unregistered USB device for wireless use")
+    provision_usb.add_argument("--template", default=DEFAULT_NAME_TEMPLATE,
+                               help=f"device name template using {NAME_FIELDS} (default: {DEFAULT_NAME_TEMPLATE})")
+    provision_usb.add_argument("--port", default="5555", help="adb tcpip port (default: 5555)")
+    provision_usb.set_defaults(handler=provision)
+
+    groups = commands.add_parser("groups", help="list command groups")
+    groups.set_defaults(handler=list_groups)
+
+    devices = commands.add_parser("devices", help="list registered devices")
+    devices.add_argument("--state", action="store_true", help="include the current adb state of each device")
+    devices.set_defaults(handler=list_devices)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    out = JsonLinesWriter(sys.stdout)
+    core = ADBCore(args.config)
+    if args.adb:
+        core.adb_path = args.adb
+    core.use_native_client = not args.no_native
+    core.command_timeout = args.timeout
+    if args.trace:
+        core.tracer.start(args.trace)
+    try:
+        core.registry.refresh()
+        for error in core.registry.errors:
+            out.emit("warning", message=error)
+        return args.handler(core, args, out)
+    finally:
+        if core.tracer.enabled:
+            if core.tracer.error:
+                out.emit("warning", message=core.tracer.error)
+            out.emit("timing", path=core.tracer.path,
+                     commands={key: histogram.summary() for key, histogram in core.tracer.summary()})
+            core.tracer.stop()
+        core.close_shell_sessions()
+        core.adb_client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fake_adb import FakeAdbServer
+
+BENCH_GROUP: List[str] = [
+    "shell getprop ro.product.model",
+    "shell getprop ro.product.manufacturer",
+    "shell getprop ro.build.version.release",
+    "shell echo ready",
+    "shell bench-output",
+]
+BENCH_PLAN: List[str] = [
+    "[model] shell getprop ro.product.model",
+    "[packages] shell pm list packages --show-versioncode",
+    "[payload] shell bench-output",
+    "[slow] shell sleep 0.05; echo done",
+    "[report after payload,slow] shell echo report",
+]
+
+
+def measure(action: Callable[[], Any], repeat: int, warmup: int = 1, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    for _ in range(warmup):
+        if setup:
+            setup()
+        action()
+    samples: List[float] = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        action()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def write_registry(config_dir: str, server: FakeAdbServer, extra: int) -> List[Dict[str, str]]:
+    devices = [{"name": f"bench-{idx:04d}", "serial": serial, "ip": server.addresses[serial], "port": "5555"}
+               for idx, serial in enumerate(server.devices)]
+    devices += [{"name": f"spare-{idx:05d}", "serial": f"SPARE{idx:05d}", "ip": f"10.9.{idx // 250}.{idx % 250 + 2}",
+                 "port": "5555"} for idx in range(extra)]
+    with open(os.path.join(config_dir, 'devices.json'), 'w', encoding='utf-8') as f:
+        json.dump({"devices": devices}, f)
+    return devices[:len(server.devices)]
+
+
+def write_legacy_files(directory: str, count: int) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for idx in range(count):
+        with open(os.path.join(directory, f"legacy-{idx:05d}.json"), 'w', encoding='utf-8') as f:
+            json.dump({"name": f"legacy-{idx:05d}", "serial": f"LEGACY{idx:05d}",
+                       "ip": f"10.8.{idx // 250}.{idx % 250 + 2}", "port": "5555"}, f)
+
+
+def bench_commands(core: Any, serial: str, repeat: int) -> Dict[str, Any]:
+    return {
+        "run_adb_command.get_state": measure(lambda: core.run_adb_command("get-state", serial), repeat),
+        "run_adb_command.shell_echo": measure(lambda: core.run_adb_command("shell echo hi", serial), repeat),
+        "run_adb_command.shell_output": measure(lambda: core.run_adb_command("shell bench-output", serial), repeat),
+    }
+
+
+def bench_connection(core: Any, data: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    address = core.registry.address(data)
+    return {
+        "connect.reconnect": measure(lambda: core.connector.connect(data), repeat,
+                                     setup=lambda: core.run_adb_command(f"disconnect {address}")),
+        "connect.already_connected": measure(lambda: core.connector.connect(data), repeat),
+    }
+
+
+def bench_groups(core: Any, serial: str, devices: List[Dict[str, str]], repeat: int) -> Dict[str, Any]:
+    def cold() -> None:
+        core.device_cache.invalidate(serial)
+        core.close_shell_sessions()
+
+    return {
+        "group.cold": measure(lambda: core.run_command_group(BENCH_GROUP, serial), repeat, setup=cold),
+        "group.warm": measure(lambda: core.run_command_group(BENCH_GROUP, serial), repeat),
+        "group.streamed": measure(lambda: core.run_command_group(BENCH_GROUP, serial, on_output=lambda text: None),
+                                  repeat),
+        "group.plan": measure(lambda: core.run_command_group(BENCH_PLAN, serial, on_output=lambda text: None), repeat),
+        "group.fleet": measure(lambda: core.run_group_on_devices(BENCH_GROUP, devices, core.fleet_workers),
+                               max(1, repeat // 4)),
+    }
+
+
+def bench_registry(core_type: Any, config_dir: str, legacy: int, repeat: int) -> Dict[str, Any]:
+    from device_registry import DeviceRegistry
+
+    path = os.path.join(config_dir, 'devices.json')
+    core = core_type(config_dir)
+    with tempfile.TemporaryDirectory(prefix='bench-legacy-') as scratch:
+        legacy_dir = os.path.join(scratch, 'devices')
+        os.makedirs(legacy_dir)
+        write_legacy_files(legacy_dir, legacy)
+        legacy_path = os.path.join(scratch, 'devices.json')
+
+        def fresh_import() -> None:
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+        return {
+            "registry.load_cold": measure(lambda: DeviceRegistry(path).devices(), repeat),
+            "registry.load_warm": measure(core.registry.devices, repeat),
+            "registry.lookup": measure(lambda: core.registry.find("spare-00042"), repeat),
+            "registry.legacy_import": measure(lambda: DeviceRegistry(legacy_path, legacy_dir=legacy_dir).devices(),
+                                              max(1, repeat // 4), setup=fresh_import),
+        }
+
+
+def bench_render(items: int, output_lines: int, repeat: int) -> Dict[str, Any]:
+    from ADBCommandTool import Menu
+    from terminal import ScriptedInputBackend, Screen
+
+    class BenchScreen(Screen):
+        def size(self) -> Tuple[int, int]:
+            return 120, 40
+
+    stream = io.StringIO()
+    menu = Menu([f"item {idx:05d} \x1b[32m●\x1b[0m" for idx in range(items)], title="Benchmark",
+                input_backend=ScriptedInputBackend(), screen=BenchScreen(stream))
+    menu.output.write("".join(f"output line {idx}\n" for idx in range(output_lines)))
+    frame = [0]
+
+    def move() -> None:
+        frame[0] += 1
+        menu._move_cursor(1 if frame[0] % 50 else -49)
+
+    def render() -> None:
+        menu._render()
+
+    def full() -> None:
+        menu.screen.invalidate()
+        menu._render()
+
+    stream.seek(0)
+    stream.truncate()
+    results = {
+        "menu.render_move": measure(lambda: (move(), render()), repeat * 10),
+        "menu.render_full": measure(full, repeat),
+        "menu.filter": measure(lambda: menu._set_query("item 01"), repeat, setup=lambda: menu._set_query("")),
+    }
+    results["menu.render_move"]["bytes_per_frame"] = round(len(stream.getvalue()) / max(1, repeat * 10 + repeat + 2))
+    return results
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    server = FakeAdbServer(0, args.devices, args.latency, args.output_bytes).start()
+    os.environ['ANDROID_ADB_SERVER_PORT'] = str(server.port)
+    from adb_core import ADBCore
+
+    workdir = tempfile.TemporaryDirectory(prefix='bench-')
+    config_dir = os.path.join(workdir.name, 'config')
+    os.makedirs(config_dir)
+    devices = write_registry(config_dir, server, args.registry_size)
+    core = ADBCore(config_dir)
+    core.adb_path = 'adb-not-used-by-benchmarks'
+    serial = next(iter(server.devices))
+    results: Dict[str, Any] = {}
+    started = time.perf_counter()
+    try:
+        selected = set(args.only or ['commands', 'connection', 'groups', 'registry', 'render'])
+        if 'commands' in selected:
+            results.update(bench_commands(core, serial, args.repeat))
+        if 'connection' in selected:
+            results.update(bench_connection(core, devices[0], args.repeat))
+        if 'groups' in selected:
+            results.update(bench_groups(core, serial, devices, args.repeat))
+        if 'registry' in selected:
+            results.update(bench_registry(ADBCore, config_dir, args.registry_size, args.repeat))
+        if 'render' in selected:
+            results.update(bench_render(args.menu_items, args.output_lines, args.repeat))
+    finally:
+        core.close_shell_sessions()
+        core.adb_client.close()
+        server.stop()
+        workdir.cleanup()
+    return {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "devices": args.devices,
+            "latency_s": args.latency,
+            "output_bytes": args.output_bytes,
+            "registry_size": args.registry_size,
+            "menu_items": args.menu_items,
+            "repeat": args.repeat,
+            "requests": server.requests,
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        },
+        "results": results,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="adb_bench", description="Benchmark ADB Tool hot paths against a deterministic fake adb server.")
+    parser.add_argument("--devices", type=int, default=8, help="fake devices to serve (default: 8)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every adb request (default: 0)")
+    parser.add_argument("--output-bytes", type=int, default=16384, help="size of the bench-output command (default: 16384)")
+    parser.add_argument("--registry-size", type=int, default=2000, help="extra registry entries (default: 2000)")
+    parser.add_argument("--menu-items", type=int, default=5000, help="items in the rendered menu (default: 5000)")
+    parser.add_argument("--output-lines", type=int, default=2000, help="lines in the menu output pane (default: 2000)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per benchmark (default: 20)")
+    parser.add_argument("--only", action="append", choices=['commands', 'connection', 'groups', 'registry', 'render'],
+                        help="run only the given benchmark family; repeatable")
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,474 @@
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ADB_HOST: str = '127.0.0.1'
+ADB_PORT: int = 5037
+
+SHELL_STDIN: int = 0
+SHELL_STDOUT: int = 1
+SHELL_STDERR: int = 2
+SHELL_EXIT: int = 3
+SHELL_CLOSE_STDIN: int = 4
+
+SYNC_DATA_MAX: int = 64 * 1024
+EXIT_MARKER: str = '__ADBT_EXIT__:'
+
+
+class AdbProtocolError(Exception):
+    pass
+
+
+class AdbServerUnavailable(AdbProtocolError):
+    pass
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise AdbProtocolError("Connection closed by adb server")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _recv_all(sock: socket.socket) -> bytes:
+    chunks: List[bytes] = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def send_request(sock: socket.socket, payload: str) -> None:
+    data = payload.encode('utf-8')
+    sock.sendall(b'%04x' % len(data) + data)
+
+
+def read_status(sock: socket.socket) -> None:
+    status = _recv_exact(sock, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        raise AdbProtocolError(read_length_prefixed(sock))
+    raise AdbProtocolError(f"Unexpected adb server response {status!r}")
+
+
+def read_length_prefixed(sock: socket.socket) -> str:
+    length = int(_recv_exact(sock, 4), 16)
+    return _recv_exact(sock, length).decode('utf-8', errors='replace')
+
+
+def legacy_shell_service(command: str) -> str:
+    return f"shell:({command}\n)\necho {EXIT_MARKER}$?"
+
+
+def split_exit_status(output: bytes) -> Tuple[bytes, int]:
+    head, marker, status = output.rpartition(EXIT_MARKER.encode())
+    status = status.strip()
+    if not marker or not status.isdigit():
+        return output, 1
+    return head, int(status)
+
+
+def read_shell_v2_packet(sock: socket.socket) -> Tuple[int, bytes]:
+    packet_id, length = struct.unpack('<BI', _recv_exact(sock, 5))
+    return packet_id, _recv_exact(sock, length) if length else b''
+
+
+def write_shell_v2_packet(sock: socket.socket, packet_id: int, data: bytes = b'') -> None:
+    sock.sendall(struct.pack('<BI', packet_id, len(data)) + data)
+
+
+class AdbConnectionPool:
+    def __init__(self, client: 'AdbHostClient', max_idle: int = 2, max_idle_age: float = 30.0) -> None:
+        self.client = client
+        self.max_idle = max_idle
+        self.max_idle_age = max_idle_age
+        self._idle: Dict[str, Deque[Tuple[socket.socket, float]]] = {}
+        self._wanted: Deque[Optional[str]] = deque()
+        self._refiller: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+
+    @staticmethod
+    def _is_alive(sock: socket.socket) -> bool:
+        try:
+            sock.setblocking(False)
+            try:
+                return sock.recv(1, socket.MSG_PEEK) != b''
+            except BlockingIOError:
+                return True
+            finally:
+                sock.setblocking(True)
+        except OSError:
+            return False
+
+    def _open(self, serial: Optional[str]) -> socket.socket:
+        sock = self.client.open_socket()
+        try:
+            send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+            read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def acquire(self, serial: Optional[str]) -> socket.socket:
+        key = serial or ''
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                sock, opened = idle.popleft()
+                if now - opened < self.max_idle_age and self._is_alive(sock):
+                    self._replenish(serial)
+                    return sock
+                sock.close()
+            self._replenish(serial)
+        return self._open(serial)
+
+    def _replenish(self, serial: Optional[str]) -> None:
+        if len(self._idle.get(serial or '', ())) >= self.max_idle or serial in self._wanted:
+            return
+        self._wanted.append(serial)
+        if self._refiller is None:
+            self._refiller = threading.Thread(target=self._refill, name='adb-pool', daemon=True)
+            self._refiller.start()
+        self._ready.notify()
+
+    def _refill(self) -> None:
+        current = threading.current_thread()
+        while True:
+            with self._lock:
+                while not self._wanted and self._refiller is current:
+                    if not self._ready.wait(self.max_idle_age) and not self._wanted:
+                        self._refiller = None
+                if self._refiller is not current:
+                    return
+                serial = self._wanted[0]
+            try:
+                sock: Optional[socket.socket] = self._open(serial)
+            except Exception:
+                sock = None
+            with self._lock:
+                if serial in self._wanted:
+                    self._wanted.remove(serial)
+                    idle = self._idle.setdefault(serial or '', deque())
+                    if sock is not None and len(idle) < self.max_idle:
+                        idle.append((sock, time.monotonic()))
+                        sock = None
+                        if len(idle) < self.max_idle:
+                            self._wanted.append(serial)
+            if sock is not None:
+                sock.close()
+
+    def discard(self, serial: Optional[str]) -> None:
+        with self._lock:
+            if serial in self._wanted:
+                self._wanted.remove(serial)
+            for sock, _ in self._idle.pop(serial or '', deque()):
+                sock.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._wanted.clear()
+            self._refiller = None
+            self._ready.notify_all()
+            for idle in self._idle.values():
+                for sock, _ in idle:
+                    sock.close()
+            self._idle.clear()
+
+
+class SocketWatch:
+    def __init__(self) -> None:
+        self.sockets: List[socket.socket] = []
+        self.aborted: bool = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _shutdown(sock: socket.socket) -> None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def add(self, sock: socket.socket) -> None:
+        with self._lock:
+            self.sockets.append(sock)
+            if not self.aborted:
+                return
+        self._shutdown(sock)
+
+    def abort(self) -> None:
+        with self._lock:
+            self.aborted = True
+            sockets = list(self.sockets)
+        for sock in sockets:
+            self._shutdown(sock)
+
+
+class AdbHostClient:
+    def __init__(self, host: str = ADB_HOST, port: Optional[int] = None, connect_timeout: float = 2.0) -> None:
+        self.host = host
+        self.port = port or int(os.environ.get('ANDROID_ADB_SERVER_PORT') or ADB_PORT)
+        self.connect_timeout = connect_timeout
+        self.pool = AdbConnectionPool(self)
+        self._features: Dict[str, List[str]] = {}
+        self._features_lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def interruptible(self) -> Iterator[SocketWatch]:
+        previous = getattr(self._local, 'watch', None)
+        watch = self._local.watch = SocketWatch()
+        try:
+            yield watch
+        finally:
+            self._local.watch = previous
+
+    def _track(self, sock: socket.socket) -> socket.socket:
+        watch: Optional[SocketWatch] = getattr(self._local, 'watch', None)
+        if watch is not None:
+            watch.add(sock)
+        return sock
+
+    def open_socket(self) -> socket.socket:
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        except OSError as e:
+            raise AdbServerUnavailable(str(e)) from e
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def host_query(self, request: str) -> str:
+        sock = self._track(self.open_socket())
+        try:
+            send_request(sock, request)
+            read_status(sock)
+            return read_length_prefixed(sock)
+        finally:
+            sock.close()
+
+    def _serial_prefix(self, serial: Optional[str]) -> str:
+        return f"host-serial:{serial}:" if serial else "host:"
+
+    def version(self) -> int:
+        return int(self.host_query("host:version"), 16)
+
+    def devices(self, long: bool = False) -> List[Tuple[str, str]]:
+        output = self.host_query("host:devices-l" if long else "host:devices")
+        devices: List[Tuple[str, str]] = []
+        for line in output.splitlines():
+            parts = line.split(None, 1)
+            if len(parts) == 2:
+                devices.append((parts[0], parts[1].strip()))
+        return devices
+
+    def connect(self, target: str) -> str:
+        self.forget(target)
+        return self.host_query(f"host:connect:{target}")
+
+    def disconnect(self, target: str = '') -> str:
+        self.pool.close()
+        if target:
+            self.forget(target)
+        else:
+            with self._features_lock:
+                self._features.clear()
+        return self.host_query(f"host:disconnect:{target}")
+
+    def get_serialno(self, serial: Optional[str] = None) -> str:
+        return self.host_query(f"{self._serial_prefix(serial)}get-serialno")
+
+    def get_state(self, serial: Optional[str] = None) -> str:
+        return self.host_query(f"{self._serial_prefix(serial)}get-state")
+
+    def features(self, serial: Optional[str]) -> List[str]:
+        key = serial or ''
+        with self._features_lock:
+            features = self._features.get(key)
+        if features is None:
+            try:
+                features = self.host_query(f"{self._serial_prefix(serial)}features").split(',')
+            except AdbProtocolError:
+                return []
+            with self._features_lock:
+                self._features[key] = features
+        return features
+
+    def open_service(self, serial: Optional[str], service: str) -> socket.socket:
+        sock = self._track(self.pool.acquire(serial))
+        try:
+            send_request(sock, service)
+            read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def shell(self, serial: Optional[str], command: str) -> Tuple[str, int]:
+        if 'shell_v2' in self.features(serial):
+            sock = self.open_service(serial, f"shell,v2,raw:{command}")
+            try:
+                stdout = bytearray()
+                while True:
+                    try:
+                        packet_id, data = read_shell_v2_packet(sock)
+                    except AdbProtocolError:
+                        return stdout.decode('utf-8', errors='replace'), 1
+                    if packet_id == SHELL_STDOUT:
+                        stdout.extend(data)
+                    elif packet_id == SHELL_EXIT:
+                        return stdout.decode('utf-8', errors='replace'), data[0] if data else 0
+            finally:
+                sock.close()
+
+        sock = self.open_service(serial, legacy_shell_service(command))
+        try:
+            output, code = split_exit_status(_recv_all(sock))
+        finally:
+            sock.close()
+        return output.decode('utf-8', errors='replace').replace('\r\n', '\n'), code
+
+    def service_output(self, serial: Optional[str], service: str) -> str:
+        sock = self.open_service(serial, service)
+        try:
+            return _recv_all(sock).decode('utf-8', errors='replace')
+        finally:
+            sock.close()
+
+    def forget(self, serial: Optional[str]) -> None:
+        with self._features_lock:
+            self._features.pop(serial or '', None)
+        self.pool.discard(serial)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class AdbSyncConnection:
+    def __init__(self, client: 'AdbHostClient', serial: Optional[str]) -> None:
+        self.sock: socket.socket = client.open_service(serial, "sync:")
+
+    def _request(self, command: bytes, path: str) -> None:
+        data = path.encode('utf-8')
+        self.sock.sendall(command + struct.pack('<I', len(data)) + data)
+
+    def _read_header(self) -> Tuple[bytes, int]:
+        command, value = struct.unpack('<4sI', _recv_exact(self.sock, 8))
+        return command, value
+
+    def _fail(self, length: int) -> AdbProtocolError:
+        return AdbProtocolError(_recv_exact(self.sock, length).decode('utf-8', errors='replace'))
+
+    def stat(self, path: str) -> Tuple[int, int, int]:
+        self._request(b'STAT', path)
+        command, mode, size, mtime = struct.unpack('<4sIII', _recv_exact(self.sock, 16))
+        if command != b'STAT':
+            raise AdbProtocolError(f"Unexpected sync response {command!r}")
+        return mode, size, mtime
+
+    def send(self, path: str, chunks: Iterable[bytes], mode: int = 0o644, mtime: Optional[int] = None) -> None:
+        self._request(b'SEND', f"{path},{0o100000 | mode}")
+        for chunk in chunks:
+            for start in range(0, len(chunk), SYNC_DATA_MAX):
+                piece = chunk[start:start + SYNC_DATA_MAX]
+                self.sock.sendall(b'DATA' + struct.pack('<I', len(piece)) + piece)
+        self.sock.sendall(b'DONE' + struct.pack('<I', int(time.time() if mtime is None else mtime)))
+        command, length = self._read_header()
+        if command == b'FAIL':
+            raise self._fail(length)
+        if command != b'OKAY':
+            raise AdbProtocolError(f"Unexpected sync response {command!r}")
+
+    def recv(self, path: str) -> Iterator[bytes]:
+        self._request(b'RECV', path)
+        while True:
+            command, length = self._read_header()
+            if command == b'DATA':
+                yield _recv_exact(self.sock, length)
+            elif command == b'DONE':
+                return
+            elif command == b'FAIL':
+                raise self._fail(length)
+            else:
+                raise AdbProtocolError(f"Unexpected sync response {command!r}")
+
+    def abort(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        try:
+            self.sock.sendall(b'QUIT' + struct.pack('<I', 0))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def parse_global_options(args: List[str]) -> Tuple[Optional[str], List[str]]:
+    serial: Optional[str] = None
+    while args and args[0].startswith('-'):
+        if args[0] == '-s' and len(args) > 1:
+            serial = args[1]
+            args = args[2:]
+        else:
+            raise ValueError(args[0])
+    return serial, args
+
+
+def run_native(client: AdbHostClient, command: str, serial: Optional[str]) -> Optional[Tuple[str, int]]:
+    try:
+        explicit, args = parse_global_options(command.split())
+    except ValueError:
+        return None
+    if not args:
+        return None
+    serial = explicit or serial
+    name, rest = args[0], args[1:]
+
+    try:
+        if name == 'version' and not rest:
+            return f"Android Debug Bridge version 1.0.{client.version()}\n", 0
+        if name == 'devices' and rest in ([], ['-l']):
+            long = rest == ['-l']
+            lines = [f"{s:<22} {state}" if long else f"{s}\t{state}" for s, state in client.devices(long)]
+            return "List of devices attached\n" + "".join(f"{l}\n" for l in lines) + "\n", 0
+        if name == 'connect' and len(rest) == 1:
+            target = rest[0] if ':' in rest[0] else f"{rest[0]}:5555"
+            message = client.connect(target)
+            return f"{message}\n", 0 if 'connected to' in message else 1
+        if name == 'disconnect' and len(rest) <= 1:
+            message = client.disconnect(rest[0] if rest else '')
+            return f"{message}\n", 0
+        if name == 'get-serialno' and not rest:
+            return f"{client.get_serialno(serial)}\n", 0
+        if name == 'get-state' and not rest:
+            return f"{client.get_state(serial)}\n", 0
+        if name == 'shell' and rest:
+            return client.shell(serial, ' '.join(rest))
+        if name == 'tcpip' and len(rest) == 1 and rest[0].isdigit():
+            return client.service_output(serial, f"tcpip:{rest[0]}"), 0
+        if name == 'usb' and not rest:
+            return client.service_output(serial, "usb:"), 0
+        if name == 'reboot' and len(rest) <= 1:
+            return client.service_output(serial, f"reboot:{rest[0] if rest else ''}"), 0
+    except AdbServerUnavailable:
+        return None
+    except AdbProtocolError as e:
+        return f"{e}\n", 1
+    except OSError as e:
+        return f"{e}\n", 1
+    return None
@@ -0,0 +1,618 @@
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from adb_client import AdbHostClient, AdbServerUnavailable, run_native
+from command_catalog import CommandCatalog, CommandGroup
+from command_plan import (DEPLOY_DIRECTIVE, TRANSFER_DIRECTIVES, CommandPlan, OrderedOutput, PlanError, Step,
+                          parse_plan)
+from command_stream import CommandStream, ProcessStream, StaticStream, open_native_stream
+from connection import ConnectionResult, DeviceConnector, poll_until
+from device_info import (SNAPSHOT_COMMAND, DeviceCache, DeviceInfo, PropertySnapshot, parse_devices_output,
+                         parse_snapshot)
+from device_registry import DeviceRegistry, RegistryError
+from device_watcher import DeviceWatcher
+from execution import SKIPPED_EXIT_CODE, CancelToken, CommandGuard
+from shell_session import ShellSession, ShellSessionError, open_shell_session
+from tracing import Tracer, get_tracer
+
+if TYPE_CHECKING:
+    from apk_deploy import DeployReport
+    from logcat_capture import LogcatCapture
+    from provisioning import ProvisionResult
+    from transfer import TransferReport
+
+
+class ADBCore:
+    def __init__(self, config_dir: str = './config') -> None:
+        self.config_dir = config_dir
+        self.devices_dir = os.path.join(config_dir, 'devices')
+        self.tracer: Tracer = get_tracer()
+        self.registry: DeviceRegistry = DeviceRegistry(
+            os.path.join(config_dir, 'devices.json'), legacy_dir=self.devices_dir, tracer=self.tracer)
+        self.commands_file = os.path.join(config_dir, 'commands.conf')
+        self.catalog: CommandCatalog = CommandCatalog(self.commands_file)
+        self.adb_path = './bin/adb.exe' if os.name == 'nt' else 'adb'
+        self.current_device: Optional[str] = None
+        self.use_native_client: bool = True
+        self.adb_client: AdbHostClient = AdbHostClient()
+        self.shell_sessions: Dict[str, ShellSession] = {}
+        self._session_locks: Dict[str, threading.Lock] = {}
+        self._sessions_lock = threading.Lock()
+        self.device_cache: DeviceCache = DeviceCache()
+        self.fleet_workers: int = 8
+        self.property_ttl: float = 10.0
+        self.command_timeout: Optional[float] = 120.0
+        self.transfer_workers: int = 4
+        self.step_workers: int = 4
+        self.logs_dir: str = os.path.join(os.path.dirname(os.path.abspath(config_dir)), 'logs')
+        self.log_captures: Dict[str, 'LogcatCapture'] = {}
+        self.watcher: DeviceWatcher = DeviceWatcher(
+            self.adb_client if self.use_native_client else None, self.enumerate_devices, on_change=self._on_devices_changed)
+        self.device_listeners: List[Callable[[], None]] = []
+        self.connector: DeviceConnector = DeviceConnector(
+            self.run_adb_command, self.get_available_usb_devices, state_of=self.watcher.live_state, tracer=self.tracer)
+        self.last_connection: Optional[ConnectionResult] = None
+
+    def run_adb_command(
+        self,
+        command: str,
+        device: Optional[str] = None,
+        token: Optional[CancelToken] = None
+    ) -> Tuple[str, int]:
+        device = device or self.current_device
+        with self.tracer.span('adb', command, device) as span:
+            result = self._execute(command, device, token)
+            span.code = result[1]
+        return result
+
+    def _execute(self, command: str, device: Optional[str], token: Optional[CancelToken]) -> Tuple[str, int]:
+        if token and token.cancelled:
+            return token.failure()
+        if self.use_native_client:
+            with self.adb_client.interruptible() as sockets, \
+                    CommandGuard(token, sockets.abort, self.command_timeout) as guard:
+                result = run_native(self.adb_client, command, device)
+            if result is not None:
+                return guard.result(*result)
+
+        cmd = [self.adb_path]
+        
+        if device and not command.startswith(('connect', 'disconnect')):
+            cmd.extend(['-s', device])
+        
+        cmd.extend(command.split())
+        
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        except Exception as e:
+            return str(e), 1
+        with CommandGuard(token, process.kill, self.command_timeout) as guard:
+            stdout, _ = process.communicate()
+        return guard.result(stdout, process.returncode)
+
+    def stream_adb_command(self, command: str, device: Optional[str] = None) -> CommandStream:
+        device = device or self.current_device
+        if self.use_native_client:
+            stream = open_native_stream(self.adb_client, command, device)
+            if stream is not None:
+                return stream
+
+        cmd = [self.adb_path]
+        if device and not command.startswith(('connect', 'disconnect')):
+            cmd.extend(['-s', device])
+        cmd.extend(command.split())
+        try:
+            return ProcessStream(cmd)
+        except Exception as e:
+            return StaticStream(str(e), 1)
+
+    def get_shell_session(self, serial: str) -> Optional[ShellSession]:
+        with self._sessions_lock:
+            lock = self._session_locks.setdefault(serial, threading.Lock())
+        with lock:
+            session = self.shell_sessions.get(serial)
+            if session is None or session.closed:
+                session = open_shell_session(self.adb_client if self.use_native_client else None, self.adb_path, serial)
+                if session is None:
+                    return None
+                self.shell_sessions[serial] = session
+            return session
+
+    def close_shell_sessions(self) -> None:
+        with self._sessions_lock:
+            sessions = list(self.shell_sessions.values())
+            self.shell_sessions.clear()
+        for session in sessions:
+            session.close()
+
+    @staticmethod
+    def _session_command(command: str) -> Optional[str]:
+        args = command.split()
+        if len(args) > 1 and args[0] == 'shell':
+            return ' '.join(args[1:])
+        return None
+
+    @staticmethod
+    def _property_query(command: str) -> Optional[str]:
+        args = command.split()
+        if len(args) == 3 and args[:2] == ['shell', 'getprop']:
+            return args[2]
+        return None
+
+    @staticmethod
+    def _changes_properties(command: str) -> bool:
+        args = command.split()
+        return ('setprop' in args or 'reboot' in args or args[0] in ('root', 'unroot')
+                or any(arg in ('install', 'install-multiple', 'uninstall') for arg in args))
+
+    @staticmethod
+    def _streams_logcat(command: str) -> bool:
+        args = command.split()
+        if args[:1] == ['shell']:
+            args = args[1:]
+        one_shot = ('-d', '-c', '-g', '-t', '-T', '-f', '-S', '-L', '--clear', '--dump', '--help')
+        return args[:1] == ['logcat'] and not any(arg.startswith(one_shot) for arg in args[1:])
+
+    def _run_streamed(
+        self,
+        command: str,
+        device: Optional[str],
+        on_output: Callable[[str], None],
+        token: Optional[CancelToken] = None
+    ) -> Tuple[str, int]:
+        with self.tracer.span('adb', command, device or self.current_device) as span:
+            streams: List[CommandStream] = []
+
+            def abort() -> None:
+                sockets.abort()
+                for opened in streams:
+                    opened.cancel()
+
+            with self.adb_client.interruptible() as sockets, \
+                    CommandGuard(token, abort, self.command_timeout) as guard:
+                stream = self.stream_adb_command(command, device)
+                streams.append(stream)
+                if guard.aborted:
+                    stream.cancel()
+                for chunk in stream:
+                    on_output(chunk)
+            stream.close()
+            message, code = guard.result("", stream.returncode if stream.returncode is not None else 1)
+            span.code = code
+        if message:
+            on_output(message)
+        return "", code
+
+    def run_command_group(
+        self,
+        commands: List[str],
+        device: Optional[str] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        token: Optional[CancelToken] = None,
+        parameters: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[str, int]]:
+        try:
+            plan = parse_plan(commands).bind(parameters or {})
+        except PlanError as e:
+            return [(f"{e}\n", 1)]
+        if plan.sequential:
+            return self._run_sequence([step.command for step in plan.steps], device, on_output, token)
+        return self._run_plan(plan, device or self.current_device, on_output, token)
+
+    def _run_plan(
+        self,
+        plan: CommandPlan,
+        device: Optional[str],
+        on_output: Optional[Callable[[str], None]] = None,
+        token: Optional[CancelToken] = None
+    ) -> List[Tuple[str, int]]:
+        steps = plan.steps
+        results: List[Tuple[str, int]] = [("", 0)] * len(steps)
+        ordered = OrderedOutput(len(steps), on_output) if on_output else None
+        status: Dict[int, int] = {}
+        running: Dict[Future, int] = {}
+
+        def run_step(step: Step) -> Tuple[str, int]:
+            chunks: List[str] = []
+            emit = partial(ordered.write, step.index) if ordered else chunks.append
+            step_results = self._run_sequence([step.command], device, emit, token, sessions=False)
+            output, code = step_results[-1] if step_results else ("", 0)
+            return (output if ordered else "".join(chunks)), code
+
+        def finish(index: int, result: Tuple[str, int]) -> None:
+            results[index] = result
+            status[index] = result[1]
+            if ordered:
+                ordered.finish(index)
+
+        with ThreadPoolExecutor(max_workers=self.step_workers) as pool:
+            while True:
+                for step in steps:
+                    if step.index in status or step.index in running.values():
+                        continue
+                    failed = next((steps[dep] for dep in step.after if status.get(dep, 0) != 0), None)
+                    if failed:
+                        finish(step.index, (f"Skipped: step '{failed.id}' failed\n", SKIPPED_EXIT_CODE))
+                    elif all(dep in status for dep in step.after):
+                        running[pool.submit(run_step, step)] = step.index
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        finish(index, future.result())
+                    except Exception as e:
+                        finish(index, (f"{e}\n", 1))
+        return results
+
+    def _run_sequence(
+        self,
+        commands: List[str],
+        device: Optional[str] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        token: Optional[CancelToken] = None,
+        sessions: bool = True
+    ) -> List[Tuple[str, int]]:
+        device = device or self.current_device
+        commands = [cmd for cmd in commands if cmd.strip()]
+        results: List[Tuple[str, int]] = []
+        idx = 0
+        while idx < len(commands):
+            if token and token.cancelled:
+                results.append(token.failure())
+                return results
+
+            directive = commands[idx].split(None, 1)[0]
+            transfer = None
+            if device and directive in TRANSFER_DIRECTIVES:
+                from transfer import parse_transfer
+                transfer = parse_transfer(commands[idx])
+            if transfer and device:
+                report = self.transfer(*transfer, device=device, on_output=on_output, token=token)
+                summary = f"{report.summary()}\n"
+                if on_output:
+                    on_output(summary)
+                else:
+                    summary += "".join(f"  {path}: {error}\n" for path, error in report.failed)
+                results.append((summary, 0 if report.ok else 1))
+                if not report.ok:
+                    return results
+                idx += 1
+                continue
+
+            if device and self._streams_logcat(commands[idx]):
+                capture = self.logcat_capture(device)
+                capture.start()
+                message = f"Capturing logcat of {device} to {capture.directory}\n"
+                if on_output:
+                    on_output(message)
+                results.append((message, 0))
+                idx += 1
+                continue
+
+            deploy = None
+            if device and directive == DEPLOY_DIRECTIVE:
+                from apk_deploy import parse_deploy
+                deploy = parse_deploy(commands[idx])
+            if deploy and device:
+                report = self.deploy(deploy[0], device, on_output, token, force=deploy[1], allow_downgrade=deploy[2])
+                summary = f"{report.summary()}\n"
+                if on_output:
+                    on_output(summary)
+                else:
+                    summary += "".join(f"  {package}: {error}\n" for package, error in report.failed)
+                results.append((summary, 0 if report.ok else 1))
+                if not report.ok:
+                    return results
+                idx += 1
+                continue
+
+            key = self._property_query(commands[idx]) if device else None
+            value = self.get_property(device, key) if device and key else None
+            if value is not None:
+                if on_output:
+                    on_output(f"{value}\n")
+                results.append((f"{value}\n", 0))
+                idx += 1
+                continue
+
+            start = idx
+            batch: List[str] = []
+            if device and sessions:
+                for cmd in commands[idx:]:
+                    remote = self._session_command(cmd)
+                    if remote is None or (batch and self._property_query(cmd)):
+                        break
+                    batch.append(remote)
+
+            batch_results: Optional[List[Tuple[str, int]]] = None
+            session = self.get_shell_session(device) if batch and device else None
+            if session:
+                marks = [time.perf_counter()]
+
+                def on_result() -> None:
+                    marks.append(time.perf_counter())
+                    guard.rearm()
+
+                with CommandGuard(token, session.abort, self.command_timeout) as guard:
+                    try:
+                        batch_results = session.run_batch(batch, on_output, on_result=on_result)
+                    except ShellSessionError as e:
+                        self.shell_sessions.pop(device or '', None)
+                        if guard.aborted:
+                            batch_results = e.results + [guard.failure()]
+                        elif e.started:
+                            batch_results = e.results + [(f"{e}\n", 1)]
+                for remote, (_, code), begin, end in zip(batch, batch_results or [], marks, marks[1:]):
+                    self.tracer.record('session', f"shell {remote}", device, begin, end - begin, code)
+
+            if batch_results is None:
+                if on_output:
+                    batch_results = [self._run_streamed(commands[idx], device, on_output, token)]
+                else:
+                    batch_results = [self.run_adb_command(commands[idx], device, token)]
+                idx += 1
+            else:
+                idx += len(batch)
+
+            if device and any(self._changes_properties(cmd) for cmd in commands[start:idx]):
+                self.device_cache.invalidate(device)
+
+            for out, code in batch_results:
+                results.append((out, code))
+                if code != 0:
+                    return results
+        return results
+
+    def transfer(
+        self,
+        direction: str,
+        source: str,
+        destination: str,
+        device: Optional[str] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        token: Optional[CancelToken] = None
+    ) -> 'TransferReport':
+        from transfer import TransferEngine, process_transfer
+
+        device = device or self.current_device
+        if self.use_native_client:
+            engine = TransferEngine(self.adb_client, device or '', self.transfer_workers, on_output, token)
+            try:
+                return engine.run(direction, source, destination)
+            except AdbServerUnavailable:
+                pass
+        return process_transfer(self.adb_path, device or '', direction, source, destination, on_output, token)
+
+    def installed_packages(self, device_id: str) -> Optional[Dict[str, int]]:
+        from apk_deploy import PACKAGES_COMMAND, parse_package_versions
+
+        def load() -> Optional[Dict[str, int]]:
+            output, code = self.run_adb_command(PACKAGES_COMMAND, device_id)
+            return parse_package_versions(output) if code == 0 else None
+
+        return self.device_cache.fact(device_id, 'packages', load)
+
+    def deploy(
+        self,
+        paths: List[str],
+        device: Optional[str] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        token: Optional[CancelToken] = None,
+        force: bool = False,
+        allow_downgrade: bool = False
+    ) -> 'DeployReport':
+        from apk_deploy import DeployReport, PackageInstaller, collect_apks, deploy_apks
+
+        device = device or self.current_device or ''
+        apks, errors = collect_apks(paths)
+        installed = self.installed_packages(device)
+        if installed is None:
+            report = DeployReport(apks=len(apks), failed=errors)
+            report.failed.append((device, "Could not list installed packages"))
+            return report
+        installer = PackageInstaller(self.adb_client if self.use_native_client else None, device,
+                                     self.adb_path, token, self.command_timeout)
+        report = deploy_apks(installer, apks, dict(installed), force, on_output, allow_downgrade)
+        report.failed[:0] = errors
+        if report.installed or report.failed:
+            self.device_cache.forget(device, 'packages')
+        return report
+
+    def run_group_on_device(
+        self,
+        commands: List[str],
+        data: Dict[str, str],
+        on_output: Optional[Callable[[str], None]] = None,
+        token: Optional[CancelToken] = None,
+        parameters: Optional[Dict[str, str]] = None
+    ) -> Tuple[ConnectionResult, List[Tuple[str, int]]]:
+        connection = self.connector.connect(data, stop=(lambda: token.cancelled) if token else None)
+        if not connection.connected:
+            return connection, [(f"{connection.message}\n", 1)]
+        return connection, self.run_command_group(commands, connection.device_id, on_output, token, parameters)
+
+    def run_group_on_devices(
+        self,
+        commands: List[str],
+        devices: List[Dict[str, str]],
+        max_workers: int = 8,
+        on_result: Optional[Callable[[Dict[str, str], List[Tuple[str, int]], float], None]] = None,
+        token: Optional[CancelToken] = None,
+        parameters: Optional[Dict[str, str]] = None
+    ) -> Dict[str, List[Tuple[str, int]]]:
+        def run_on(data: Dict[str, str]) -> Tuple[List[Tuple[str, int]], float]:
+            started = time.monotonic()
+            _, device_results = self.run_group_on_device(commands, data, token=token, parameters=parameters)
+            return device_results, time.monotonic() - started
+
+        results: Dict[str, List[Tuple[str, int]]] = {}
+        if not devices:
+            return results
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(devices)))) as pool:
+            futures = {pool.submit(run_on, data): data for data in devices}
+            for future in as_completed(futures):
+                data = futures[future]
+                try:
+                    device_results, elapsed = future.result()
+                except Exception as e:
+                    device_results, elapsed = [(f"{e}\n", 1)], 0.0
+                results[data['name']] = device_results
+                if on_result:
+                    on_result(data, device_results, elapsed)
+        return results
+
+    def load_devices(self) -> List[Dict[str, str]]:
+        return self.registry.devices()
+
+    def load_commands(self) -> List[CommandGroup]:
+        return self.catalog.groups()
+
+    def logcat_capture(self, serial: str) -> 'LogcatCapture':
+        capture = self.log_captures.get(serial)
+        if capture is None:
+            from logcat_capture import LogcatCapture, safe_name
+
+            capture = LogcatCapture(serial, lambda command: self.stream_adb_command(command, serial),
+                                    os.path.join(self.logs_dir, safe_name(serial)))
+            self.log_captures[serial] = capture
+        return capture
+
+    def stop_log_captures(self) -> None:
+        for capture in self.log_captures.values():
+            capture.stop()
+
+    def disconnect_all(self) -> None:
+        self.stop_log_captures()
+        self.close_shell_sessions()
+        self.device_cache.invalidate()
+        self.run_adb_command('disconnect')
+
+    def enumerate_devices(self) -> List[DeviceInfo]:
+        output, code = self.run_adb_command("devices -l")
+        devices = parse_devices_output(output) if code == 0 else []
+        self.device_cache.update(devices)
+        return devices
+
+    def _on_devices_changed(self, devices: List[DeviceInfo]) -> None:
+        self.device_cache.update(devices)
+        for listener in list(self.device_listeners):
+            listener()
+
+    def device_state(self, data: Dict[str, str]) -> str:
+        wireless = self.watcher.state(f"{data['ip']}:{data['port']}")
+        usb = self.watcher.state(data.get('serial', ''))
+        if wireless == 'device':
+            return 'online'
+        if usb == 'device':
+            return 'usb'
+        return wireless or usb or ''
+
+    def get_available_usb_devices(self) -> List[str]:
+        return [device.serial for device in self.enumerate_devices() if device.online]
+
+    def property_snapshot(self, device_id: str, max_age: Optional[float] = None) -> Optional[PropertySnapshot]:
+        def load() -> Optional[PropertySnapshot]:
+            out, code = self.run_adb_command(SNAPSHOT_COMMAND, device_id)
+            snapshot = parse_snapshot(out) if code == 0 else None
+            return snapshot if snapshot and snapshot.properties else None
+
+        return self.device_cache.fact(device_id, 'snapshot', load, max_age)
+
+    def get_property(self, device_id: str, key: str) -> Optional[str]:
+        snapshot = self.property_snapshot(device_id, None if key.startswith('ro.') else self.property_ttl)
+        return snapshot.get(key) if snapshot else None
+
+    def get_device_ip(self, device_id: str) -> Optional[str]:
+        snapshot = self.property_snapshot(device_id)
+        return snapshot.ip if snapshot else None
+
+    def unregistered_usb_devices(self) -> List[DeviceInfo]:
+        return [device for device in self.enumerate_devices()
+                if device.online and device.transport == 'usb' and not self.registry.by_serial(device.serial)]
+
+    def provision_usb_devices(
+        self,
+        devices: List[DeviceInfo],
+        name_template: Optional[str] = None,
+        port: str = "5555",
+        on_result: Optional[Callable[['ProvisionResult'], None]] = None,
+        token: Optional[CancelToken] = None
+    ) -> List['ProvisionResult']:
+        from provisioning import DEFAULT_NAME_TEMPLATE, ProvisionResult, render_name, unique_names
+
+        name_template = name_template or DEFAULT_NAME_TEMPLATE
+        render_name(name_template, {'model': '', 'manufacturer': '', 'serial': '', 'ip': ''}, 1)
+        if not devices:
+            return []
+
+        def resolve(device: DeviceInfo) -> Tuple[ProvisionResult, Dict[str, str]]:
+            snapshot = self.property_snapshot(device.serial)
+            model = (snapshot.get('ro.product.model') if snapshot else '') or device.model
+            fields = {'model': model or 'device', 'serial': device.serial, 'ip': (snapshot.ip if snapshot else '') or '',
+                      'manufacturer': snapshot.get('ro.product.manufacturer') if snapshot else ''}
+            return ProvisionResult(device.serial, model, snapshot.ip if snapshot else None, port=port), fields
+
+        def switch(result: ProvisionResult) -> bool:
+            if token and token.cancelled:
+                result.message = "Cancelled"
+            elif not result.ip:
+                result.message = "No IP address (is Wi-Fi connected?)"
+            else:
+                out, code = self.run_adb_command(f"-s {result.serial} tcpip {port}", token=token)
+                if code != 0:
+                    result.message = out.strip() or f"tcpip failed (code {code})"
+                else:
+                    result.connected = poll_until(
+                        lambda: self.connector.try_connect(result.address), self.connector.tcpip_timeout,
+                        initial_interval=0.1, stop=(lambda: token.cancelled) if token else None)
+                    result.message = "Connected" if result.connected else f"Could not verify {result.address}"
+                    return True
+            return False
+
+        workers = max(1, min(self.fleet_workers, len(devices)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resolved = list(pool.map(resolve, devices))
+        results = [result for result, _ in resolved]
+        names = unique_names([render_name(name_template, fields, idx + 1) for idx, (_, fields) in enumerate(resolved)],
+                             {data['name'] for data in self.registry.devices()})
+        for result, name in zip(results, names):
+            result.name = name
+
+        switched: List[ProvisionResult] = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(switch, result): result for result in results}
+            for future in as_completed(futures):
+                result = futures[future]
+                try:
+                    if future.result():
+                        switched.append(result)
+                except Exception as e:
+                    result.message = str(e)
+                if on_result:
+                    on_result(result)
+
+        if switched:
+            try:
+                self.registry.add_many([{"name": result.name, "serial": result.serial, "ip": result.ip or '',
+                                         "port": port} for result in results if result in switched])
+                for result in switched:
+                    result.registered = True
+            except (RegistryError, OSError) as e:
+                for result in switched:
+                    result.message = f"Not registered: {e}"
+        return results
+
+    def connect_to_device(self, ip: str, port: str) -> bool:
+        device_id = f"{ip}:{port}"
+        out, code = self.run_adb_command(f"connect {device_id}")
+        if code == 0 and 'connected' in out.lower():
+            self.current_device = device_id
+            return True
+        return False
@@ -0,0 +1,257 @@
+import os
+import posixpath
+import re
+import shlex
+import struct
+import subprocess
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from adb_client import AdbHostClient, AdbProtocolError, AdbSyncConnection
+from command_plan import DEPLOY_DIRECTIVE
+from execution import CancelToken, CommandGuard
+from transfer import format_size, read_chunks
+
+REMOTE_STAGING: str = '/data/local/tmp'
+PACKAGES_COMMAND: str = "shell pm list packages --show-versioncode"
+PACKAGE_LINE = re.compile(r'^package:(\S+)(?:\s+versionCode:(\d+))?', re.M)
+
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+UTF8_FLAG = 0x0100
+NO_INDEX = 0xFFFFFFFF
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+ATTRIBUTE_IDS: Dict[int, str] = {0x0101021b: 'versionCode', 0x0101021c: 'versionName'}
+
+
+@dataclass(frozen=True)
+class ApkInfo:
+    path: str
+    package: str
+    version_code: int
+    version_name: str
+    size: int
+
+    @property
+    def label(self) -> str:
+        return f"{self.package} {self.version_name or self.version_code}"
+
+
+@dataclass
+class DeployReport:
+    apks: int = 0
+    installed: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    newer: List[str] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def summary(self) -> str:
+        text = f"deploy: {len(self.installed)} installed, {len(self.skipped)} up to date"
+        if self.newer:
+            text += f", {len(self.newer)} newer installed (use --allow-downgrade)"
+        if self.failed:
+            text += f", {len(self.failed)} failed"
+        return text + f" ({self.elapsed:.1f}s)"
+
+
+def parse_deploy(command: str) -> Optional[Tuple[List[str], bool, bool]]:
+    try:
+        args = shlex.split(command, posix=os.name != 'nt')
+    except ValueError:
+        return None
+    if os.name == 'nt':
+        args = [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in '\'"' else arg for arg in args]
+    if len(args) < 2 or args[0] != DEPLOY_DIRECTIVE:
+        return None
+    options = ('--force', '--allow-downgrade')
+    paths = [arg for arg in args[1:] if arg not in options]
+    return (paths, '--force' in args[1:], '--allow-downgrade' in args[1:]) if paths else None
+
+
+def _string_pool(data: bytes, offset: int) -> List[str]:
+    header_size, = struct.unpack_from('<H', data, offset + 2)
+    count, _, flags, strings_start = struct.unpack_from('<IIII', data, offset + 8)
+    utf8 = bool(flags & UTF8_FLAG)
+    base = offset + strings_start
+    strings: List[str] = []
+    for idx in range(count):
+        pos = base + struct.unpack_from('<I', data, offset + header_size + idx * 4)[0]
+        if utf8:
+            pos += 2 if data[pos] & 0x80 else 1
+            length = data[pos]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | data[pos + 1]
+                pos += 1
+            strings.append(data[pos + 1:pos + 1 + length].decode('utf-8', errors='replace'))
+        else:
+            length, = struct.unpack_from('<H', data, pos)
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from('<H', data, pos + 2)[0]
+                pos += 2
+            strings.append(data[pos + 2:pos + 2 + length * 2].decode('utf-16-le', errors='replace'))
+    return strings
+
+
+def parse_manifest(data: bytes) -> Dict[str, str]:
+    strings: List[str] = []
+    resource_ids: List[int] = []
+    offset = struct.unpack_from('<H', data, 2)[0]
+    while offset + 8 <= len(data):
+        chunk_type, header_size, size = struct.unpack_from('<HHI', data, offset)
+        if size < 8:
+            break
+        if chunk_type == RES_STRING_POOL_TYPE and not strings:
+            strings = _string_pool(data, offset)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = list(struct.unpack_from(f'<{(size - header_size) // 4}I', data, offset + header_size))
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            ext = offset + header_size
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from('<IIHHH', data, ext)
+            if strings[name] != 'manifest':
+                break
+            attributes: Dict[str, str] = {}
+            for idx in range(attr_count):
+                _, attr_name, raw, _, _, value_type, value = struct.unpack_from(
+                    '<IIIHBBI', data, ext + attr_start + idx * attr_size)
+                key = ATTRIBUTE_IDS.get(resource_ids[attr_name]) if attr_name < len(resource_ids) else None
+                key = key or strings[attr_name]
+                if raw != NO_INDEX:
+                    attributes[key] = strings[raw]
+                elif value_type == TYPE_STRING:
+                    attributes[key] = strings[value]
+                elif value_type in (TYPE_INT_DEC, TYPE_INT_HEX):
+                    attributes[key] = str(value)
+            return attributes
+        offset += size
+    raise ValueError("AndroidManifest.xml has no <manifest> element")
+
+
+def read_apk_info(path: str) -> ApkInfo:
+    try:
+        with zipfile.ZipFile(path) as apk:
+            manifest = parse_manifest(apk.read('AndroidManifest.xml'))
+    except (KeyError, zipfile.BadZipFile, struct.error, IndexError) as e:
+        raise ValueError(f"not a readable APK ({e})") from e
+    if 'package' not in manifest:
+        raise ValueError("manifest has no package name")
+    return ApkInfo(path, manifest['package'], int(manifest.get('versionCode') or 0),
+                   manifest.get('versionName', ''), os.path.getsize(path))
+
+
+def collect_apks(paths: List[str]) -> Tuple[List[ApkInfo], List[Tuple[str, str]]]:
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith('.apk'))
+        else:
+            files.append(path)
+    apks: List[ApkInfo] = []
+    errors: List[Tuple[str, str]] = []
+    for path in files:
+        try:
+            apks.append(read_apk_info(path))
+        except (OSError, ValueError) as e:
+            errors.append((path, str(e)))
+    return apks, errors
+
+
+def parse_package_versions(output: str) -> Dict[str, int]:
+    return {match.group(1): int(match.group(2) or 0) for match in PACKAGE_LINE.finditer(output)}
+
+
+class PackageInstaller:
+    def __init__(
+        self,
+        client: Optional[AdbHostClient],
+        serial: str,
+        adb_path: str = 'adb',
+        token: Optional[CancelToken] = None,
+        timeout: Optional[float] = None
+    ) -> None:
+        self.client = client
+        self.serial = serial
+        self.adb_path = adb_path
+        self.token = token
+        self.timeout = timeout
+
+    def install(self, apk: ApkInfo, downgrade: bool = False) -> Tuple[str, int]:
+        flags = ['-r'] + (['-d'] if downgrade else [])
+        if self.client is None:
+            return self._install_process(apk, flags)
+        remote = posixpath.join(REMOTE_STAGING, f"adbt-{apk.package}.apk")
+        sync = AdbSyncConnection(self.client, self.serial)
+        try:
+            with CommandGuard(self.token, sync.abort, self.timeout) as guard:
+                try:
+                    sync.send(remote, read_chunks(apk.path), 0o644, int(os.path.getmtime(apk.path)))
+                except (AdbProtocolError, OSError) as e:
+                    return guard.result(f"{e}\n", 1)
+            if guard.aborted:
+                return guard.result("", 1)
+        finally:
+            sync.close()
+        try:
+            output, code = self.client.shell(self.serial, f"pm install {' '.join(flags)} {shlex.quote(remote)} 2>&1; "
+                                                          f"status=$?; rm -f {shlex.quote(remote)}; exit $status")
+        except (AdbProtocolError, OSError) as e:
+            return f"{e}\n", 1
+        return output, code if code != 0 or 'Success' in output else 1
+
+    def _install_process(self, apk: ApkInfo, flags: List[str]) -> Tuple[str, int]:
+        try:
+            process = subprocess.Popen([self.adb_path, '-s', self.serial, 'install', *flags, apk.path],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        except Exception as e:
+            return str(e), 1
+        with CommandGuard(self.token, process.kill, self.timeout) as guard:
+            stdout, _ = process.communicate()
+        return guard.result(stdout, process.returncode)
+
+
+def deploy_apks(
+    installer: PackageInstaller,
+    apks: List[ApkInfo],
+    installed: Dict[str, int],
+    force: bool = False,
+    on_output: Optional[Callable[[str], None]] = None,
+    allow_downgrade: bool = False
+) -> DeployReport:
+    report = DeployReport(apks=len(apks))
+    started = time.monotonic()
+    emit = on_output or (lambda text: None)
+    for apk in apks:
+        current = installed.get(apk.package)
+        if current == apk.version_code and not force:
+            report.skipped.append(apk.package)
+            emit(f"  = {apk.label} already installed\n")
+            continue
+        downgrade = current is not None and current > apk.version_code
+        if downgrade and not (allow_downgrade or force):
+            report.newer.append(apk.package)
+            emit(f"  ! {apk.label} not installed: versionCode {current} is newer\n")
+            continue
+        if installer.token and installer.token.cancelled:
+            report.failed.append((apk.package, installer.token.failure()[0].strip()))
+            break
+        emit(f"  ↑ {apk.label} ({format_size(apk.size)})"
+             f"{'' if current is None else f' replacing versionCode {current}'}\n")
+        output, code = installer.install(apk, downgrade=downgrade)
+        if code == 0:
+            report.installed.append(apk.package)
+            installed[apk.package] = apk.version_code
+        else:
+            message = output.strip().splitlines()[-1] if output.strip() else f"exit code {code}"
+            report.failed.append((apk.package, message))
+            emit(f"  ✗ {apk.package}: {message}\n")
+    report.elapsed = time.monotonic() - started
+    return report
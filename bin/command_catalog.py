@@ -0,0 +1,130 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+class CatalogError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class CommandGroup:
+    name: str
+    commands: Tuple[str, ...]
+    text: str
+
+
+class CommandCatalog:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._groups: List[CommandGroup] = []
+        self._by_name: Dict[str, CommandGroup] = {}
+        self._duplicates: Dict[str, int] = {}
+        self._stat: Optional[Tuple[int, int]] = None
+        self._generation: int = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def parse(text: str) -> List[CommandGroup]:
+        groups: List[CommandGroup] = []
+        for block in text.split('\n\n'):
+            block = block.strip()
+            if not block:
+                continue
+            lines = block.splitlines()
+            groups.append(CommandGroup(lines[0].strip(), tuple(lines[1:]), block))
+        return groups
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _index(self, groups: List[CommandGroup]) -> None:
+        self._groups = groups
+        self._by_name = {}
+        self._duplicates = {}
+        for group in groups:
+            if group.name in self._by_name:
+                self._duplicates[group.name] = self._duplicates.get(group.name, 1) + 1
+            self._by_name.setdefault(group.name, group)
+        self._generation += 1
+
+    def _unique(self, name: str) -> Optional[CommandGroup]:
+        count = self._duplicates.get(name)
+        if count:
+            raise CatalogError(f"Command group '{name}' is defined {count} times in {self.path}; rename all but one.")
+        return self._by_name.get(name)
+
+    def refresh(self) -> None:
+        with self._lock:
+            stat = self._file_stat()
+            if stat == self._stat and self._generation:
+                return
+            if stat is None:
+                groups: List[CommandGroup] = []
+            else:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    groups = self.parse(f.read())
+            self._stat = stat
+            self._index(groups)
+
+    def _write(self, groups: List[CommandGroup]) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(group.text for group in groups))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._stat = self._file_stat()
+        self._index(groups)
+
+    @property
+    def generation(self) -> int:
+        self.refresh()
+        return self._generation
+
+    def groups(self) -> List[CommandGroup]:
+        self.refresh()
+        return list(self._groups)
+
+    def names(self) -> List[str]:
+        return [group.name for group in self.groups()]
+
+    def get(self, name: str) -> Optional[CommandGroup]:
+        self.refresh()
+        return self._unique(name.strip())
+
+    def __contains__(self, name: str) -> bool:
+        self.refresh()
+        return name.strip() in self._by_name
+
+    def duplicates(self) -> List[str]:
+        self.refresh()
+        return list(self._duplicates)
+
+    def add(self, name: str, commands: List[str]) -> CommandGroup:
+        with self._lock:
+            self.refresh()
+            name = name.strip()
+            if not name:
+                raise CatalogError("Command group name cannot be empty.")
+            if name in self._by_name:
+                raise CatalogError("Command group name cannot be a duplicate.")
+            group = CommandGroup(name, tuple(commands), '\n'.join([name] + list(commands)))
+            self._write(self._groups + [group])
+            return group
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            self.refresh()
+            group = self._unique(name.strip())
+            if group is None:
+                return False
+            groups = list(self._groups)
+            groups.remove(group)
+            self._write(groups)
+            return True
@@ -0,0 +1,110 @@
+import re
+import threading
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEPLOY_DIRECTIVE: str = 'deploy-apk'
+TRANSFER_DIRECTIVES: Tuple[str, ...] = ('push-tree', 'pull-tree')
+PARAMETER = re.compile(r'(?<!\$)\{([A-Za-z_][A-Za-z0-9_]*)\}')
+PARAMETER_LINE = re.compile(r'^@param\s+([A-Za-z_][A-Za-z0-9_]*)\s*(?:=\s*(.*?))?\s*$')
+STEP_LINE = re.compile(r'^\[([A-Za-z0-9_.-]+)(?:\s+after\s+([A-Za-z0-9_.,\s-]+?))?\s*\]\s*(.+)$')
+
+
+class PlanError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Step:
+    index: int
+    id: str
+    command: str
+    after: Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class CommandPlan:
+    steps: Tuple[Step, ...]
+    defaults: Dict[str, Optional[str]]
+
+    @property
+    def parameters(self) -> List[str]:
+        names = list(self.defaults)
+        for step in self.steps:
+            names.extend(name for name in PARAMETER.findall(step.command) if name not in names)
+        return names
+
+    @property
+    def sequential(self) -> bool:
+        return all(step.after == ((step.index - 1,) if step.index else ()) for step in self.steps)
+
+    def missing(self, values: Dict[str, str]) -> List[str]:
+        return [name for name in self.parameters if name not in values and self.defaults.get(name) is None]
+
+    def bind(self, values: Dict[str, str]) -> 'CommandPlan':
+        missing = self.missing(values)
+        if missing:
+            raise PlanError(f"Missing value for parameter(s): {', '.join(missing)}")
+        merged = {name: value for name, value in self.defaults.items() if value is not None}
+        merged.update(values)
+        steps = tuple(replace(step, command=PARAMETER.sub(lambda m: merged.get(m.group(1), m.group(0)), step.command))
+                      for step in self.steps)
+        return CommandPlan(steps, self.defaults)
+
+
+def parse_plan(lines: List[str]) -> CommandPlan:
+    steps: List[Step] = []
+    ids: Dict[str, int] = {}
+    defaults: Dict[str, Optional[str]] = {}
+    barrier: Optional[int] = None
+    for line in (line.strip() for line in lines):
+        if not line:
+            continue
+        param = PARAMETER_LINE.match(line)
+        if param:
+            defaults[param.group(1)] = param.group(2)
+            continue
+        index = len(steps)
+        step = STEP_LINE.match(line)
+        if step is None:
+            steps.append(Step(index, str(index + 1), line, tuple(range(barrier or 0, index))))
+            barrier = index
+            continue
+        step_id, after, command = step.groups()
+        if step_id in ids:
+            raise PlanError(f"Duplicate step id '{step_id}'")
+        dependencies: List[int] = []
+        for name in re.split(r'[\s,]+', after.strip()) if after else []:
+            if name not in ids:
+                raise PlanError(f"Step '{step_id}' runs after unknown step '{name}' (declare it first)")
+            dependencies.append(ids[name])
+        if barrier is not None:
+            dependencies.append(barrier)
+        ids[step_id] = index
+        steps.append(Step(index, step_id, command.strip(), tuple(sorted(set(dependencies)))))
+    return CommandPlan(tuple(steps), defaults)
+
+
+class OrderedOutput:
+    def __init__(self, count: int, sink: Callable[[str], None]) -> None:
+        self.sink = sink
+        self.head: int = 0
+        self._buffers: List[List[str]] = [[] for _ in range(count)]
+        self._done: List[bool] = [False] * count
+        self._lock = threading.Lock()
+
+    def write(self, index: int, text: str) -> None:
+        with self._lock:
+            if index == self.head:
+                self.sink(text)
+            else:
+                self._buffers[index].append(text)
+
+    def finish(self, index: int) -> None:
+        with self._lock:
+            self._done[index] = True
+            while self.head < len(self._done) and self._done[self.head]:
+                self.head += 1
+                if self.head < len(self._done) and self._buffers[self.head]:
+                    self.sink("".join(self._buffers[self.head]))
+                    self._buffers[self.head].clear()
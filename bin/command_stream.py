@@ -0,0 +1,179 @@
+import codecs
+import socket
+import subprocess
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Iterator, List, Optional
+
+from adb_client import (EXIT_MARKER, AdbHostClient, AdbProtocolError, AdbServerUnavailable, SHELL_EXIT,
+                        SHELL_STDOUT, legacy_shell_service, parse_global_options, read_shell_v2_packet, run_native,
+                        split_exit_status)
+
+
+class CommandStream(ABC):
+    def __init__(self) -> None:
+        self.returncode: Optional[int] = None
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[str]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+    def cancel(self) -> None:
+        self.close()
+
+
+class StaticStream(CommandStream):
+    def __init__(self, output: str, returncode: int) -> None:
+        super().__init__()
+        self.output = output
+        self.code = returncode
+
+    def __iter__(self) -> Iterator[str]:
+        if self.output:
+            yield self.output
+        self.returncode = self.code
+
+
+class SocketShellStream(CommandStream):
+    def __init__(self, sock: socket.socket, shell_v2: bool = True) -> None:
+        super().__init__()
+        self.sock = sock
+        self.shell_v2 = shell_v2
+
+    def __iter__(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        held = b''
+        try:
+            while True:
+                if self.shell_v2:
+                    try:
+                        packet_id, data = read_shell_v2_packet(self.sock)
+                    except (AdbProtocolError, OSError):
+                        self.returncode = 1
+                        break
+                    if packet_id == SHELL_EXIT:
+                        self.returncode = data[0] if data else 0
+                        break
+                    if packet_id != SHELL_STDOUT:
+                        continue
+                else:
+                    try:
+                        chunk = self.sock.recv(65536)
+                    except OSError:
+                        chunk = b''
+                    if not chunk:
+                        held, self.returncode = split_exit_status(held)
+                        text = decoder.decode(held)
+                        if text:
+                            yield text
+                        break
+                    held += chunk
+                    keep = len(EXIT_MARKER) + 6
+                    data, held = held[:-keep], held[-keep:]
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def cancel(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class ProcessStream(CommandStream):
+    def __init__(self, cmd: List[str]) -> None:
+        super().__init__()
+        self.process: subprocess.Popen = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, encoding='utf-8', errors='replace')
+
+    def __iter__(self) -> Iterator[str]:
+        assert self.process.stdout is not None
+        try:
+            for line in self.process.stdout:
+                yield line
+            self.returncode = self.process.wait()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if self.process.stdout:
+            self.process.stdout.close()
+
+    def cancel(self) -> None:
+        if self.process.poll() is None:
+            self.process.kill()
+
+
+def open_native_stream(client: AdbHostClient, command: str, serial: Optional[str]) -> Optional[CommandStream]:
+    try:
+        explicit, args = parse_global_options(command.split())
+    except ValueError:
+        return None
+    if len(args) < 2 or args[0] != 'shell':
+        result = run_native(client, command, serial)
+        return StaticStream(*result) if result is not None else None
+
+    serial = explicit or serial
+    remote = ' '.join(args[1:])
+    try:
+        shell_v2 = 'shell_v2' in client.features(serial)
+        sock = client.open_service(serial, f"shell,v2,raw:{remote}" if shell_v2 else legacy_shell_service(remote))
+    except AdbServerUnavailable:
+        return None
+    except (AdbProtocolError, OSError) as e:
+        return StaticStream(f"{e}\n", 1)
+    return SocketShellStream(sock, shell_v2)
+
+
+class OutputBuffer:
+    def __init__(self, max_lines: int = 2000, max_line_length: int = 4096) -> None:
+        self.lines: Deque[str] = deque(maxlen=max_lines)
+        self.partial: str = ""
+        self.dropped: int = 0
+        self.max_line_length: int = max_line_length
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        width = self.max_line_length
+        parts = (self.partial + text).split('\n')
+        self.partial = parts.pop()
+        if len(self.partial) >= width:
+            cut = len(self.partial) - len(self.partial) % width
+            parts.append(self.partial[:cut])
+            self.partial = self.partial[cut:]
+        if any(len(part) > width for part in parts):
+            parts = [part[idx:idx + width] for part in parts for idx in range(0, max(len(part), 1), width)]
+        overflow = len(self.lines) + len(parts) - (self.lines.maxlen or 0)
+        if overflow > 0:
+            self.dropped += overflow
+        self.lines.extend(parts)
+
+    def clear(self) -> None:
+        self.lines.clear()
+        self.partial = ""
+        self.dropped = 0
+
+    def text(self) -> str:
+        body = "".join(f"{line}\n" for line in self.lines) + self.partial
+        if self.dropped:
+            return f"... {self.dropped} earlier lines dropped ...\n{body}"
+        return body
+
+    def __bool__(self) -> bool:
+        return bool(self.lines) or bool(self.partial)
@@ -0,0 +1,170 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tracing import Tracer, get_tracer
+
+RunCommand = Callable[[str], Tuple[str, int]]
+StatusCallback = Callable[[str, str], None]
+
+
+def poll_until(
+    check: Callable[[], bool],
+    timeout: float,
+    initial_interval: float = 0.05,
+    factor: float = 2.0,
+    max_interval: float = 0.5,
+    stop: Optional[Callable[[], bool]] = None
+) -> bool:
+    deadline = time.monotonic() + timeout
+    interval = initial_interval
+    while True:
+        if check():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (stop and stop()):
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * factor, max_interval)
+
+
+@dataclass
+class ConnectionResult:
+    device_id: str
+    connected: bool = False
+    usb_serial: Optional[str] = None
+    message: str = ""
+    phases: List[Tuple[str, float]] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        return sum(duration for _, duration in self.phases)
+
+    def summary(self) -> str:
+        return ", ".join(f"{phase} {duration:.2f}s" for phase, duration in self.phases)
+
+
+class DeviceConnector:
+    def __init__(
+        self,
+        run: RunCommand,
+        list_usb_devices: Callable[[], List[str]],
+        reconnect_timeout: float = 3.0,
+        tcpip_timeout: float = 10.0,
+        ready_timeout: float = 3.0,
+        probe_workers: int = 8,
+        state_of: Optional[Callable[[str], Optional[str]]] = None,
+        tracer: Optional[Tracer] = None
+    ) -> None:
+        self.run = run
+        self.list_usb_devices = list_usb_devices
+        self.reconnect_timeout = reconnect_timeout
+        self.tcpip_timeout = tcpip_timeout
+        self.ready_timeout = ready_timeout
+        self.probe_workers = probe_workers
+        self.state_of = state_of or (lambda serial: None)
+        self.tracer = tracer or get_tracer()
+
+    def try_connect(self, device_id: str) -> bool:
+        out, code = self.run(f"connect {device_id}")
+        return code == 0 and 'connected' in out.lower()
+
+    def is_ready(self, device_id: str) -> bool:
+        out, code = self.run(f"-s {device_id} get-state")
+        return code == 0 and out.strip() == 'device'
+
+    def find_usb_serial(self, serial: str) -> Optional[str]:
+        candidates = [dev for dev in self.list_usb_devices() if ':' not in dev]
+        if serial in candidates:
+            return serial
+        if not candidates:
+            return None
+        parent = self.tracer.current()
+
+        def probe(dev: str) -> Optional[str]:
+            with self.tracer.adopt(parent):
+                out, code = self.run(f"-s {dev} get-serialno")
+            return dev if code == 0 and out.strip() == serial else None
+
+        with ThreadPoolExecutor(max_workers=min(self.probe_workers, len(candidates))) as pool:
+            return next((dev for dev in pool.map(probe, candidates) if dev), None)
+
+    def connect(
+        self,
+        data: Dict[str, str],
+        on_status: Optional[StatusCallback] = None,
+        stop: Optional[Callable[[], bool]] = None
+    ) -> ConnectionResult:
+        with self.tracer.span('connect', 'total', f"{data['ip']}:{data['port']}") as span:
+            result = self._connect(data, on_status, stop)
+            span.code = 0 if result.connected else 1
+        return result
+
+    def _connect(
+        self,
+        data: Dict[str, str],
+        on_status: Optional[StatusCallback],
+        stop: Optional[Callable[[], bool]]
+    ) -> ConnectionResult:
+        status = on_status or (lambda message, color: None)
+        stopped = stop or (lambda: False)
+        device_id = f"{data['ip']}:{data['port']}"
+        result = ConnectionResult(device_id)
+
+        def phase(name: str, action: Callable[[], bool]) -> bool:
+            started = time.monotonic()
+            with self.tracer.span('phase', name, device_id) as span:
+                try:
+                    ok = action()
+                    span.code = 0 if ok else 1
+                    return ok
+                finally:
+                    result.phases.append((name, time.monotonic() - started))
+
+        if self.state_of(device_id) == 'device':
+            result.connected = True
+            result.phases.append(('connect', 0.0))
+            return result
+
+        result.connected = phase('connect', lambda: self.try_connect(device_id))
+        usb_ready = bool(data.get('serial')) and self.state_of(data['serial']) == 'device'
+        cancelled = f"Connection to {data['name']} cancelled."
+
+        if not result.connected and stopped():
+            result.message = cancelled
+            return result
+
+        if not result.connected and not (usb_ready and self.state_of(device_id) in ('offline', 'unauthorized')):
+            status(f"Attempting wireless reconnection to {data['name']}...", 'YELLOW')
+            self.run(f"disconnect {device_id}")
+            result.connected = phase('reconnect', lambda: poll_until(
+                lambda: self.try_connect(device_id), self.reconnect_timeout, stop=stop))
+
+        if not result.connected:
+            result.usb_serial = None
+            if stopped():
+                result.message = cancelled
+                return result
+
+            def probe() -> bool:
+                result.usb_serial = self.find_usb_serial(data.get('serial', ''))
+                return result.usb_serial is not None
+
+            if not data.get('serial') or not phase('usb-probe', probe):
+                result.message = f"Device {data['name']} not found via USB. Please ensure it's plugged in and try again."
+                return result
+
+            if stopped():
+                result.message = cancelled
+                return result
+            status(f"Re-enabling tcpip over USB for {data['name']}...", 'YELLOW')
+            phase('tcpip', lambda: self.run(f"-s {result.usb_serial} tcpip {data['port']}")[1] == 0)
+            result.connected = phase('tcpip-connect', lambda: poll_until(
+                lambda: self.try_connect(device_id), self.tcpip_timeout, initial_interval=0.1, stop=stop))
+            if not result.connected:
+                result.message = cancelled if stopped() else f"Failed to connect to {data['name']} after re-enabling USB tcpip."
+                return result
+
+        phase('ready', lambda: poll_until(lambda: self.is_ready(device_id), self.ready_timeout, stop=stop))
+        return result
@@ -0,0 +1,130 @@
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROPERTY_PATTERN = re.compile(r'^\[([^\]]+)\]: \[(.*?)\]$', re.M | re.S)
+ROUTE_MARKER = '__ADBT_ROUTE__'
+SNAPSHOT_COMMAND = f"shell getprop; echo {ROUTE_MARKER}; ip route"
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    serial: str
+    state: str
+    transport: str
+    model: str = ""
+    product: str = ""
+    device: str = ""
+    transport_id: str = ""
+    attributes: Dict[str, str] = field(default_factory=dict, compare=False, hash=False)
+
+    @property
+    def online(self) -> bool:
+        return self.state == 'device'
+
+    @property
+    def label(self) -> str:
+        return f"{self.serial} ({self.model})" if self.model else self.serial
+
+
+@dataclass(frozen=True)
+class PropertySnapshot:
+    properties: Dict[str, str]
+    ip: Optional[str] = None
+    taken: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.taken
+
+    def get(self, key: str) -> str:
+        return self.properties.get(key, "")
+
+
+def parse_getprop(output: str) -> Dict[str, str]:
+    return {match.group(1): match.group(2) for match in PROPERTY_PATTERN.finditer(output.replace('\r\n', '\n'))}
+
+
+def parse_snapshot(output: str) -> PropertySnapshot:
+    props, _, routes = output.partition(ROUTE_MARKER)
+    match = re.search(r'src (\d+\.\d+\.\d+\.\d+)', routes)
+    return PropertySnapshot(parse_getprop(props), match.group(1) if match else None)
+
+
+def transport_of(serial: str) -> str:
+    if serial.startswith('emulator-'):
+        return 'emulator'
+    if ':' in serial or serial.startswith('adb-'):
+        return 'tcp'
+    return 'usb'
+
+
+def parse_devices_output(output: str) -> List[DeviceInfo]:
+    devices: List[DeviceInfo] = []
+    for line in output.splitlines():
+        line = line.strip()
+        if not line or line.startswith(('List of devices', '*')):
+            continue
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        serial, state = parts[0], parts[1]
+        attributes = dict(p.split(':', 1) for p in parts[2:] if ':' in p)
+        if state == 'no' and parts[2:3] == ['permissions']:
+            state = 'no permissions'
+        devices.append(DeviceInfo(
+            serial=serial,
+            state=state,
+            transport=transport_of(serial),
+            model=attributes.get('model', '').replace('_', ' '),
+            product=attributes.get('product', ''),
+            device=attributes.get('device', ''),
+            transport_id=attributes.get('transport_id', ''),
+            attributes=attributes))
+    return devices
+
+
+class DeviceCache:
+    def __init__(self) -> None:
+        self.devices: Dict[str, DeviceInfo] = {}
+        self._facts: Dict[str, Dict[str, Tuple[Any, float]]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, devices: List[DeviceInfo]) -> None:
+        with self._lock:
+            current = {d.serial: d for d in devices}
+            for serial in list(self._facts):
+                previous = self.devices.get(serial)
+                device = current.get(serial)
+                if device is None or not device.online or (previous and previous.state != device.state):
+                    del self._facts[serial]
+            self.devices = current
+
+    def invalidate(self, serial: Optional[str] = None) -> None:
+        with self._lock:
+            if serial is None:
+                self._facts.clear()
+            else:
+                self._facts.pop(serial, None)
+
+    def get(self, serial: str) -> Optional[DeviceInfo]:
+        return self.devices.get(serial)
+
+    def forget(self, serial: str, key: str) -> None:
+        with self._lock:
+            self._facts.get(serial, {}).pop(key, None)
+
+    def fact(self, serial: str, key: str, loader: Callable[[], Any], max_age: Optional[float] = None) -> Any:
+        with self._lock:
+            facts = self._facts.get(serial)
+            if facts is not None and key in facts:
+                value, stored = facts[key]
+                if max_age is None or time.monotonic() - stored <= max_age:
+                    return value
+        value = loader()
+        if value is not None:
+            with self._lock:
+                self._facts.setdefault(serial, {})[key] = (value, time.monotonic())
+        return value
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tracing import Tracer, get_tracer
+
+
+class RegistryError(Exception):
+    pass
+
+
+class DeviceRegistry:
+    def __init__(self, path: str, legacy_dir: Optional[str] = None, tracer: Optional[Tracer] = None) -> None:
+        self.path = path
+        self.legacy_dir = legacy_dir
+        self.tracer = tracer or get_tracer()
+        self.errors: List[str] = []
+        self._devices: List[Dict[str, str]] = []
+        self._by_name: Dict[str, Dict[str, str]] = {}
+        self._by_serial: Dict[str, Dict[str, str]] = {}
+        self._by_address: Dict[str, Dict[str, str]] = {}
+        self._stat: Optional[Tuple[int, int]] = None
+        self._generation: int = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def address(data: Dict[str, str]) -> str:
+        return f"{data['ip']}:{data['port']}"
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _index(self, devices: List[Dict[str, str]]) -> None:
+        self._devices = devices
+        self._by_name = {d['name']: d for d in devices}
+        self._by_serial = {d['serial']: d for d in devices if d.get('serial')}
+        self._by_address = {self.address(d): d for d in devices if d.get('ip') and d.get('port')}
+        self._generation += 1
+
+    def _read_legacy(self) -> List[Dict[str, str]]:
+        if not self.legacy_dir or not os.path.isdir(self.legacy_dir):
+            return []
+        entries: List[Tuple[float, Dict[str, str]]] = []
+        with os.scandir(self.legacy_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entry.path, 'r') as f:
+                        data = json.load(f)
+                    entries.append((entry.stat().st_mtime, {k: str(data[k]) for k in ('name', 'serial', 'ip', 'port')}))
+                except Exception as e:
+                    self.errors.append(f"Error loading device file {entry.path}: {str(e)}")
+        entries.sort(key=lambda x: x[0], reverse=True)
+        seen: Dict[str, Dict[str, str]] = {}
+        for _, data in entries:
+            seen.setdefault(data['name'], data)
+        return list(seen.values())
+
+    def _write(self, devices: List[Dict[str, str]]) -> None:
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"devices": devices}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._index(devices)
+        self._stat = self._file_stat()
+
+    def refresh(self) -> None:
+        with self._lock:
+            stat = self._file_stat()
+            if stat is not None and stat == self._stat:
+                return
+            if stat is None:
+                with self.tracer.span('registry', 'legacy-import', self.legacy_dir) as span:
+                    errors = len(self.errors)
+                    legacy = self._read_legacy()
+                    span.code = 0 if len(self.errors) == errors else 1
+                if legacy:
+                    self._write(legacy)
+                elif self._stat is not None or not self._generation:
+                    self._stat = None
+                    self._index([])
+                return
+            with self.tracer.span('registry', 'load', self.path) as span:
+                try:
+                    with open(self.path, 'r') as f:
+                        devices = json.load(f).get('devices', [])
+                    span.code = 0
+                except Exception as e:
+                    self.errors.append(f"Error loading device registry {self.path}: {str(e)}")
+                    devices = []
+                    span.code = 1
+            self._stat = stat
+            self._index(devices)
+
+    @property
+    def generation(self) -> int:
+        self.refresh()
+        return self._generation
+
+    def devices(self) -> List[Dict[str, str]]:
+        self.refresh()
+        return list(self._devices)
+
+    def get(self, name: str) -> Optional[Dict[str, str]]:
+        self.refresh()
+        return self._by_name.get(name)
+
+    def by_serial(self, serial: str) -> Optional[Dict[str, str]]:
+        self.refresh()
+        return self._by_serial.get(serial)
+
+    def by_address(self, address: str) -> Optional[Dict[str, str]]:
+        self.refresh()
+        return self._by_address.get(address)
+
+    def find(self, key: str) -> Optional[Dict[str, str]]:
+        self.refresh()
+        return self._by_name.get(key) or self._by_serial.get(key) or self._by_address.get(key)
+
+    def add_many(self, devices: Iterable[Dict[str, str]]) -> None:
+        with self._lock:
+            self.refresh()
+            new = [{k: str(d[k]) for k in ('name', 'serial', 'ip', 'port')} for d in devices]
+            names = [d['name'] for d in new]
+            duplicates = [n for n in names if n in self._by_name] + [n for i, n in enumerate(names) if n in names[:i]]
+            if duplicates:
+                raise RegistryError(f"A device with name '{duplicates[0]}' already exists.")
+            replaced = {d['serial'] for d in new if d['serial']}
+            kept = [d for d in self._devices if d.get('serial') not in replaced]
+            owners = {self.address(d): d['name'] for d in kept if d.get('ip') and d.get('port')}
+            for d in new:
+                address = self.address(d)
+                if d['ip'] and address in owners:
+                    raise RegistryError(f"Address {address} is already registered as '{owners[address]}'.")
+                owners[address] = d['name']
+            self._write(new[::-1] + kept)
+
+    def add(self, name: str, ip: str, port: str, serial: str) -> None:
+        self.add_many([{"name": name, "serial": serial, "ip": ip, "port": port}])
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            self.refresh()
+            if name not in self._by_name:
+                return False
+            self._write([d for d in self._devices if d['name'] != name])
+            return True
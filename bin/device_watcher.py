@@ -0,0 +1,107 @@
+import socket
+import threading
+from typing import Callable, Dict, List, Optional
+
+from adb_client import (AdbHostClient, AdbProtocolError, AdbServerUnavailable, read_length_prefixed, read_status,
+                        send_request)
+from device_info import DeviceInfo, parse_devices_output
+
+
+class DeviceWatcher:
+    def __init__(
+        self,
+        client: Optional[AdbHostClient],
+        poll: Callable[[], List[DeviceInfo]],
+        on_change: Optional[Callable[[List[DeviceInfo]], None]] = None,
+        poll_interval: float = 2.0
+    ) -> None:
+        self.client = client
+        self.poll = poll
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.devices: Dict[str, DeviceInfo] = {}
+        self.live: bool = False
+        self._stop = threading.Event()
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def state(self, serial: str) -> Optional[str]:
+        if not self.running:
+            return None
+        device = self.devices.get(serial)
+        return device.state if device else None
+
+    def live_state(self, serial: str) -> Optional[str]:
+        return self.state(serial) if self.live else None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="device-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        sock = self._sock
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def _publish(self, devices: List[DeviceInfo]) -> None:
+        current = {d.serial: d for d in devices}
+        if current == self.devices:
+            return
+        if self.client is not None:
+            for serial in set(current) | set(self.devices):
+                old, new = self.devices.get(serial), current.get(serial)
+                if old != new:
+                    self.client.forget(serial)
+        self.devices = current
+        if self.on_change:
+            self.on_change(devices)
+
+    def _track(self, client: AdbHostClient) -> None:
+        for request in ("host:track-devices-l", "host:track-devices"):
+            sock = client.open_socket()
+            self._sock = sock
+            try:
+                send_request(sock, request)
+                try:
+                    read_status(sock)
+                except AdbProtocolError as e:
+                    if isinstance(e, AdbServerUnavailable) or request == "host:track-devices":
+                        raise
+                    continue
+                self.live = True
+                while not self._stop.is_set():
+                    self._publish(parse_devices_output(read_length_prefixed(sock)))
+                return
+            finally:
+                self.live = False
+                self._sock = None
+                sock.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self.client is not None:
+                try:
+                    self._track(self.client)
+                    continue
+                except (AdbProtocolError, OSError, ValueError):
+                    if self._stop.is_set():
+                        return
+            try:
+                self._publish(self.poll())
+            except Exception:
+                pass
+            self._stop.wait(self.poll_interval)
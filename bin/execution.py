@@ -0,0 +1,118 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+TIMEOUT_EXIT_CODE: int = 124
+SKIPPED_EXIT_CODE: int = 125
+CANCELLED_EXIT_CODE: int = 130
+
+
+class CancelToken:
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        self.timeout = timeout
+        self.deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._guards: List["CommandGuard"] = []
+        self._timer: Optional[threading.Timer] = None
+        if timeout is not None:
+            self._timer = threading.Timer(timeout, self.cancel, args=('timeout',))
+            self._timer.daemon = True
+            self._timer.start()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled') -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            guards = list(self._guards)
+        for guard in guards:
+            guard.abort()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def failure(self) -> Tuple[str, int]:
+        if self.reason == 'timeout':
+            return f"Group timed out after {self.timeout:g}s\n", TIMEOUT_EXIT_CODE
+        return "Cancelled\n", CANCELLED_EXIT_CODE
+
+    def dispose(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _register(self, guard: "CommandGuard") -> bool:
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self._guards.append(guard)
+            return True
+
+    def _unregister(self, guard: "CommandGuard") -> None:
+        with self._lock:
+            if guard in self._guards:
+                self._guards.remove(guard)
+
+
+class CommandGuard:
+    def __init__(self, token: Optional[CancelToken], abort: Callable[[], None], timeout: Optional[float] = None) -> None:
+        self.token = token or CancelToken()
+        self._abort = abort
+        self.timeout = timeout
+        self.timed_out: bool = False
+        self.aborted: bool = False
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "CommandGuard":
+        if not self.token._register(self):
+            self.abort()
+        self.rearm()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.token._unregister(self)
+
+    def rearm(self) -> None:
+        if self.timeout is None:
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.timeout, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self) -> None:
+        self.timed_out = True
+        self.abort()
+
+    def abort(self) -> None:
+        if self.aborted:
+            return
+        self.aborted = True
+        try:
+            self._abort()
+        except Exception:
+            pass
+
+    def failure(self) -> Tuple[str, int]:
+        if self.timed_out:
+            return f"Timed out after {self.timeout:g}s\n", TIMEOUT_EXIT_CODE
+        return self.token.failure()
+
+    def result(self, output: str, returncode: int) -> Tuple[str, int]:
+        if not self.aborted:
+            return output, returncode
+        message, code = self.failure()
+        return output + message, code
@@ -0,0 +1,383 @@
+import argparse
+import os
+import re
+import shutil
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import IO, Dict, List, Optional, Tuple
+
+from adb_client import SHELL_CLOSE_STDIN, SHELL_EXIT, SHELL_STDERR, SHELL_STDIN, SHELL_STDOUT
+
+DEVICE_DIRS: Tuple[str, ...] = ('sdcard', 'data/local/tmp')
+HOST_TOOLS: Tuple[str, ...] = ('cat', 'cp', 'find', 'head', 'ls', 'md5sum', 'mkdir', 'mv', 'rm', 'rmdir', 'sleep', 'stat',
+                               'tail', 'touch', 'wc', 'yes')
+ABSOLUTE_PATH = re.compile(r'(?<![\w.:/~}$-])/[^\s;|&<>()\'"`]*')
+PARENT_DIR = re.compile(r'(?:^|(?<=[\s/\'"=<>]))\.\.(?=$|[/\s\'";|&<>)])')
+TOOLS: Dict[str, str] = {
+    'getprop': """#!/bin/sh
+if [ -z "$1" ]; then
+  printf '[ro.serialno]: [%s]\\n[ro.product.model]: [Fake Device]\\n' "$FAKE_SERIAL"
+  printf '[ro.product.manufacturer]: [ADBTool]\\n[ro.build.version.release]: [14]\\n[ro.build.version.sdk]: [34]\\n'
+else
+  case "$1" in
+    ro.serialno) echo "$FAKE_SERIAL";;
+    ro.product.model) echo "Fake Device";;
+    ro.product.manufacturer) echo ADBTool;;
+    ro.build.version.release) echo 14;;
+    ro.build.version.sdk) echo 34;;
+    *) echo;;
+  esac
+fi
+""",
+    'ip': """#!/bin/sh
+echo "10.0.0.0/16 dev wlan0 proto kernel scope link src $FAKE_IP"
+""",
+    'bench-output': """#!/bin/sh
+yes 'fake device output line for benchmarking' | head -c "${1:-$FAKE_OUTPUT_BYTES}"
+""",
+    'pm': """#!/bin/sh
+if [ "$1" = list ]; then
+  i=0
+  while [ $i -lt 50 ]; do echo "package:com.fake.app$i versionCode:$i"; i=$((i+1)); done
+else
+  echo Success
+fi
+""",
+}
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+def _okay(sock: socket.socket, payload: Optional[bytes] = None) -> None:
+    sock.sendall(b'OKAY' + (b'' if payload is None else b'%04x' % len(payload) + payload))
+
+
+def _fail(sock: socket.socket, message: str) -> None:
+    data = message.encode()
+    sock.sendall(b'FAIL' + b'%04x' % len(data) + data)
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, port: int = 0, devices: int = 4, latency: float = 0.0, output_bytes: int = 4096) -> None:
+        self.latency = latency
+        self.output_bytes = output_bytes
+        self.devices: Dict[str, str] = {f"FAKE{idx:04d}": 'device' for idx in range(devices)}
+        self.addresses: Dict[str, str] = {
+            serial: f"10.0.{idx // 250}.{idx % 250 + 2}" for idx, serial in enumerate(self.devices)}
+        self.connected: Dict[str, str] = {}
+        self.requests: int = 0
+        self.lock = threading.Lock()
+        self.shell = shutil.which('sh') or '/bin/sh'
+        self.root = tempfile.mkdtemp(prefix='fake-adb-')
+        self.tools_dir = os.path.join(self.root, 'tools')
+        os.makedirs(self.tools_dir)
+        os.symlink(self.shell, os.path.join(self.tools_dir, 'sh'))
+        for name in HOST_TOOLS:
+            tool = shutil.which(name)
+            if tool:
+                os.symlink(tool, os.path.join(self.tools_dir, name))
+        for name, script in TOOLS.items():
+            path = os.path.join(self.tools_dir, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(script)
+            os.chmod(path, 0o755)
+        for serial in self.devices:
+            for directory in DEVICE_DIRS:
+                os.makedirs(os.path.join(self.device_root(serial), directory))
+        self._thread: Optional[threading.Thread] = None
+        super().__init__(('127.0.0.1', port), FakeAdbHandler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> 'FakeAdbServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-adb', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.close()
+
+    def close(self) -> None:
+        self.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def resolve(self, target: str) -> Optional[str]:
+        if target in self.devices:
+            return target
+        return self.connected.get(target)
+
+    def device_root(self, serial: str) -> str:
+        return os.path.join(self.root, 'devices', serial)
+
+    def device_path(self, serial: str, path: str) -> str:
+        if path == '/dev/null':
+            return path
+        return self.device_root(serial) + os.path.normpath('/' + path.lstrip('/')).rstrip('/')
+
+    def confine(self, serial: str, command: str) -> Optional[str]:
+        if PARENT_DIR.search(command):
+            return None
+        return ABSOLUTE_PATH.sub(lambda m: self.device_path(serial, m.group(0)), command)
+
+    def unconfine(self, serial: str, output: bytes) -> bytes:
+        root = self.device_root(serial).encode()
+        return output.replace(root + b'/', b'/').replace(root, b'/')
+
+    def environment(self, serial: str) -> Dict[str, str]:
+        return {'PATH': self.tools_dir, 'HOME': self.device_root(serial), 'LC_ALL': 'C', 'FAKE_SERIAL': serial,
+                'FAKE_IP': self.addresses[serial], 'FAKE_OUTPUT_BYTES': str(self.output_bytes)}
+
+    def device_list(self, long: bool) -> str:
+        lines: List[str] = []
+        for idx, (serial, state) in enumerate(self.devices.items(), start=1):
+            extra = f" usb:1-{idx} product:fake model:Fake_Device device:fake transport_id:{idx}" if long else ""
+            lines.append(f"{serial}\t{state}{extra}")
+        for idx, (target, serial) in enumerate(self.connected.items(), start=len(self.devices) + 1):
+            extra = f" product:fake model:Fake_Device device:fake transport_id:{idx}" if long else ""
+            lines.append(f"{target}\t{self.devices[serial]}{extra}")
+        return "".join(f"{line}\n" for line in lines)
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    server: FakeAdbServer
+
+    def handle(self) -> None:
+        sock: socket.socket = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        serial: Optional[str] = None
+        try:
+            while True:
+                request = _recv_exact(sock, int(_recv_exact(sock, 4), 16)).decode()
+                with self.server.lock:
+                    self.server.requests += 1
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                if request.startswith('host:transport:'):
+                    serial = self.server.resolve(request.split(':', 2)[2])
+                    if serial is None:
+                        _fail(sock, f"device '{request.split(':', 2)[2]}' not found")
+                        return
+                    _okay(sock)
+                    continue
+                if request in ('host:transport-any', 'host:transport-usb'):
+                    serial = next(iter(self.server.devices), None)
+                    if serial is None:
+                        _fail(sock, "no devices/emulators found")
+                        return
+                    _okay(sock)
+                    continue
+                if serial is None:
+                    self.host_service(sock, request)
+                else:
+                    self.device_service(sock, serial, request)
+                return
+        except (EOFError, ConnectionError, OSError):
+            return
+
+    def host_service(self, sock: socket.socket, request: str) -> None:
+        server = self.server
+        if request == 'host:version':
+            _okay(sock, b'0029')
+        elif request in ('host:devices', 'host:devices-l'):
+            _okay(sock, server.device_list(request.endswith('-l')).encode())
+        elif request == 'host:track-devices':
+            _okay(sock)
+            last = None
+            while True:
+                current = server.device_list(False).encode()
+                if current != last:
+                    sock.sendall(b'%04x' % len(current) + current)
+                    last = current
+                time.sleep(0.05)
+        elif request.startswith('host:connect:'):
+            target = request.split(':', 2)[2]
+            ip = target.rsplit(':', 1)[0]
+            serial = next((s for s, address in server.addresses.items() if address == ip), None)
+            if serial is None:
+                _okay(sock, f"failed to connect to {target}".encode())
+            else:
+                server.connected[target] = serial
+                _okay(sock, f"connected to {target}".encode())
+        elif request.startswith('host:disconnect:'):
+            target = request.split(':', 2)[2]
+            if target:
+                server.connected.pop(target, None)
+            else:
+                server.connected.clear()
+            _okay(sock, b'disconnected')
+        elif request.startswith('host-serial:'):
+            target, query = request[len('host-serial:'):].rsplit(':', 1)
+            serial = server.resolve(target)
+            if serial is None:
+                _fail(sock, f"device '{target}' not found")
+            elif query == 'get-serialno':
+                _okay(sock, serial.encode())
+            elif query == 'get-state':
+                _okay(sock, server.devices[serial].encode())
+            elif query == 'features':
+                _okay(sock, b'shell_v2,cmd')
+            else:
+                _fail(sock, f"unknown query {query}")
+        else:
+            _fail(sock, f"unknown host service {request}")
+
+    def device_service(self, sock: socket.socket, serial: str, request: str) -> None:
+        if request.startswith(('shell,v2,raw:', 'shell:')):
+            v2 = request.startswith('shell,v2,raw:')
+            command = self.server.confine(serial, request.split(':', 1)[1])
+            _okay(sock)
+            if command is None:
+                message = b"sh: '..' leaves the fake device's root\n"
+                if v2:
+                    message = struct.pack('<BI', SHELL_STDERR, len(message)) + message + \
+                        struct.pack('<BI', SHELL_EXIT, 1) + bytes([1])
+                sock.sendall(message)
+            elif v2:
+                self.shell_v2(sock, serial, command)
+            else:
+                sock.sendall(self.server.unconfine(serial, subprocess.run(
+                    [self.server.shell, '-c', command], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    cwd=self.server.device_root(serial), env=self.server.environment(serial)).stdout))
+        elif request == 'sync:':
+            _okay(sock)
+            self.sync(sock, serial)
+        elif request.startswith('tcpip:'):
+            _okay(sock)
+            sock.sendall(f"restarting in TCP mode port: {request[6:]}\n".encode())
+        elif request in ('usb:', 'root:', 'unroot:', 'reboot:'):
+            _okay(sock)
+        else:
+            _fail(sock, f"unknown device service {request}")
+
+    def shell_v2(self, sock: socket.socket, serial: str, command: str) -> None:
+        server = self.server
+        process = subprocess.Popen([server.shell, '-c', command] if command else [server.shell],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   cwd=server.device_root(serial), env=server.environment(serial))
+        lock = threading.Lock()
+
+        def pump(stream: IO[bytes], packet_id: int) -> None:
+            while True:
+                data = os.read(stream.fileno(), 65536)
+                if not data:
+                    return
+                data = server.unconfine(serial, data)
+                with lock:
+                    sock.sendall(struct.pack('<BI', packet_id, len(data)) + data)
+
+        def feed() -> None:
+            assert process.stdin is not None
+            try:
+                while True:
+                    packet_id, length = struct.unpack('<BI', _recv_exact(sock, 5))
+                    data = _recv_exact(sock, length) if length else b''
+                    if packet_id == SHELL_STDIN:
+                        script = server.confine(serial, data.decode('utf-8', errors='replace'))
+                        if script is None:
+                            raise ValueError("'..' leaves the fake device's root")
+                        process.stdin.write(script.encode('utf-8'))
+                        process.stdin.flush()
+                    elif packet_id == SHELL_CLOSE_STDIN:
+                        process.stdin.close()
+            except (EOFError, OSError, ValueError):
+                process.kill()
+
+        threading.Thread(target=feed, daemon=True).start()
+        pumps = [threading.Thread(target=pump, args=(process.stdout, SHELL_STDOUT)),
+                 threading.Thread(target=pump, args=(process.stderr, SHELL_STDERR))]
+        for thread in pumps:
+            thread.start()
+        for thread in pumps:
+            thread.join()
+        code = process.wait()
+        with lock:
+            sock.sendall(struct.pack('<BI', SHELL_EXIT, 1) + bytes([code & 0xFF]))
+
+    def sync(self, sock: socket.socket, serial: str) -> None:
+        while True:
+            command, length = struct.unpack('<4sI', _recv_exact(sock, 8))
+            if command == b'QUIT':
+                return
+            path = _recv_exact(sock, length).decode()
+            if command == b'STAT':
+                try:
+                    st = os.stat(self.server.device_path(serial, path))
+                    sock.sendall(b'STAT' + struct.pack('<III', st.st_mode, st.st_size, int(st.st_mtime)))
+                except OSError:
+                    sock.sendall(b'STAT' + struct.pack('<III', 0, 0, 0))
+            elif command == b'SEND':
+                path, mode = path.rsplit(',', 1)
+                path = self.server.device_path(serial, path)
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                with open(path, 'wb') as f:
+                    while True:
+                        chunk_id, size = struct.unpack('<4sI', _recv_exact(sock, 8))
+                        if chunk_id == b'DATA':
+                            f.write(_recv_exact(sock, size))
+                        elif chunk_id == b'DONE':
+                            break
+                os.chmod(path, int(mode) & 0o777)
+                sock.sendall(b'OKAY' + struct.pack('<I', 0))
+            elif command == b'RECV':
+                try:
+                    with open(self.server.device_path(serial, path), 'rb') as f:
+                        while True:
+                            data = f.read(65536)
+                            if not data:
+                                break
+                            sock.sendall(b'DATA' + struct.pack('<I', len(data)) + data)
+                    sock.sendall(b'DONE' + struct.pack('<I', 0))
+                except OSError as e:
+                    message = self.server.unconfine(serial, str(e).encode())
+                    sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="fake_adb", description="Deterministic stand-in for the adb server, for benchmarks and offline testing.")
+    parser.add_argument("--port", type=int, default=0,
+                        help="port to listen on (default: a free port, so a real adb server on 5037 is left alone)")
+    parser.add_argument("--devices", type=int, default=4, help="number of fake USB devices (default: 4)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request (default: 0)")
+    parser.add_argument("--output-bytes", type=int, default=4096,
+                        help="bytes printed by the device's bench-output command (default: 4096)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    server = FakeAdbServer(args.port, args.devices, args.latency, args.output_bytes)
+    print(f"fake adb server on 127.0.0.1:{server.port} with {len(server.devices)} devices "
+          f"(export ANDROID_ADB_SERVER_PORT={server.port})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from terminal import ANSI_PATTERN
+
+
+def trigrams(text: str) -> List[str]:
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+class SearchIndex:
+    def __init__(self, items: Sequence[str]) -> None:
+        self.keys: List[str] = [ANSI_PATTERN.sub('', item).lower() for item in items]
+        self._postings: Optional[Dict[str, List[int]]] = None
+        self._last: Tuple[str, List[int]] = ("", list(range(len(self.keys))))
+
+    def _build(self) -> Dict[str, List[int]]:
+        postings: Dict[str, List[int]] = {}
+        for idx, key in enumerate(self.keys):
+            for gram in set(trigrams(key)):
+                bucket = postings.get(gram)
+                if bucket is None:
+                    postings[gram] = [idx]
+                else:
+                    bucket.append(idx)
+        return postings
+
+    def _candidates(self, query: str) -> Sequence[int]:
+        previous_query, previous = self._last
+        if previous_query and previous_query in query:
+            return previous
+        if len(query) < 3:
+            return range(len(self.keys))
+        if self._postings is None:
+            self._postings = self._build()
+        buckets = sorted((self._postings.get(gram, []) for gram in set(trigrams(query))), key=len)
+        if not buckets[0]:
+            return []
+        matches = set(buckets[0])
+        for bucket in buckets[1:]:
+            matches.intersection_update(bucket)
+            if not matches:
+                return []
+        return sorted(matches)
+
+    def search(self, query: str) -> List[int]:
+        query = query.lower()
+        if not query:
+            return list(range(len(self.keys)))
+        keys = self.keys
+        result = [idx for idx in self._candidates(query) if query in keys[idx]]
+        self._last = (query, result)
+        return result
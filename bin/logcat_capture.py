@@ -0,0 +1,375 @@
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from command_stream import CommandStream, OutputBuffer
+
+RECORD = struct.Struct('<QqIIcxxxI')
+LEVELS: str = 'VDIWEF'
+LOGCAT_COMMAND: str = "shell logcat -v threadtime"
+THREADTIME = re.compile(r'^(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d{3})\s+(\d+)\s+(\d+) ([VDIWEFS]) (.*?)\s*: ')
+
+
+def safe_name(serial: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]', '_', serial)
+
+
+def parse_time(value: str, now: Optional[datetime] = None) -> float:
+    now = now or datetime.now()
+    relative = re.fullmatch(r'-(\d+)([smh])', value.strip())
+    if relative:
+        return now.timestamp() - int(relative.group(1)) * {'s': 1, 'm': 60, 'h': 3600}[relative.group(2)]
+    for fmt in ('%m-%d %H:%M:%S', '%m-%d %H:%M', '%H:%M:%S', '%H:%M'):
+        try:
+            parsed = datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+        if fmt.startswith('%m'):
+            return parsed.replace(year=now.year).timestamp()
+        return parsed.replace(year=now.year, month=now.month, day=now.day).timestamp()
+    raise ValueError(f"Unrecognised time '{value}' (use HH:MM[:SS], MM-DD HH:MM[:SS] or -10m)")
+
+
+class LogQuery:
+    def __init__(
+        self,
+        tag: Optional[str] = None,
+        min_level: Optional[str] = None,
+        pid: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        text: Optional[str] = None
+    ) -> None:
+        self.tag = tag
+        self.min_level = min_level.upper()[:1] if min_level else None
+        self.pid = pid
+        self.since = since
+        self.until = until
+        self.text = text
+
+    @classmethod
+    def parse(cls, query: str) -> 'LogQuery':
+        fields: Dict[str, str] = {}
+        words: List[str] = []
+        for word in query.split():
+            key, sep, value = word.partition(':')
+            if sep and key in ('tag', 'level', 'pid', 'since', 'until') and value:
+                fields[key] = value
+            else:
+                words.append(word)
+        return cls(
+            tag=fields.get('tag'),
+            min_level=fields.get('level'),
+            pid=int(fields['pid']) if 'pid' in fields else None,
+            since=parse_time(fields['since'].replace('_', ' ')) if 'since' in fields else None,
+            until=parse_time(fields['until'].replace('_', ' ')) if 'until' in fields else None,
+            text=" ".join(words) or None)
+
+
+class LogSegment:
+    def __init__(self, base: str) -> None:
+        self.base = base
+        self.log_path = base + '.log'
+        self.index_path = base + '.idx'
+        self._checked: int = 0
+        self._sorted: Optional[int] = None
+        self._last_stamp: int = 0
+
+    @property
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+
+    def remove(self) -> bool:
+        try:
+            for path in (self.log_path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _sorted_records(self, index: mmap.mmap, count: int) -> int:
+        if self._sorted is None and count > self._checked:
+            records = RECORD.iter_unpack(index[self._checked * RECORD.size:count * RECORD.size])
+            for idx, (_, stamp, *_) in enumerate(records, start=self._checked):
+                if stamp < self._last_stamp:
+                    self._sorted = idx
+                    break
+                self._last_stamp = stamp
+            self._checked = count
+        return count if self._sorted is None else min(self._sorted, count)
+
+    def search(self, query: LogQuery, tag_id: Optional[int], matches: Deque[str]) -> None:
+        try:
+            index_size = os.path.getsize(self.index_path) // RECORD.size * RECORD.size
+            log_size = os.path.getsize(self.log_path)
+        except OSError:
+            return
+        if not index_size or not log_size:
+            return
+        with open(self.index_path, 'rb') as index_file, open(self.log_path, 'rb') as log_file:
+            with mmap.mmap(index_file.fileno(), index_size, access=mmap.ACCESS_READ) as index, \
+                    mmap.mmap(log_file.fileno(), log_size, access=mmap.ACCESS_READ) as log:
+                count = index_size // RECORD.size
+                ordered = self._sorted_records(index, count)
+                start = 0
+                since = int(query.since * 1000) if query.since is not None else None
+                if since is not None:
+                    low, high = 0, ordered
+                    while low < high:
+                        mid = (low + high) // 2
+                        if RECORD.unpack_from(index, mid * RECORD.size)[1] < since:
+                            low = mid + 1
+                        else:
+                            high = mid
+                    start = low
+                until = int(query.until * 1000) if query.until is not None else None
+                min_rank = LEVELS.find(query.min_level) if query.min_level else -1
+                text = query.text.encode('utf-8') if query.text else None
+                for offset, stamp, pid, _, level, tag in RECORD.iter_unpack(index[start * RECORD.size:]):
+                    if since is not None and stamp < since:
+                        continue
+                    if until is not None and stamp > until:
+                        if ordered == count:
+                            break
+                        continue
+                    if (tag_id is not None and tag != tag_id) or (query.pid is not None and pid != query.pid):
+                        continue
+                    if min_rank > 0 and LEVELS.find(level.decode()) < min_rank:
+                        continue
+                    if offset >= log_size:
+                        break
+                    end = log.find(b'\n', offset)
+                    line = log[offset:end if end >= 0 else log_size]
+                    if text is not None and text not in line:
+                        continue
+                    matches.append(line.decode('utf-8', errors='replace'))
+
+
+class LogcatCapture:
+    def __init__(
+        self,
+        serial: str,
+        open_stream: Callable[[str], CommandStream],
+        directory: str,
+        max_segment_bytes: int = 16 * 1024 * 1024,
+        max_segments: int = 8,
+        tail_lines: int = 2000
+    ) -> None:
+        self.serial = serial
+        self.open_stream = open_stream
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.tail: OutputBuffer = OutputBuffer(tail_lines)
+        self.listeners: List[Callable[[str], None]] = []
+        self.lines: int = 0
+        self.error: Optional[str] = None
+        self.retry_interval: float = 2.0
+        self._tags: Dict[str, int] = {}
+        self._segments: List[LogSegment] = []
+        self._log_file = None
+        self._index_file = None
+        self._segment_size: int = 0
+        self._sequence: int = 0
+        self._last_stamp: Optional[str] = None
+        self._stamp_lines: Set[str] = set()
+        self._replay: Set[str] = set()
+        self._cut: str = ""
+        self._epochs: Dict[Tuple[str, ...], float] = {}
+        self._stream: Optional[CommandStream] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def tags_path(self) -> str:
+        return os.path.join(self.directory, 'tags.txt')
+
+    def _load(self) -> None:
+        if os.path.exists(self.tags_path):
+            with open(self.tags_path, encoding='utf-8') as f:
+                for idx, tag in enumerate(f.read().split('\n')[:-1]):
+                    self._tags.setdefault(tag, idx)
+        bases = sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith('.idx'))
+        self._segments = [LogSegment(os.path.join(self.directory, base)) for base in bases]
+        self._sequence = max((int(base.rsplit('-', 1)[-1]) for base in bases if base.rsplit('-', 1)[-1].isdigit()),
+                             default=-1) + 1
+
+    def segments(self) -> List[LogSegment]:
+        with self._lock:
+            return list(self._segments)
+
+    def _tag_id(self, tag: str) -> int:
+        tag_id = self._tags.get(tag)
+        if tag_id is None:
+            tag_id = len(self._tags)
+            self._tags[tag] = tag_id
+            with open(self.tags_path, 'a', encoding='utf-8') as f:
+                f.write(tag.replace('\n', ' ') + '\n')
+        return tag_id
+
+    def _epoch(self, month: str, day: str, hour: str, minute: str) -> float:
+        key = (month, day, hour, minute)
+        epoch = self._epochs.get(key)
+        if epoch is None:
+            now = datetime.now()
+            epoch = datetime(now.year, int(month), int(day), int(hour), int(minute)).timestamp()
+            if len(self._epochs) > 1024:
+                self._epochs.clear()
+            self._epochs[key] = epoch
+        return epoch
+
+    def _rotate(self) -> None:
+        self._close_files()
+        base = os.path.join(self.directory, f"logcat-{time.strftime('%Y%m%d-%H%M%S')}-{self._sequence:04d}")
+        segment = LogSegment(base)
+        self._sequence += 1
+        self._log_file = open(segment.log_path, 'ab')
+        self._index_file = open(segment.index_path, 'ab')
+        self._segment_size = 0
+        with self._lock:
+            self._segments.append(segment)
+            expired = self._segments[:-self.max_segments] if len(self._segments) > self.max_segments else []
+            self._segments = [s for s in self._segments if s not in expired or not s.remove()]
+
+    def _close_files(self) -> None:
+        for handle in (self._log_file, self._index_file):
+            if handle:
+                handle.close()
+        self._log_file = self._index_file = None
+
+    def _write(self, lines: List[str]) -> None:
+        if self._log_file is None or self._segment_size >= self.max_segment_bytes:
+            self._rotate()
+        assert self._log_file is not None and self._index_file is not None
+        data = bytearray()
+        records = bytearray()
+        last_stamp = 0
+        for line in lines:
+            encoded = line.encode('utf-8') + b'\n'
+            match = THREADTIME.match(line)
+            if match:
+                month, day, hour, minute, second, millis, pid, tid, level, tag = match.groups()
+                last_stamp = int((self._epoch(month, day, hour, minute) + int(second)) * 1000) + int(millis)
+                stamp = f"{month}-{day} {hour}:{minute}:{second}.{millis}"
+                if stamp != self._last_stamp:
+                    self._last_stamp = stamp
+                    self._stamp_lines = set()
+                self._stamp_lines.add(line)
+                records += RECORD.pack(self._segment_size + len(data), last_stamp, int(pid), int(tid),
+                                       level.encode(), self._tag_id(tag))
+            data += encoded
+        self._log_file.write(data)
+        self._log_file.flush()
+        self._index_file.write(records)
+        self._index_file.flush()
+        self._segment_size += len(data)
+        self.lines += len(lines)
+
+    def _emit(self, lines: List[str]) -> None:
+        self._write(lines)
+        text = "".join(f"{line}\n" for line in lines)
+        self.tail.write(text)
+        for listener in list(self.listeners):
+            listener(text)
+
+    def _resume(self, lines: List[str]) -> List[str]:
+        kept: List[str] = []
+        for line in lines:
+            if line in self._replay:
+                continue
+            if self._cut and line.startswith(self._cut):
+                self._cut = ""
+            elif self._replay or self._cut:
+                match = THREADTIME.match(line)
+                if match and "{}-{} {}:{}:{}.{}".format(*match.groups()[:6]) != self._last_stamp:
+                    self._replay = set()
+                    if self._cut:
+                        kept.append(self._cut)
+                        self._cut = ""
+            kept.append(line)
+        return kept
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            partial = ""
+            stream: Optional[CommandStream] = None
+            if self._last_stamp:
+                self._replay = set(self._stamp_lines)
+            try:
+                command = LOGCAT_COMMAND + (f" -T '{self._last_stamp}'" if self._last_stamp else "")
+                self._stream = stream = self.open_stream(command)
+                for chunk in stream:
+                    lines = (partial + chunk).split('\n')
+                    partial = lines.pop()
+                    lines = [line.rstrip('\r') for line in lines if line and not line.startswith('--------- ')]
+                    if self._replay or self._cut:
+                        lines = self._resume(lines)
+                    if lines:
+                        self._emit(lines)
+                self.error = None if stream.returncode == 0 else f"logcat exited with code {stream.returncode}"
+            except Exception as e:
+                self.error = str(e) or type(e).__name__
+            finally:
+                if stream:
+                    stream.close()
+                self._stream = None
+            partial = partial.rstrip('\r')
+            if partial and not partial.startswith('--------- '):
+                try:
+                    if self._cut:
+                        self._emit([self._cut])
+                    self._cut = partial
+                except Exception as e:
+                    self.error = str(e) or type(e).__name__
+            self._stop.wait(self.retry_interval)
+        try:
+            if self._cut:
+                self._emit([self._cut])
+                self._cut = ""
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        self._close_files()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"logcat-{self.serial}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        stream = self._stream
+        if stream:
+            stream.cancel()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def search(self, query: LogQuery, limit: int = 1000) -> List[str]:
+        matches: Deque[str] = deque(maxlen=limit)
+        tag_id = None
+        if query.tag:
+            tag_id = self._tags.get(query.tag)
+            if tag_id is None:
+                return []
+        for segment in self.segments():
+            segment.search(query, tag_id, matches)
+        return list(matches)
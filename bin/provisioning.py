@@ -0,0 +1,49 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+DEFAULT_NAME_TEMPLATE: str = "{model}-{suffix}"
+NAME_FIELDS: str = "{model} {manufacturer} {serial} {suffix} {index} {ip}"
+
+
+@dataclass
+class ProvisionResult:
+    serial: str
+    model: str = ""
+    ip: Optional[str] = None
+    name: str = ""
+    port: str = "5555"
+    registered: bool = False
+    connected: bool = False
+    message: str = ""
+
+    @property
+    def address(self) -> str:
+        return f"{self.ip}:{self.port}"
+
+
+def clean_name(text: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]+', '-', text.strip()).strip('-')
+
+
+def render_name(template: str, fields: Dict[str, str], index: int) -> str:
+    values = {key: clean_name(value) for key, value in fields.items()}
+    values['suffix'] = values.get('serial', '')[-4:]
+    try:
+        return clean_name(template.format(index=index, **values))
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Invalid name template '{template}': {e} (fields: {NAME_FIELDS})") from e
+
+
+def unique_names(names: Iterable[str], taken: Set[str]) -> List[str]:
+    used = set(taken)
+    result: List[str] = []
+    for name in names:
+        candidate = name or "device"
+        counter = 2
+        while candidate in used:
+            candidate = f"{name or 'device'}-{counter}"
+            counter += 1
+        used.add(candidate)
+        result.append(candidate)
+    return result
@@ -0,0 +1,168 @@
+import codecs
+import os
+import shlex
+import socket
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional, Tuple
+
+from adb_client import (AdbHostClient, AdbProtocolError, SHELL_CLOSE_STDIN, SHELL_EXIT, SHELL_STDIN,
+                        SHELL_STDOUT, read_shell_v2_packet, write_shell_v2_packet)
+
+
+class ShellSessionError(Exception):
+    def __init__(self, message: str, results: List[Tuple[str, int]], started: bool) -> None:
+        super().__init__(message)
+        self.results = results
+        self.started = started
+
+
+class ShellSession(ABC):
+    def __init__(self) -> None:
+        self.token: str = f"__ADBT_{os.urandom(8).hex()}__"
+        self.lock = threading.Lock()
+        self.closed: bool = False
+        self._buffer: bytes = b''
+
+    @abstractmethod
+    def _send(self, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def _read(self) -> bytes:
+        ...
+
+    def close(self) -> None:
+        self.closed = True
+
+    def abort(self) -> None:
+        self.close()
+
+    def _script(self, commands: List[str]) -> str:
+        lines = ["__adbt_ok=0"]
+        for command in commands:
+            lines.append(
+                f"if [ $__adbt_ok = 0 ]; then sh -c {shlex.quote(command)} </dev/null; __adbt_ok=$?; "
+                f"printf '\\n{self.token}:%d\\n' $__adbt_ok; else printf '\\n{self.token}:skip\\n'; fi")
+        return "\n".join(lines) + "\n"
+
+    def _next_result(self, on_output: Optional[Callable[[str], None]] = None) -> Tuple[str, Optional[int]]:
+        marker = f"\n{self.token}:".encode()
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            start = self._buffer.find(marker)
+            if start >= 0:
+                end = self._buffer.find(b'\n', start + len(marker))
+                if end >= 0:
+                    output = decoder.decode(self._buffer[:start], final=True)
+                    status = self._buffer[start + len(marker):end].decode()
+                    self._buffer = self._buffer[end + 1:]
+                    if on_output:
+                        if output:
+                            on_output(output)
+                        output = ""
+                    return output, None if status == 'skip' else int(status)
+            elif on_output and len(self._buffer) >= len(marker):
+                text = decoder.decode(self._buffer[:1 - len(marker)])
+                self._buffer = self._buffer[1 - len(marker):]
+                if text:
+                    on_output(text)
+            chunk = self._read()
+            if not chunk:
+                raise EOFError
+            self._buffer += chunk
+
+    def run_batch(
+        self,
+        commands: List[str],
+        on_output: Optional[Callable[[str], None]] = None,
+        on_result: Optional[Callable[[], None]] = None
+    ) -> List[Tuple[str, int]]:
+        with self.lock:
+            if self.closed:
+                raise ShellSessionError("Shell session closed", [], started=False)
+            results: List[Tuple[str, int]] = []
+            received = 0
+            try:
+                self._send(self._script(commands).encode('utf-8'))
+                for _ in commands:
+                    output, code = self._next_result(on_output)
+                    received += 1
+                    if code is not None:
+                        results.append((output, code))
+                    if on_result:
+                        on_result()
+            except (EOFError, OSError, AdbProtocolError) as e:
+                self.close()
+                raise ShellSessionError(
+                    str(e) or "Shell session lost", results, started=received > 0 or bool(self._buffer))
+            return results
+
+
+class NativeShellSession(ShellSession):
+    def __init__(self, client: AdbHostClient, serial: str) -> None:
+        super().__init__()
+        self.sock: socket.socket = client.open_service(serial, "shell,v2,raw:")
+
+    def _send(self, data: bytes) -> None:
+        write_shell_v2_packet(self.sock, SHELL_STDIN, data)
+
+    def _read(self) -> bytes:
+        while True:
+            packet_id, data = read_shell_v2_packet(self.sock)
+            if packet_id == SHELL_STDOUT:
+                return data
+            if packet_id == SHELL_EXIT:
+                return b''
+
+    def abort(self) -> None:
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        super().close()
+        try:
+            write_shell_v2_packet(self.sock, SHELL_CLOSE_STDIN)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ProcessShellSession(ShellSession):
+    def __init__(self, adb_path: str, serial: str) -> None:
+        super().__init__()
+        self.process: subprocess.Popen = subprocess.Popen(
+            [adb_path, '-s', serial, 'shell'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def _send(self, data: bytes) -> None:
+        assert self.process.stdin is not None
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def _read(self) -> bytes:
+        assert self.process.stdout is not None
+        return os.read(self.process.stdout.fileno(), 65536)
+
+    def close(self) -> None:
+        super().close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+def open_shell_session(client: Optional[AdbHostClient], adb_path: str, serial: str) -> Optional[ShellSession]:
+    if client is not None:
+        try:
+            if 'shell_v2' in client.features(serial):
+                return NativeShellSession(client, serial)
+        except (AdbProtocolError, OSError):
+            pass
+    try:
+        return ProcessShellSession(adb_path, serial)
+    except OSError:
+        return None
@@ -0,0 +1,294 @@
+import atexit
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Iterable, List, Optional, TextIO, Tuple
+
+ESCAPE: bytes = b'\x1b'
+BACKSPACE: bytes = b'\x08'
+ENTER: bytes = b'\r'
+EXTENDED: bytes = b'\xe0'
+
+CLEAR_SCREEN: str = '\033[H\033[2J\033[3J'
+ANSI_PATTERN = re.compile(r'\033\[[0-9;?]*[A-Za-z]')
+
+ESCAPE_SEQUENCES = {
+    b'\x1b[A': EXTENDED + b'H',
+    b'\x1b[B': EXTENDED + b'P',
+    b'\x1b[C': EXTENDED + b'M',
+    b'\x1b[D': EXTENDED + b'K',
+    b'\x1bOA': EXTENDED + b'H',
+    b'\x1bOB': EXTENDED + b'P',
+    b'\x1bOC': EXTENDED + b'M',
+    b'\x1bOD': EXTENDED + b'K',
+    b'\x1b[H': EXTENDED + b'G',
+    b'\x1b[F': EXTENDED + b'O',
+    b'\x1bOH': EXTENDED + b'G',
+    b'\x1bOF': EXTENDED + b'O',
+    b'\x1b[1~': EXTENDED + b'G',
+    b'\x1b[7~': EXTENDED + b'G',
+    b'\x1b[4~': EXTENDED + b'O',
+    b'\x1b[8~': EXTENDED + b'O',
+    b'\x1b[3~': EXTENDED + b'S',
+    b'\x1b[5~': EXTENDED + b'I',
+    b'\x1b[6~': EXTENDED + b'Q',
+}
+
+
+def split_key(buffer: bytes) -> Tuple[Optional[bytes], bytes]:
+    first = buffer[0]
+    if first == 0x1b:
+        if len(buffer) == 1:
+            return None, buffer
+        if buffer[1:2] in (b'[', b'O'):
+            for idx in range(2, len(buffer)):
+                if 0x40 <= buffer[idx] <= 0x7e:
+                    return ESCAPE_SEQUENCES.get(buffer[:idx + 1], b''), buffer[idx + 1:]
+            return None, buffer
+        return ESCAPE, buffer[1:]
+    if first == 0x7f:
+        return BACKSPACE, buffer[1:]
+    if first == 0x0a:
+        return ENTER, buffer[1:]
+    if first >= 0xc0:
+        length = 4 if first >= 0xf0 else 3 if first >= 0xe0 else 2
+        if len(buffer) < length:
+            return None, buffer
+        return buffer[:length], buffer[length:]
+    return buffer[:1], buffer[1:]
+
+
+class InputBackend(ABC):
+    @abstractmethod
+    def read_key(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def wake(self) -> None:
+        ...
+
+    def restore(self) -> None:
+        pass
+
+
+class PosixInputBackend(InputBackend):
+    escape_timeout: float = 0.03
+
+    def __init__(self, fd: Optional[int] = None) -> None:
+        import termios
+        import tty
+
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+        self._pending: bytes = b''
+        self._saved = None
+        if os.isatty(self.fd):
+            self._saved = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+            atexit.register(self.restore)
+
+    def restore(self) -> None:
+        if self._saved is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self._saved)
+            self._saved = None
+
+    def wake(self) -> None:
+        try:
+            os.write(self._wake_write, b'\0')
+        except BlockingIOError:
+            pass
+
+    def _read_more(self, timeout: Optional[float]) -> Optional[bool]:
+        import select
+
+        ready, _, _ = select.select([self.fd, self._wake_read], [], [], timeout)
+        if not ready:
+            return False
+        if self._wake_read in ready:
+            try:
+                while os.read(self._wake_read, 64):
+                    pass
+            except BlockingIOError:
+                pass
+            return None
+        data = os.read(self.fd, 64)
+        if not data:
+            self._pending += ESCAPE
+        self._pending += data
+        return True
+
+    def read_key(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        while True:
+            while self._pending:
+                token, rest = split_key(self._pending)
+                if token is None:
+                    more = self._read_more(self.escape_timeout)
+                    if more:
+                        continue
+                    token, rest = self._pending[:1], self._pending[1:]
+                self._pending = rest
+                if token:
+                    return token
+            if not self._read_more(timeout):
+                return None
+
+
+class WindowsInputBackend(InputBackend):
+    def __init__(self) -> None:
+        import ctypes
+        import msvcrt
+
+        self.ctypes = ctypes
+        self.msvcrt = msvcrt
+        self.kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        self.kernel32.GetStdHandle.restype = ctypes.c_void_p
+        self.kernel32.CreateEventW.restype = ctypes.c_void_p
+        self._handles = (ctypes.c_void_p * 2)(
+            self.kernel32.GetStdHandle(-10),
+            self.kernel32.CreateEventW(None, False, False, None))
+
+    def _getch(self) -> bytes:
+        key: bytes = self.msvcrt.getch()
+        if key in (b'\x00', EXTENDED):
+            return EXTENDED + self.msvcrt.getch()
+        return key
+
+    def wake(self) -> None:
+        self.kernel32.SetEvent(self._handles[1])
+
+    def _discard_event(self) -> None:
+        record = self.ctypes.create_string_buffer(20)
+        count = self.ctypes.c_ulong(0)
+        if not self.kernel32.PeekConsoleInputW(self._handles[0], record, 1, self.ctypes.byref(count)) or not count.value:
+            return
+        if not self.msvcrt.kbhit():
+            self.kernel32.ReadConsoleInputW(self._handles[0], record, 1, self.ctypes.byref(count))
+
+    def read_key(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.msvcrt.kbhit():
+                return self._getch()
+            wait_ms = 0xFFFFFFFF if deadline is None else max(0, int((deadline - time.monotonic()) * 1000))
+            if self.kernel32.WaitForMultipleObjects(2, self._handles, False, wait_ms) != 0:
+                return None
+            self._discard_event()
+
+
+class ScriptedInputBackend(InputBackend):
+    def __init__(self, keys: Iterable[bytes] = ()) -> None:
+        self.keys: Deque[bytes] = deque(keys)
+        self._event = threading.Event()
+
+    def feed(self, *keys: bytes) -> None:
+        self.keys.extend(keys)
+        self._event.set()
+
+    def wake(self) -> None:
+        self._event.set()
+
+    def read_key(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        if not self.keys:
+            self._event.wait(timeout)
+            self._event.clear()
+        return self.keys.popleft() if self.keys else None
+
+
+_backend: Optional[InputBackend] = None
+
+
+def get_input_backend() -> InputBackend:
+    global _backend
+    if _backend is None:
+        _backend = WindowsInputBackend() if os.name == 'nt' else PosixInputBackend()
+    return _backend
+
+
+def enable_vt_mode() -> None:
+    if os.name != 'nt':
+        return
+    import ctypes
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.GetStdHandle.restype = ctypes.c_void_p
+    handle = kernel32.GetStdHandle(-11)
+    mode = ctypes.c_uint32()
+    if kernel32.GetConsoleMode(ctypes.c_void_p(handle), ctypes.byref(mode)):
+        kernel32.SetConsoleMode(ctypes.c_void_p(handle), mode.value | 0x0004)
+
+
+def visible_width(line: str) -> int:
+    return len(ANSI_PATTERN.sub('', line))
+
+
+class Screen:
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream: TextIO = stream or sys.stdout
+        self._previous: List[Tuple[int, str]] = []
+        self._valid: bool = False
+        enable_vt_mode()
+
+    def invalidate(self) -> None:
+        self._valid = False
+
+    def clear(self) -> None:
+        self.stream.write(CLEAR_SCREEN)
+        self.stream.flush()
+        self._previous = []
+        self._valid = False
+
+    def size(self) -> Tuple[int, int]:
+        return shutil.get_terminal_size()
+
+    def _layout(self, lines: List[str], columns: int) -> Tuple[List[Tuple[int, str]], int]:
+        layout: List[Tuple[int, str]] = []
+        row = 1
+        for line in lines:
+            layout.append((row, line))
+            row += max(1, -(-visible_width(line) // columns))
+        return layout, row
+
+    def render(self, lines: List[str]) -> None:
+        columns, rows = self.size()
+        layout, end_row = self._layout(lines, columns)
+
+        if not self._valid or end_row > rows:
+            frame = CLEAR_SCREEN + '\n'.join(lines) + '\n'
+        else:
+            parts: List[str] = []
+            previous = self._previous
+            for idx, (row, line) in enumerate(layout):
+                if idx < len(previous) and previous[idx] == (row, line):
+                    continue
+                next_row = layout[idx + 1][0] if idx + 1 < len(layout) else end_row
+                parts.extend(f"\033[{r};1H\033[2K" for r in range(next_row - 1, row - 1, -1))
+                parts.append(line)
+            parts.append(f"\033[{end_row};1H\033[J")
+            frame = ''.join(parts)
+
+        self.stream.write(frame)
+        self.stream.flush()
+        self._previous = layout
+        self._valid = end_row <= rows
+
+
+_screen: Optional[Screen] = None
+
+
+def get_screen() -> Screen:
+    global _screen
+    if _screen is None:
+        _screen = Screen()
+    return _screen
+
+
+def clear_screen() -> None:
+    get_screen().clear()
@@ -0,0 +1,238 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterator, List, Optional, TextIO, Tuple
+
+TRACE_ENV: str = 'ADB_TOOL_TRACE'
+BUCKETS_MS: Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+BLOCKS: str = " ▁▂▃▄▅▆▇█"
+SUBCOMMANDS: Tuple[str, ...] = ('am', 'cmd', 'dumpsys', 'pm', 'settings', 'svc', 'wm')
+
+
+def command_key(command: str) -> str:
+    args = command.split()
+    while len(args) > 2 and args[0] in ('-s', '-t', '-H', '-P'):
+        args = args[2:]
+    if not args:
+        return command
+    if args[0] == 'shell' and len(args) > 1:
+        program = args[1].rstrip(';&|').rsplit('/', 1)[-1]
+        if program in SUBCOMMANDS and len(args) > 2 and not args[2].startswith('-'):
+            return f"shell {program} {args[2]}"
+        return f"shell {program}"
+    return args[0]
+
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    device: Optional[str] = None
+    id: int = 0
+    parent: Optional[int] = None
+    started: float = 0.0
+    duration: float = 0.0
+    code: Optional[int] = None
+    thread: str = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind} {command_key(self.name)}"
+
+    def record(self, epoch: float) -> Dict[str, Any]:
+        return {"id": self.id, "parent": self.parent, "kind": self.kind, "name": self.name, "device": self.device,
+                "ts": round(epoch + self.started, 6), "ms": round(self.duration * 1000, 3), "code": self.code,
+                "thread": self.thread}
+
+
+IDLE_SPAN = Span('', '')
+
+
+class LatencyHistogram:
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(BUCKETS_MS) + 1)
+        self.count: int = 0
+        self.failures: int = 0
+        self.total_ms: float = 0.0
+        self.max_ms: float = 0.0
+
+    def add(self, ms: float, failed: bool = False) -> None:
+        bucket = next((idx for idx, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.counts[bucket] += 1
+        self.count += 1
+        self.failures += failed
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        target = fraction * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(BUCKETS_MS[idx], self.max_ms) if idx < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def sparkline(self) -> str:
+        last = max((idx for idx, count in enumerate(self.counts) if count), default=0)
+        peak = max(self.counts) or 1
+        return "".join(BLOCKS[(count * (len(BLOCKS) - 1) + peak - 1) // peak] for count in self.counts[:last + 1])
+
+    def summary(self) -> Dict[str, Any]:
+        return {"count": self.count, "failures": self.failures, "mean_ms": round(self.mean_ms, 3),
+                "p50_ms": round(self.percentile(0.5), 3), "p95_ms": round(self.percentile(0.95), 3),
+                "max_ms": round(self.max_ms, 3), "total_ms": round(self.total_ms, 3)}
+
+
+class Tracer:
+    def __init__(self, path: Optional[str] = None, enabled: bool = False, keep: int = 5000) -> None:
+        self.enabled: bool = enabled or bool(path)
+        self.path: Optional[str] = path
+        self.error: Optional[str] = None
+        self.spans: Deque[Span] = deque(maxlen=keep)
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.since: float = time.time()
+        self.epoch: float = time.time() - time.perf_counter()
+        self._file: Optional[TextIO] = None
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls) -> 'Tracer':
+        return cls(os.environ.get(TRACE_ENV) or None)
+
+    def start(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path and path != self.path:
+                self._close()
+                self.path = path
+                self.error = None
+            self.enabled = True
+
+    def stop(self) -> None:
+        with self._lock:
+            self.enabled = False
+            self._close()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.histograms.clear()
+            self.since = time.time()
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _stack(self) -> List[int]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self) -> Optional[int]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def adopt(self, parent: Optional[int]) -> Iterator[None]:
+        if parent is None:
+            yield
+            return
+        stack = self._stack()
+        stack.append(parent)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    @contextmanager
+    def span(self, kind: str, name: str, device: Optional[str] = None) -> Iterator[Span]:
+        if not self.enabled:
+            yield IDLE_SPAN
+            return
+        stack = self._stack()
+        span = Span(kind, name, device, next(self._ids), stack[-1] if stack else None,
+                    time.perf_counter(), thread=threading.current_thread().name)
+        stack.append(span.id)
+        try:
+            yield span
+        except BaseException:
+            if span.code is None:
+                span.code = 1
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.started
+            stack.pop()
+            self._finish(span)
+
+    def record(self, kind: str, name: str, device: Optional[str], started: float, duration: float,
+               code: Optional[int] = None) -> None:
+        if not self.enabled:
+            return
+        stack = self._stack()
+        self._finish(Span(kind, name, device, next(self._ids), stack[-1] if stack else None, started, duration, code,
+                          threading.current_thread().name))
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+            histogram = self.histograms.get(span.key)
+            if histogram is None:
+                histogram = self.histograms[span.key] = LatencyHistogram()
+            histogram.add(span.duration * 1000, bool(span.code))
+            if not self.path or self.error:
+                return
+            try:
+                if self._file is None:
+                    directory = os.path.dirname(os.path.abspath(self.path))
+                    os.makedirs(directory, exist_ok=True)
+                    self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+                self._file.write(json.dumps(span.record(self.epoch)) + "\n")
+            except OSError as e:
+                self.error = f"Trace file {self.path}: {e}"
+                self._close()
+
+    def last(self, kind: str) -> Optional[Span]:
+        with self._lock:
+            return next((span for span in reversed(self.spans) if span.kind == kind), None)
+
+    def children(self, parent: Span) -> List[Span]:
+        with self._lock:
+            return [span for span in self.spans if span.parent == parent.id]
+
+    def summary(self) -> List[Tuple[str, LatencyHistogram]]:
+        with self._lock:
+            return sorted(self.histograms.items(), key=lambda item: item[1].total_ms, reverse=True)
+
+
+def busy_time(spans: List[Span]) -> float:
+    busy = 0.0
+    end = float('-inf')
+    for span in sorted(spans, key=lambda span: span.started):
+        finish = span.started + span.duration
+        if finish > end:
+            busy += finish - max(span.started, end)
+            end = finish
+    return busy
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer.from_environment()
+    return _tracer
@@ -0,0 +1,413 @@
+import hashlib
+import os
+import posixpath
+import re
+import shlex
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from adb_client import (AdbHostClient, AdbProtocolError, AdbServerUnavailable, AdbSyncConnection, SHELL_EXIT,
+                        SHELL_STDOUT, read_shell_v2_packet)
+from command_plan import TRANSFER_DIRECTIVES
+from execution import CancelToken, CommandGuard
+
+CHUNK_SIZE: int = 1024 * 1024
+HASH_BATCH: int = 64
+ADB_SUMMARY = re.compile(r'(\d+) files? (?:pushed|pulled)(?:, (\d+) skipped)?\..*?\((\d+) bytes in')
+
+
+def parse_transfer(command: str) -> Optional[Tuple[str, str, str]]:
+    try:
+        args = shlex.split(command, posix=os.name != 'nt')
+    except ValueError:
+        return None
+    if os.name == 'nt':
+        args = [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in '\'"' else arg for arg in args]
+    if len(args) == 3 and args[0] in TRANSFER_DIRECTIVES:
+        return args[0], args[1], args[2]
+    return None
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def file_md5(path: str, limit: Optional[int] = None) -> str:
+    digest = hashlib.md5()
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def read_chunks(path: str, offset: int = 0) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+@dataclass
+class TransferItem:
+    relative: str
+    local: str
+    remote: str
+    size: int
+    offset: int = 0
+
+
+@dataclass
+class TransferReport:
+    direction: str
+    source: str
+    destination: str
+    files: int = 0
+    copied: int = 0
+    resumed: int = 0
+    skipped: int = 0
+    bytes: int = 0
+    elapsed: float = 0.0
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    @property
+    def throughput(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        text = (f"{self.direction} {self.source} -> {self.destination}: {self.copied + self.resumed}/{self.files} files "
+                f"transferred ({self.resumed} resumed, {self.skipped} up to date), {format_size(self.bytes)} in "
+                f"{self.elapsed:.1f}s ({format_size(self.throughput)}/s)")
+        if self.failed:
+            text += f", {len(self.failed)} failed"
+        return text
+
+
+class TransferEngine:
+    def __init__(
+        self,
+        client: AdbHostClient,
+        serial: str,
+        workers: int = 4,
+        on_output: Optional[Callable[[str], None]] = None,
+        token: Optional[CancelToken] = None
+    ) -> None:
+        self.client = client
+        self.serial = serial
+        self.workers = max(1, workers)
+        self.on_output = on_output or (lambda text: None)
+        self.token = token
+        self._local = threading.local()
+        self._connections: List[AdbSyncConnection] = []
+        self._sockets: Set[socket.socket] = set()
+        self._lock = threading.Lock()
+
+    def _shell(self, command: str) -> Tuple[str, int]:
+        return self.client.shell(self.serial, command)
+
+    def _sync(self) -> AdbSyncConnection:
+        sync = getattr(self._local, 'sync', None)
+        if sync is None:
+            sync = AdbSyncConnection(self.client, self.serial)
+            self._local.sync = sync
+            with self._lock:
+                self._connections.append(sync)
+        return sync
+
+    def _drop_sync(self) -> None:
+        sync = getattr(self._local, 'sync', None)
+        if sync is not None:
+            sync.close()
+            self._local.sync = None
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for sync in connections:
+            sync.close()
+
+    def remote_sizes(self, remote_dir: str) -> Dict[str, int]:
+        root = remote_dir.rstrip('/') or '/'
+        out, code = self._shell(f"find {shlex.quote(root)} -type f -exec stat -c '%s %n' {{}} + 2>/dev/null")
+        sizes: Dict[str, int] = {}
+        for line in out.splitlines():
+            size, _, path = line.partition(' ')
+            if size.isdigit() and path.startswith(root):
+                sizes[posixpath.relpath(path, root)] = int(size)
+        return sizes
+
+    def remote_md5(self, paths: List[str], limits: Optional[Dict[str, int]] = None) -> Dict[str, str]:
+        limits = limits or {}
+        hashes: Dict[str, str] = {}
+        plain = [path for path in paths if path not in limits]
+        for start in range(0, len(plain), HASH_BATCH):
+            batch = plain[start:start + HASH_BATCH]
+            out, _ = self._shell("md5sum " + " ".join(shlex.quote(path) for path in batch) + " 2>/dev/null")
+            for line in out.splitlines():
+                digest, _, path = line.partition('  ')
+                if path:
+                    hashes[path] = digest
+        for path in paths:
+            if path in limits:
+                out, code = self._shell(f"head -c {limits[path]} {shlex.quote(path)} | md5sum")
+                if code == 0 and out.split():
+                    hashes[path] = out.split()[0]
+        return hashes
+
+    @staticmethod
+    def local_md5(paths: List[str], limits: Optional[Dict[str, int]] = None) -> Dict[str, str]:
+        limits = limits or {}
+        return {path: file_md5(path, limits.get(path)) for path in paths if os.path.isfile(path)}
+
+    def plan_push(self, local_dir: str, remote_dir: str, report: TransferReport) -> List[TransferItem]:
+        local_dir = os.path.expanduser(local_dir)
+        if not os.path.isdir(local_dir):
+            raise FileNotFoundError(f"Local directory not found: {local_dir}")
+        items: List[TransferItem] = []
+        for root, _, files in os.walk(local_dir):
+            for name in sorted(files):
+                local = os.path.join(root, name)
+                relative = os.path.relpath(local, local_dir).replace(os.sep, '/')
+                items.append(TransferItem(relative, local, posixpath.join(remote_dir, relative), os.path.getsize(local)))
+        remote = self.remote_sizes(remote_dir)
+        existing = {item.relative: remote[item.relative] for item in items if item.relative in remote}
+        # Only pulls resume: adbd unlinks a partially sent file when a sync SEND fails, so no remote prefix survives.
+        return self._filter(items, existing, self.local_md5, self.remote_md5,
+                            lambda item: item.local, lambda item: item.remote, report, resume=False)
+
+    def plan_pull(self, remote_dir: str, local_dir: str, report: TransferReport) -> List[TransferItem]:
+        local_dir = os.path.expanduser(local_dir)
+        remote = self.remote_sizes(remote_dir)
+        if not remote:
+            raise FileNotFoundError(f"No files found under {remote_dir}")
+        items = [TransferItem(relative, os.path.join(local_dir, *relative.split('/')),
+                              posixpath.join(remote_dir, relative), size)
+                 for relative, size in sorted(remote.items())]
+        existing = {item.relative: os.path.getsize(item.local) for item in items if os.path.isfile(item.local)}
+        return self._filter(items, existing, self.remote_md5, self.local_md5,
+                            lambda item: item.remote, lambda item: item.local, report,
+                            resume='shell_v2' in self.client.features(self.serial))
+
+    def _filter(
+        self,
+        items: List[TransferItem],
+        existing: Dict[str, int],
+        source_md5: Callable[[List[str], Optional[Dict[str, int]]], Dict[str, str]],
+        target_md5: Callable[[List[str], Optional[Dict[str, int]]], Dict[str, str]],
+        source_of: Callable[[TransferItem], str],
+        target_of: Callable[[TransferItem], str],
+        report: TransferReport,
+        resume: bool = True
+    ) -> List[TransferItem]:
+        report.files = len(items)
+        candidates = [item for item in items if existing.get(item.relative) == item.size
+                      or (resume and 0 < existing.get(item.relative, -1) < item.size)]
+        if not candidates:
+            return items
+        targets = target_md5([target_of(item) for item in candidates], None)
+        limits = {source_of(item): existing[item.relative] for item in candidates if existing[item.relative] < item.size}
+        sources = source_md5([source_of(item) for item in candidates], limits)
+
+        pending: List[TransferItem] = []
+        for item in items:
+            target_hash = targets.get(target_of(item))
+            if not target_hash or target_hash != sources.get(source_of(item)):
+                pending.append(item)
+            elif existing[item.relative] == item.size:
+                report.skipped += 1
+            else:
+                item.offset = existing[item.relative]
+                pending.append(item)
+        return pending
+
+    def _append_local(self, item: TransferItem) -> None:
+        sock = self._open_shell(f"tail -c +{item.offset + 1} {shlex.quote(item.remote)}")
+        try:
+            with open(item.local, 'ab') as f:
+                while True:
+                    packet_id, data = read_shell_v2_packet(sock)
+                    if packet_id == SHELL_STDOUT:
+                        f.write(data)
+                    elif packet_id == SHELL_EXIT:
+                        if data and data[0]:
+                            raise AdbProtocolError(f"tail exited with code {data[0]}")
+                        return
+        finally:
+            self._close_shell(sock)
+
+    def _push(self, item: TransferItem) -> None:
+        mode = os.stat(item.local).st_mode & 0o777
+        self._sync().send(item.remote, read_chunks(item.local), mode, int(os.path.getmtime(item.local)))
+
+    def _pull(self, item: TransferItem) -> None:
+        if item.offset:
+            self._append_local(item)
+            return
+        os.makedirs(os.path.dirname(item.local) or '.', exist_ok=True)
+        with open(item.local, 'wb') as f:
+            for chunk in self._sync().recv(item.remote):
+                f.write(chunk)
+
+    def _transfer(self, direction: str, item: TransferItem, report: TransferReport) -> None:
+        if self.token and self.token.cancelled:
+            raise InterruptedError("Cancelled")
+        started = time.monotonic()
+        try:
+            (self._push if direction == 'push-tree' else self._pull)(item)
+        except (AdbProtocolError, OSError):
+            self._drop_sync()
+            if self.token and self.token.cancelled:
+                raise InterruptedError("Cancelled")
+            raise
+        elapsed = time.monotonic() - started
+        moved = item.size - item.offset
+        with self._lock:
+            report.bytes += moved
+            if item.offset:
+                report.resumed += 1
+            else:
+                report.copied += 1
+        arrow = '↑' if direction == 'push-tree' else '↓'
+        resumed = f" resumed at {format_size(item.offset)}" if item.offset else ""
+        self.on_output(f"  {arrow} {item.relative} ({format_size(moved)}{resumed}, "
+                       f"{format_size(moved / elapsed if elapsed > 0 else 0)}/s)\n")
+
+    def _open_shell(self, command: str) -> socket.socket:
+        sock = self.client.open_service(self.serial, f"shell,v2,raw:{command}")
+        with self._lock:
+            self._sockets.add(sock)
+        return sock
+
+    def _close_shell(self, sock: socket.socket) -> None:
+        with self._lock:
+            self._sockets.discard(sock)
+        sock.close()
+
+    def _abort(self) -> None:
+        with self._lock:
+            sockets = [sync.sock for sync in self._connections] + list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self, direction: str, source: str, destination: str) -> TransferReport:
+        report = TransferReport(direction, source, destination)
+        started = time.monotonic()
+        try:
+            if direction == 'push-tree':
+                items = self.plan_push(source, destination, report)
+            else:
+                items = self.plan_pull(source, destination, report)
+        except AdbServerUnavailable:
+            raise
+        except (AdbProtocolError, OSError) as e:
+            report.failed.append((source, str(e)))
+            report.elapsed = time.monotonic() - started
+            return report
+
+        resumable = sum(1 for item in items if item.offset)
+        self.on_output(f"{direction} {source} -> {destination}: {report.files} files, {len(items) - resumable} to copy, "
+                       f"{resumable} to resume, {report.skipped} up to date\n")
+
+        def worker(item: TransferItem) -> None:
+            try:
+                self._transfer(direction, item, report)
+            except Exception as e:
+                with self._lock:
+                    report.failed.append((item.relative, str(e)))
+                if not isinstance(e, InterruptedError):
+                    self.on_output(f"  ✗ {item.relative}: {e}\n")
+
+        try:
+            if items:
+                with CommandGuard(self.token, self._abort), \
+                        ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as pool:
+                    for _ in pool.map(worker, items):
+                        pass
+        finally:
+            self.close()
+        report.elapsed = time.monotonic() - started
+        return report
+
+
+def _run_adb(args: List[str], token: Optional[CancelToken]) -> Tuple[str, int]:
+    try:
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    except OSError as e:
+        return str(e), 1
+    with CommandGuard(token, process.kill) as guard:
+        stdout, _ = process.communicate()
+    return guard.result(stdout, process.returncode)
+
+
+def process_transfer(
+    adb_path: str,
+    serial: str,
+    direction: str,
+    source: str,
+    destination: str,
+    on_output: Optional[Callable[[str], None]] = None,
+    token: Optional[CancelToken] = None
+) -> TransferReport:
+    report = TransferReport(direction, source, destination)
+    emit = on_output or (lambda text: None)
+    started = time.monotonic()
+    base = [adb_path, '-s', serial]
+    if direction == 'push-tree':
+        local_dir = os.path.expanduser(source)
+        if not os.path.isdir(local_dir):
+            report.failed.append((source, f"Local directory not found: {local_dir}"))
+            return report
+        entries = [os.path.join(local_dir, name) for name in sorted(os.listdir(local_dir))]
+        output, code = _run_adb(base + ['shell', f"mkdir -p {shlex.quote(destination)}"], token)
+        command = base + ['push', '--sync', *entries, destination]
+    else:
+        output, code = _run_adb(base + ['shell', f"ls -1A {shlex.quote(source)}"], token)
+        entries = [posixpath.join(source, name) for name in output.splitlines() if name.strip()]
+        if code == 0 and not entries:
+            output, code = f"No files found under {source}", 1
+        if code == 0:
+            try:
+                os.makedirs(os.path.expanduser(destination), exist_ok=True)
+            except OSError as e:
+                output, code = str(e), 1
+        command = base + ['pull', *entries, os.path.expanduser(destination)]
+    if code == 0 and entries:
+        emit(f"{direction} {source} -> {destination}: {len(entries)} entries via {os.path.basename(adb_path)} "
+             f"{command[3]} (no native adb server connection)\n")
+        output, code = _run_adb(command, token)
+        for match in ADB_SUMMARY.finditer(output):
+            report.copied += int(match.group(1))
+            report.skipped += int(match.group(2) or 0)
+            report.bytes += int(match.group(3))
+        report.files = report.copied + report.skipped
+        if output.strip():
+            emit("".join(f"  {line}\n" for line in output.strip().splitlines()))
+    if code != 0:
+        lines = output.strip().splitlines()
+        report.failed.append((source, lines[-1] if lines else f"adb exited with code {code}"))
+    report.elapsed = time.monotonic() - started
+    return report
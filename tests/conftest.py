@@ -0,0 +1,31 @@
+import os
+import sys
+from typing import Iterator
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+from adb_core import ADBCore  # noqa: E402
+from fake_adb import FakeAdbServer  # noqa: E402
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeAdbServer]:
+    fake = FakeAdbServer(devices=2).start()
+    monkeypatch.setenv('ANDROID_ADB_SERVER_PORT', str(fake.port))
+    try:
+        yield fake
+    finally:
+        fake.stop()
+
+
+@pytest.fixture
+def core(server: FakeAdbServer, tmp_path) -> Iterator[ADBCore]:
+    adb = ADBCore(str(tmp_path / 'config'))
+    adb.adb_path = str(tmp_path / 'missing-adb')
+    try:
+        yield adb
+    finally:
+        adb.close_shell_sessions()
+        adb.adb_client.close()
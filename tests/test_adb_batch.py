@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import adb_batch
+from command_catalog import CommandCatalog
+from device_registry import DeviceRegistry
+
+
+@pytest.fixture
+def config(server, tmp_path):
+    config_dir = tmp_path / 'config'
+    catalog = CommandCatalog(str(config_dir / 'commands.conf'))
+    config_dir.mkdir()
+    catalog.add('ok', ['shell echo ready', 'shell getprop ro.serialno'])
+    catalog.add('fails', ['shell echo first', 'shell exit 7', 'shell echo never'])
+    catalog.add('param', ['shell echo {name}'])
+    DeviceRegistry(str(config_dir / 'devices.json')).add('phone', server.addresses['FAKE0000'], '5555', 'FAKE0000')
+    return str(config_dir)
+
+
+def run(config, capsys, *args):
+    code = adb_batch.main(['--config', config, '--adb', '/nonexistent/adb', *args])
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return code, events
+
+
+def test_successful_group_exits_zero(config, capsys):
+    code, events = run(config, capsys, 'run', 'ok', '-d', 'phone')
+    assert code == adb_batch.EXIT_OK
+    steps = [event for event in events if event['event'] == 'step']
+    assert [(step['exit_code'], step['output']) for step in steps] == [(0, "ready\n"), (0, "FAKE0000\n")]
+    assert events[-1]['event'] == 'summary' and events[-1]['ok'] == 1
+
+
+def test_failed_step_exits_one_and_skips_the_rest(config, capsys):
+    code, events = run(config, capsys, 'run', 'fails', '-d', 'phone')
+    assert code == adb_batch.EXIT_STEP_FAILED
+    assert [step['exit_code'] for step in events if step['event'] == 'step'] == [0, 7]
+    device = next(event for event in events if event['event'] == 'device')
+    assert device['status'] == 'failed' and device['skipped'] == 1
+
+
+@pytest.mark.parametrize('args', [
+    ('run', 'missing', '-d', 'phone'),
+    ('run', 'ok', '-d', 'nobody'),
+    ('run', 'param', '-d', 'phone'),
+    ('run', 'param', '-d', 'phone', '-p', 'novalue'),
+])
+def test_usage_errors_exit_two(config, capsys, args):
+    code, events = run(config, capsys, *args)
+    assert code == adb_batch.EXIT_USAGE
+    assert events[-1]['event'] == 'error'
+
+
+def test_parameters_are_substituted(config, capsys):
+    code, events = run(config, capsys, 'run', 'param', '-d', 'phone', '-p', 'name=fleet')
+    assert code == adb_batch.EXIT_OK
+    assert [step['output'] for step in events if step['event'] == 'step'] == ["fleet\n"]
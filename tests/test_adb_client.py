@@ -0,0 +1,74 @@
+import socket
+import threading
+import time
+
+from adb_client import AdbHostClient, run_native
+
+
+def test_shell_v2_reports_remote_exit_code(server):
+    client = AdbHostClient()
+    try:
+        assert client.shell('FAKE0000', 'echo hello') == ("hello\n", 0)
+        assert client.shell('FAKE0000', 'exit 3') == ("", 3)
+    finally:
+        client.close()
+
+
+def test_run_native_serves_commands_through_the_server(server):
+    client = AdbHostClient()
+    try:
+        assert run_native(client, 'shell getprop ro.serialno', 'FAKE0001') == ("FAKE0001\n", 0)
+        assert run_native(client, '-s FAKE0000 shell false', None) == ("", 1)
+        assert run_native(client, 'get-state', 'FAKE0000') == ("device\n", 0)
+        output, code = run_native(client, 'devices', None)
+        assert code == 0 and "FAKE0000\tdevice" in output
+    finally:
+        client.close()
+
+
+def test_run_native_reports_unknown_devices_and_unsupported_commands(server):
+    client = AdbHostClient()
+    try:
+        output, code = run_native(client, 'shell true', 'NOPE')
+        assert code == 1 and 'not found' in output
+        assert run_native(client, 'install app.apk', 'FAKE0000') is None
+        assert run_native(client, '-t 1 shell true', None) is None
+    finally:
+        client.close()
+
+
+def test_run_native_falls_back_when_no_server_listens():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    client = AdbHostClient(port=port)
+    try:
+        assert run_native(client, 'shell true', 'FAKE0000') is None
+    finally:
+        client.close()
+
+
+def test_shell_without_v2_still_reports_exit_codes(server):
+    client = AdbHostClient()
+    client._features['FAKE0000'] = ['cmd']
+    try:
+        assert client.shell('FAKE0000', 'echo hello') == ("hello\n", 0)
+        assert client.shell('FAKE0000', 'printf partial; exit 5') == ("partial", 5)
+        assert client.shell('FAKE0000', 'echo last # comment') == ("last\n", 0)
+    finally:
+        client.close()
+
+
+def test_pool_refills_with_one_thread_and_bounded_idle_sockets(server):
+    client = AdbHostClient()
+    try:
+        for _ in range(20):
+            assert client.shell('FAKE0000', 'true') == ("", 0)
+        assert sum(1 for thread in threading.enumerate() if thread.name == 'adb-pool') == 1
+        deadline = time.monotonic() + 2
+        while len(client.pool._idle.get('FAKE0000', ())) < client.pool.max_idle and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        assert len(client.pool._idle['FAKE0000']) == client.pool.max_idle
+    finally:
+        client.close()
@@ -0,0 +1,109 @@
+import os
+import zipfile
+
+import pytest
+
+from adb_client import AdbHostClient
+from apk_deploy import (REMOTE_STAGING, ApkInfo, PackageInstaller, collect_apks, deploy_apks, parse_deploy,
+                        parse_manifest, parse_package_versions, read_apk_info)
+
+MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'AndroidManifest.xml')
+
+
+def manifest_blob():
+    with open(MANIFEST, 'rb') as f:
+        return f.read()
+
+
+def make_apk(path, manifest=None):
+    with zipfile.ZipFile(path, 'w') as apk:
+        apk.writestr('AndroidManifest.xml', manifest_blob() if manifest is None else manifest)
+        apk.writestr('classes.dex', b'dex\n035\x00')
+    return str(path)
+
+
+class RecordingInstaller:
+    def __init__(self, failures=()):
+        self.token = None
+        self.calls = []
+        self.failures = set(failures)
+
+    def install(self, apk, downgrade=False):
+        self.calls.append((apk.package, downgrade))
+        if apk.package in self.failures:
+            return "Performing Streamed Install\nFailure [INSTALL_FAILED_INSUFFICIENT_STORAGE]\n", 1
+        return "Success\n", 0
+
+
+def apk(package, version):
+    return ApkInfo(f"/tmp/{package}.apk", package, version, '', 1024)
+
+
+def test_parse_manifest_reads_package_and_versions():
+    assert parse_manifest(manifest_blob()) == {'package': 'com.example.app', 'versionCode': '7', 'versionName': '1.2'}
+
+
+def test_parse_manifest_rejects_a_manifest_without_elements():
+    blob = manifest_blob()
+    with pytest.raises(ValueError):
+        parse_manifest(blob[:-92])
+
+
+def test_read_apk_info_and_collect_apks(tmp_path):
+    path = make_apk(tmp_path / 'app.apk')
+    info = read_apk_info(path)
+    assert (info.package, info.version_code, info.version_name, info.label) == \
+        ('com.example.app', 7, '1.2', 'com.example.app 1.2')
+    (tmp_path / 'broken.apk').write_bytes(b'not a zip')
+    (tmp_path / 'notes.txt').write_text('ignored')
+    apks, errors = collect_apks([str(tmp_path)])
+    assert [a.path for a in apks] == [path]
+    assert [e[0] for e in errors] == [str(tmp_path / 'broken.apk')]
+    assert errors[0][1].startswith('not a readable APK')
+
+
+def test_parse_deploy_and_package_versions():
+    assert parse_deploy("deploy-apk --force a.apk 'b dir'") == (['a.apk', 'b dir'], True, False)
+    assert parse_deploy("deploy-apk --allow-downgrade") is None
+    assert parse_package_versions("package:a versionCode:3\npackage:b\n") == {'a': 3, 'b': 0}
+
+
+def test_deploy_skips_current_and_refuses_downgrades():
+    installer = RecordingInstaller()
+    installed = {'same': 5, 'older': 1, 'newer': 9}
+    lines = []
+    report = deploy_apks(installer, [apk('same', 5), apk('older', 2), apk('newer', 3), apk('fresh', 1)],
+                         installed, on_output=lines.append)
+    assert installer.calls == [('older', False), ('fresh', False)]
+    assert (report.installed, report.skipped, report.newer) == (['older', 'fresh'], ['same'], ['newer'])
+    assert report.ok and installed == {'same': 5, 'older': 2, 'newer': 9, 'fresh': 1}
+    assert '1 newer installed (use --allow-downgrade)' in report.summary()
+    assert any('versionCode 9 is newer' in line for line in lines)
+
+
+def test_deploy_downgrades_only_when_allowed_or_forced():
+    installer = RecordingInstaller()
+    report = deploy_apks(installer, [apk('newer', 3)], {'newer': 9}, allow_downgrade=True)
+    assert installer.calls == [('newer', True)] and report.installed == ['newer']
+    installer = RecordingInstaller()
+    report = deploy_apks(installer, [apk('same', 5), apk('newer', 3)], {'same': 5, 'newer': 9}, force=True)
+    assert installer.calls == [('same', False), ('newer', True)]
+
+
+def test_deploy_reports_the_last_line_of_a_failure():
+    installer = RecordingInstaller(failures={'big'})
+    installed = {}
+    report = deploy_apks(installer, [apk('big', 1), apk('small', 1)], installed)
+    assert report.failed == [('big', 'Failure [INSTALL_FAILED_INSUFFICIENT_STORAGE]')]
+    assert report.installed == ['small'] and 'big' not in installed and not report.ok
+
+
+def test_native_install_stages_and_removes_the_apk(server, tmp_path):
+    info = read_apk_info(make_apk(tmp_path / 'app.apk'))
+    client = AdbHostClient()
+    try:
+        assert PackageInstaller(client, 'FAKE0000').install(info) == ("Success\n", 0)
+    finally:
+        client.close()
+    staging = os.path.join(server.device_root('FAKE0000'), REMOTE_STAGING.lstrip('/'))
+    assert os.listdir(staging) == []
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from command_catalog import CatalogError, CommandCatalog
+
+
+def write_catalog(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_reloads_only_when_the_file_changes(tmp_path):
+    path = tmp_path / 'commands.conf'
+    write_catalog(path, "info\nshell getprop\n\nreboot\nreboot", 1_000_000_000)
+    catalog = CommandCatalog(str(path))
+    assert catalog.names() == ['info', 'reboot']
+    generation = catalog.generation
+    assert catalog.generation == generation
+
+    write_catalog(path, "info\nshell getprop ro.serialno", 2_000_000_000)
+    assert catalog.get('info').commands == ('shell getprop ro.serialno',)
+    assert 'reboot' not in catalog
+    assert catalog.generation == generation + 1
+
+
+def test_missing_file_is_an_empty_catalog(tmp_path):
+    catalog = CommandCatalog(str(tmp_path / 'commands.conf'))
+    assert catalog.groups() == []
+    assert catalog.get('info') is None
+
+
+def test_writes_are_atomic(tmp_path, monkeypatch):
+    path = tmp_path / 'commands.conf'
+    catalog = CommandCatalog(str(path))
+    catalog.add('info', ['shell getprop'])
+    catalog.add('logs', ['logcat -d'])
+    assert path.read_text() == "info\nshell getprop\n\nlogs\nlogcat -d"
+    assert not os.path.exists(f"{path}.tmp")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        catalog.remove('info')
+    assert CommandCatalog(str(path)).names() == ['info', 'logs']
+
+
+def test_rejects_empty_and_duplicate_names(tmp_path):
+    catalog = CommandCatalog(str(tmp_path / 'commands.conf'))
+    catalog.add('info', ['shell getprop'])
+    with pytest.raises(CatalogError):
+        catalog.add(' ', ['true'])
+    with pytest.raises(CatalogError):
+        catalog.add('info', ['true'])
+
+
+def test_duplicated_groups_are_reported_not_shadowed(tmp_path):
+    path = tmp_path / 'commands.conf'
+    path.write_text("info\nshell getprop\n\ninfo\nshell id\n\nlogs\nlogcat -d")
+    catalog = CommandCatalog(str(path))
+    assert catalog.duplicates() == ['info']
+    with pytest.raises(CatalogError, match="defined 2 times"):
+        catalog.get('info')
+    with pytest.raises(CatalogError):
+        catalog.remove('info')
+    assert catalog.get('logs').commands == ('logcat -d',)
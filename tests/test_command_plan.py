@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from command_plan import PlanError, parse_plan
+from execution import SKIPPED_EXIT_CODE, TIMEOUT_EXIT_CODE, CancelToken
+
+
+def test_plain_lines_run_in_order():
+    plan = parse_plan(['shell echo a', '', 'shell echo b'])
+    assert [step.after for step in plan.steps] == [(), (0,)]
+    assert plan.sequential
+
+
+def test_tagged_steps_declare_dependencies():
+    plan = parse_plan(['[a] shell echo a', '[b] shell echo b', '[c after a, b] shell echo c', 'shell echo d'])
+    assert [(step.id, step.after) for step in plan.steps] == [('a', ()), ('b', ()), ('c', (0, 1)), ('4', (0, 1, 2))]
+    assert not plan.sequential
+
+
+def test_steps_after_a_plain_line_wait_for_it():
+    plan = parse_plan(['shell echo first', '[x] shell echo x'])
+    assert plan.steps[1].after == (0,)
+
+
+@pytest.mark.parametrize('lines, message', [
+    (['[a] true', '[a] true'], "Duplicate step id 'a'"),
+    (['[a after b] true', '[b] true'], "unknown step 'b'"),
+])
+def test_invalid_plans_are_rejected(lines, message):
+    with pytest.raises(PlanError, match=message):
+        parse_plan(lines)
+
+
+def test_parameters_use_defaults_and_report_missing_values():
+    plan = parse_plan(['@param pkg = com.example', '@param user', 'shell pm clear --user {user} {pkg} ${HOME}'])
+    assert plan.missing({}) == ['user']
+    with pytest.raises(PlanError, match='user'):
+        plan.bind({})
+    assert plan.bind({'user': '10'}).steps[0].command == 'shell pm clear --user 10 com.example ${HOME}'
+
+
+def test_failed_step_skips_its_dependents_only(core):
+    results = core.run_command_group(
+        ['[a] shell exit 3', '[b] shell echo b', '[c after a] shell echo c', '[d after b] shell echo d'], 'FAKE0000')
+    assert results[0] == ("", 3)
+    assert results[1] == ("b\n", 0)
+    assert results[2] == ("Skipped: step 'a' failed\n", SKIPPED_EXIT_CODE)
+    assert results[3] == ("d\n", 0)
+
+
+def test_skips_propagate_through_the_graph(core):
+    results = core.run_command_group(
+        ['[a] shell false', '[b] shell true', '[c after a] shell true', '[d after c, b] shell true'], 'FAKE0000')
+    assert [code for _, code in results] == [1, 0, SKIPPED_EXIT_CODE, SKIPPED_EXIT_CODE]
+    assert results[3][0] == "Skipped: step 'c' failed\n"
+
+
+def test_parallel_steps_honour_the_command_timeout(core):
+    core.command_timeout = 1.0
+    started = time.monotonic()
+    results = core.run_command_group(['[a] shell sleep 4; echo a', '[b] shell echo b', '[c after a] shell echo c'],
+                                     'FAKE0000')
+    assert results == [("Timed out after 1s\n", TIMEOUT_EXIT_CODE), ("b\n", 0),
+                       ("Skipped: step 'a' failed\n", SKIPPED_EXIT_CODE)]
+    assert time.monotonic() - started < 3
+
+
+def test_parallel_steps_stop_when_the_group_is_cancelled(core):
+    chunks = []
+    started = time.monotonic()
+    results = core.run_command_group(['[a] shell sleep 4', '[b] shell sleep 4'], 'FAKE0000',
+                                     on_output=chunks.append, token=CancelToken(0.5))
+    assert [code for _, code in results] == [TIMEOUT_EXIT_CODE, TIMEOUT_EXIT_CODE]
+    assert "".join(chunks).count("Group timed out after 0.5s\n") == 2
+    assert time.monotonic() - started < 3
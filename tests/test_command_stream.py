@@ -0,0 +1,66 @@
+import pytest
+
+from adb_client import AdbHostClient
+from command_stream import OutputBuffer, StaticStream, open_native_stream
+
+
+def test_complete_lines_and_the_partial_tail_are_kept_apart():
+    buffer = OutputBuffer()
+    buffer.write("one\ntw")
+    buffer.write("o\nthr")
+    assert list(buffer.lines) == ["one", "two"]
+    assert buffer.partial == "thr"
+    assert buffer.text() == "one\ntwo\nthr"
+
+
+def test_oldest_lines_are_dropped_past_the_limit():
+    buffer = OutputBuffer(max_lines=3)
+    buffer.write("".join(f"{idx}\n" for idx in range(5)))
+    assert list(buffer.lines) == ["2", "3", "4"]
+    assert buffer.dropped == 2
+    assert buffer.text().startswith("... 2 earlier lines dropped ...\n2\n")
+
+
+def test_long_lines_are_split_at_the_line_length():
+    buffer = OutputBuffer(max_line_length=4)
+    buffer.write("abcdefghij\n\nxy\n")
+    assert list(buffer.lines) == ["abcd", "efgh", "ij", "", "xy"]
+
+
+def test_a_long_partial_line_is_flushed_in_whole_chunks():
+    buffer = OutputBuffer(max_line_length=4)
+    buffer.write("abcdefghij")
+    assert list(buffer.lines) == ["abcd", "efgh"]
+    assert buffer.partial == "ij"
+    buffer.write("kl")
+    assert list(buffer.lines) == ["abcd", "efgh", "ijkl"]
+    assert buffer.partial == ""
+
+
+def test_clear_resets_everything():
+    buffer = OutputBuffer(max_lines=1)
+    buffer.write("a\nb\nc")
+    buffer.clear()
+    assert not buffer and buffer.text() == "" and buffer.dropped == 0
+
+
+def test_static_stream_sets_its_code_when_consumed():
+    stream = StaticStream("done\n", 3)
+    assert stream.returncode is None
+    assert list(stream) == ["done\n"]
+    assert stream.returncode == 3
+
+
+@pytest.mark.parametrize('features', [['shell_v2'], ['cmd']])
+def test_native_stream_yields_output_and_exit_code(server, features):
+    client = AdbHostClient()
+    client._features['FAKE0000'] = features
+    try:
+        stream = open_native_stream(client, 'shell echo one; printf two; exit 6', 'FAKE0000')
+        assert "".join(stream) == "one\ntwo"
+        assert stream.returncode == 6
+        stream = open_native_stream(client, 'shell yes x | head -c 100000', 'FAKE0000')
+        assert "".join(stream) == "x\n" * 50000
+        assert stream.returncode == 0
+    finally:
+        client.close()
@@ -0,0 +1,89 @@
+import time
+
+from connection import DeviceConnector, poll_until
+
+
+def connector(core, run=None, **kwargs):
+    options = dict(reconnect_timeout=0.2, tcpip_timeout=0.5, ready_timeout=0.5)
+    options.update(kwargs)
+    return DeviceConnector(run or core.run_adb_command, core.get_available_usb_devices, **options)
+
+
+def phases(result):
+    return [name for name, _ in result.phases]
+
+
+def device(ip, serial='FAKE0001', port='5555'):
+    return {'name': 'lab', 'ip': ip, 'port': port, 'serial': serial}
+
+
+def test_poll_until_backs_off_and_stops():
+    calls = []
+    assert poll_until(lambda: calls.append(1) or len(calls) == 3, 1.0, initial_interval=0.01)
+    started = time.monotonic()
+    assert not poll_until(lambda: False, 5.0, stop=lambda: True)
+    assert time.monotonic() - started < 1.0
+
+
+def test_connects_directly_and_waits_until_ready(server, core):
+    result = connector(core).connect(device('10.0.0.3'))
+    assert result.connected and result.message == ''
+    assert phases(result) == ['connect', 'ready']
+    assert server.connected == {'10.0.0.3:5555': 'FAKE0001'}
+    assert result.summary().startswith('connect ')
+
+
+def test_live_state_skips_every_phase(server, core):
+    result = connector(core, state_of=lambda serial: 'device').connect(device('10.0.0.3'))
+    assert result.connected and result.phases == [('connect', 0.0)]
+    assert server.connected == {}
+
+
+def test_reenables_tcpip_over_usb(server, core):
+    commands = []
+
+    def run(command):
+        commands.append(command)
+        if command.endswith('tcpip 5555'):
+            server.addresses['FAKE0001'] = '10.0.9.9'
+        return core.run_adb_command(command)
+
+    statuses = []
+    result = connector(core, run).connect(device('10.0.9.9'), on_status=lambda text, color: statuses.append(text))
+    assert result.connected and result.usb_serial == 'FAKE0001'
+    assert phases(result) == ['connect', 'reconnect', 'usb-probe', 'tcpip', 'tcpip-connect', 'ready']
+    assert '-s FAKE0001 tcpip 5555' in commands and 'disconnect 10.0.9.9:5555' in commands
+    assert statuses == ["Attempting wireless reconnection to lab...", "Re-enabling tcpip over USB for lab..."]
+
+
+def test_probes_usb_devices_by_serial_number(server, core):
+    probes = []
+
+    def run(command):
+        if command.endswith('get-serialno'):
+            probes.append(command)
+            return ('RENAMED\n', 0) if command.startswith('-s FAKE0000 ') else ('FAKE0001\n', 0)
+        return core.run_adb_command(command)
+
+    result = connector(core, run, tcpip_timeout=0.2).connect(device('10.0.9.9', serial='RENAMED'))
+    assert '-s FAKE0000 get-serialno' in probes
+    assert not result.connected and result.usb_serial == 'FAKE0000'
+
+
+def test_reports_devices_missing_from_usb(server, core):
+    result = connector(core).connect(device('10.0.9.9', serial='GONE'))
+    assert not result.connected and 'not found via USB' in result.message
+    assert phases(result) == ['connect', 'reconnect', 'usb-probe']
+
+
+def test_gives_up_when_tcpip_does_not_bring_the_device_back(server, core):
+    result = connector(core).connect(device('10.0.9.9'))
+    assert not result.connected and result.usb_serial == 'FAKE0001'
+    assert result.message == "Failed to connect to lab after re-enabling USB tcpip."
+    assert phases(result) == ['connect', 'reconnect', 'usb-probe', 'tcpip', 'tcpip-connect']
+
+
+def test_stops_after_the_first_attempt_when_cancelled(server, core):
+    result = connector(core).connect(device('10.0.9.9'), stop=lambda: True)
+    assert not result.connected and result.message == "Connection to lab cancelled."
+    assert phases(result) == ['connect']
@@ -0,0 +1,56 @@
+from device_info import SNAPSHOT_COMMAND, parse_snapshot
+
+
+def test_snapshot_parses_properties_and_route():
+    snapshot = parse_snapshot("[ro.product.model]: [Pixel 8]\n[ro.build.version.sdk]: [34]\n__ADBT_ROUTE__\n"
+                              "10.0.0.0/16 dev wlan0 proto kernel scope link src 10.0.3.7\n")
+    assert snapshot.get('ro.product.model') == 'Pixel 8'
+    assert snapshot.get('missing') == ''
+    assert snapshot.ip == '10.0.3.7'
+
+
+def snapshot_calls(core):
+    return sum(1 for span in core.tracer.spans if span.name == SNAPSHOT_COMMAND)
+
+
+def test_properties_come_from_one_cached_snapshot(core):
+    core.tracer.start()
+    try:
+        assert core.get_property('FAKE0000', 'ro.product.model') == 'Fake Device'
+        assert core.get_property('FAKE0000', 'ro.build.version.sdk') == '34'
+        assert core.get_device_ip('FAKE0000') == '10.0.0.2'
+        assert snapshot_calls(core) == 1
+        assert core.get_device_ip('FAKE0001') == '10.0.0.3'
+        assert snapshot_calls(core) == 2
+    finally:
+        core.tracer.stop()
+        core.tracer.reset()
+
+
+def test_snapshot_is_reloaded_after_invalidation_or_ttl(core):
+    core.tracer.start()
+    try:
+        core.property_ttl = 60.0
+        assert core.get_property('FAKE0000', 'persist.sys.locale') == ''
+        core.device_cache.invalidate('FAKE0000')
+        core.get_property('FAKE0000', 'ro.serialno')
+        assert snapshot_calls(core) == 2
+        core.property_ttl = 0.0
+        core.get_property('FAKE0000', 'ro.serialno')
+        assert snapshot_calls(core) == 2
+        core.get_property('FAKE0000', 'persist.sys.locale')
+        assert snapshot_calls(core) == 3
+    finally:
+        core.tracer.stop()
+        core.tracer.reset()
+
+
+def test_property_changing_commands_drop_the_snapshot(core):
+    core.tracer.start()
+    try:
+        core.run_command_group(['shell getprop ro.serialno', 'shell setprop debug.x 1 || true',
+                                'shell getprop ro.serialno'], 'FAKE0000')
+        assert snapshot_calls(core) == 2
+    finally:
+        core.tracer.stop()
+        core.tracer.reset()
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+from device_registry import DeviceRegistry, RegistryError
+
+
+def write_devices(path, devices, mtime=None):
+    with open(path, 'w') as f:
+        json.dump({"devices": devices}, f)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def device(name, ip='10.0.0.2', port='5555', serial=''):
+    return {"name": name, "serial": serial, "ip": ip, "port": port}
+
+
+def test_reloads_only_when_the_file_changes(tmp_path):
+    path = tmp_path / 'devices.json'
+    write_devices(path, [device('a')], mtime=1_000_000_000)
+    registry = DeviceRegistry(str(path))
+    assert [d['name'] for d in registry.devices()] == ['a']
+    generation = registry.generation
+    assert registry.generation == generation
+
+    write_devices(path, [device('b')], mtime=2_000_000_000)
+    assert registry.get('a') is None
+    assert registry.find('10.0.0.2:5555')['name'] == 'b'
+    assert registry.generation == generation + 1
+
+
+def test_unchanged_file_is_not_parsed_again(tmp_path, monkeypatch):
+    path = tmp_path / 'devices.json'
+    write_devices(path, [device('a')])
+    registry = DeviceRegistry(str(path))
+    registry.refresh()
+    monkeypatch.setattr(json, 'load', lambda f: pytest.fail("registry was parsed again"))
+    assert registry.get('a') is not None
+
+
+def test_writes_are_atomic(tmp_path, monkeypatch):
+    path = tmp_path / 'devices.json'
+    registry = DeviceRegistry(str(path))
+    registry.add('a', '10.0.0.2', '5555', 'FAKE0000')
+    assert json.loads(path.read_text())['devices'] == [device('a', serial='FAKE0000')]
+    assert not os.path.exists(f"{path}.tmp")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        registry.add('b', '10.0.0.3', '5555', 'FAKE0001')
+    assert [d['name'] for d in json.loads(path.read_text())['devices']] == ['a']
+
+
+def test_adding_replaces_only_the_device_with_the_same_serial(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / 'devices.json'))
+    registry.add('a', '10.0.0.2', '5555', 'FAKE0000')
+    registry.add('b', '10.0.0.3', '5555', 'FAKE0001')
+    registry.add('c', '10.0.0.9', '5555', 'FAKE0000')
+    assert [d['name'] for d in registry.devices()] == ['c', 'b']
+    with pytest.raises(RegistryError, match="name 'b'"):
+        registry.add('b', '10.0.0.4', '5555', 'FAKE0002')
+
+
+def test_address_collisions_are_rejected(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / 'devices.json'))
+    registry.add('old', '10.0.0.2', '5555', 'FAKE0000')
+    with pytest.raises(RegistryError, match="10.0.0.2:5555 is already registered as 'old'"):
+        registry.add('new', '10.0.0.2', '5555', 'FAKE0001')
+    with pytest.raises(RegistryError, match="10.0.0.5:5555"):
+        registry.add_many([device('x', '10.0.0.5', serial='FAKE0002'), device('y', '10.0.0.5', serial='FAKE0003')])
+    assert [d['name'] for d in registry.devices()] == ['old']
+    registry.add('moved', '10.0.0.2', '5555', 'FAKE0000')
+    assert [d['name'] for d in registry.devices()] == ['moved']
+
+
+def test_imports_legacy_device_files(tmp_path):
+    legacy = tmp_path / 'devices'
+    legacy.mkdir()
+    (legacy / 'a.json').write_text(json.dumps(device('a', serial='FAKE0000')))
+    (legacy / 'broken.json').write_text('{')
+    registry = DeviceRegistry(str(tmp_path / 'devices.json'), legacy_dir=str(legacy))
+    assert [d['name'] for d in registry.devices()] == ['a']
+    assert len(registry.errors) == 1
+    assert os.path.exists(tmp_path / 'devices.json')
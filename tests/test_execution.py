@@ -0,0 +1,47 @@
+import threading
+import time
+
+from execution import CANCELLED_EXIT_CODE, TIMEOUT_EXIT_CODE, CancelToken
+
+
+def test_native_commands_stop_at_the_command_timeout(core):
+    core.command_timeout = 0.5
+    started = time.monotonic()
+    output, code = core.run_adb_command('shell sleep 3; echo late', 'FAKE0000')
+    assert code == TIMEOUT_EXIT_CODE
+    assert 'late' not in output
+    assert time.monotonic() - started < 2
+
+
+def test_native_commands_stop_when_the_token_expires(core):
+    started = time.monotonic()
+    output, code = core.run_adb_command('shell sleep 3; echo late', 'FAKE0000', token=CancelToken(0.5))
+    assert (output, code) == ("Group timed out after 0.5s\n", TIMEOUT_EXIT_CODE)
+    assert time.monotonic() - started < 2
+
+
+def test_cancelling_the_token_aborts_a_running_native_command(core):
+    token = CancelToken()
+    started = time.monotonic()
+    timer = threading.Timer(0.3, token.cancel)
+    timer.start()
+    output, code = core.run_adb_command('shell sleep 3', 'FAKE0000', token=token)
+    timer.join()
+    assert code == CANCELLED_EXIT_CODE
+    assert time.monotonic() - started < 2
+    token.cancel()
+    assert core.run_adb_command('shell echo hi', 'FAKE0000', token=token) == ("Cancelled\n", CANCELLED_EXIT_CODE)
+
+
+def test_guarded_native_commands_still_return_their_result(core):
+    assert core.run_adb_command('shell echo hi; exit 4', 'FAKE0000', token=CancelToken(5)) == ("hi\n", 4)
+
+
+def test_streamed_native_commands_stop_at_the_command_timeout(core):
+    core.command_timeout = 0.5
+    chunks = []
+    started = time.monotonic()
+    output, code = core._run_streamed('shell echo early; sleep 3; echo late', 'FAKE0000', chunks.append)
+    assert code == TIMEOUT_EXIT_CODE
+    assert "".join(chunks) == "early\nTimed out after 0.5s\n"
+    assert time.monotonic() - started < 2
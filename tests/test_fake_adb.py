@@ -0,0 +1,56 @@
+import os
+
+import fake_adb
+from adb_client import AdbHostClient, AdbSyncConnection
+
+
+def test_shell_commands_stay_inside_the_device_root(server, tmp_path):
+    outside = tmp_path / 'keep'
+    outside.mkdir()
+    client = AdbHostClient()
+    try:
+        assert client.shell('FAKE0000', f"rm -r {outside}; mkdir -p /sdcard/a; ls /sdcard") == ("a\n", 0)
+        assert outside.is_dir()
+        assert os.path.isdir(os.path.join(server.device_root('FAKE0000'), 'sdcard', 'a'))
+        assert client.shell('FAKE0001', 'ls /sdcard') == ("", 0)
+        assert client.shell('FAKE0000', 'ls ../..') == ("", 1)
+        output, code = client.shell('FAKE0000', 'ls /sdcard/missing')
+        assert code != 0 and server.root not in output
+    finally:
+        client.close()
+
+
+def test_only_scripted_and_file_tools_are_available(server):
+    client = AdbHostClient()
+    try:
+        assert client.shell('FAKE0000', 'getprop ro.product.model') == ("Fake Device\n", 0)
+        assert client.shell('FAKE0000', 'command -v python3 curl || echo none') == ("none\n", 0)
+        assert client.shell('FAKE0000', 'echo $HOME; pwd') == ("/\n/\n", 0)
+    finally:
+        client.close()
+
+
+def test_sync_reads_and_writes_inside_the_device_root(server, tmp_path):
+    client = AdbHostClient()
+    sync = AdbSyncConnection(client, 'FAKE0000')
+    try:
+        sync.send('/sdcard/file.txt', [b'payload'])
+        assert b''.join(sync.recv('/sdcard/file.txt')) == b'payload'
+        assert sync.stat('/sdcard/file.txt')[1] == len(b'payload')
+        assert sync.stat(str(tmp_path)) == (0, 0, 0)
+    finally:
+        sync.close()
+        client.close()
+    with open(os.path.join(server.device_root('FAKE0000'), 'sdcard', 'file.txt'), 'rb') as f:
+        assert f.read() == b'payload'
+
+
+def test_server_cleans_up_its_root():
+    server = fake_adb.FakeAdbServer(devices=1)
+    root = server.root
+    server.close()
+    assert not os.path.exists(root)
+
+
+def test_cli_defaults_to_a_free_port():
+    assert fake_adb.build_parser().parse_args([]).port == 0
@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime
+
+from command_stream import CommandStream, StaticStream
+from logcat_capture import LogcatCapture, LogQuery, parse_time
+
+YEAR = datetime.now().year
+
+
+def line(second, message, tag='App', level='I', pid=100):
+    return f"10-17 12:00:{second:02d}.000  {pid}  {pid + 1} {level} {tag}: {message}"
+
+
+def at(second):
+    return datetime(YEAR, 10, 17, 12, 0, second).timestamp()
+
+
+class ChunkStream(CommandStream):
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+
+    def __iter__(self):
+        yield from self.chunks
+        self.returncode = 0
+
+
+class Streams:
+    def __init__(self, *outputs):
+        self.outputs = list(outputs)
+        self.commands = []
+        self.done = threading.Event()
+
+    def __call__(self, command):
+        self.commands.append(command)
+        if not self.outputs:
+            self.done.set()
+            return StaticStream("", 1)
+        output = self.outputs.pop(0)
+        return ChunkStream(output) if isinstance(output, list) else StaticStream(output, 0)
+
+
+def capture_all(tmp_path, *outputs):
+    streams = Streams(*outputs)
+    capture = LogcatCapture('FAKE0000', streams, str(tmp_path / 'logs'))
+    capture.retry_interval = 0.01
+    capture.start()
+    assert streams.done.wait(5)
+    capture.stop()
+    return capture, streams
+
+
+def written(capture):
+    return capture.search(LogQuery(), limit=100)
+
+
+def test_lines_are_indexed_and_searchable(tmp_path):
+    lines = [line(1, 'boot', tag='Sys'), line(2, 'warn', level='W'), line(3, 'crash here', level='E', pid=7),
+             line(4, 'late')]
+    capture, _ = capture_all(tmp_path, "".join(f"{text}\n" for text in lines) + "--------- beginning of main\n")
+    assert written(capture) == lines
+    assert capture.search(LogQuery(tag='Sys')) == lines[:1]
+    assert capture.search(LogQuery(tag='Missing')) == []
+    assert capture.search(LogQuery(min_level='W')) == lines[1:3]
+    assert capture.search(LogQuery(pid=7)) == lines[2:3]
+    assert capture.search(LogQuery(text='crash')) == lines[2:3]
+    assert capture.search(LogQuery(since=at(2), until=at(3))) == lines[1:3]
+
+
+def test_time_queries_see_records_written_out_of_order(tmp_path):
+    lines = [line(1, 'a'), line(5, 'b'), line(2, 'c'), line(6, 'd'), line(3, 'e')]
+    capture, _ = capture_all(tmp_path, "".join(f"{text}\n" for text in lines))
+    assert capture.search(LogQuery(since=at(2))) == lines[1:]
+    assert capture.search(LogQuery(since=at(3), until=at(5))) == [lines[1], lines[4]]
+    assert capture.search(LogQuery(until=at(2))) == [lines[0], lines[2]]
+
+
+def test_reconnect_skips_replayed_lines_and_completes_the_cut_line(tmp_path):
+    first = f"{line(1, 'a')}\n{line(2, 'b')}\n{line(2, 'c')}\n{line(2, 'd')[:30]}"
+    second = f"{line(2, 'b')}\n{line(2, 'c')}\n{line(2, 'd')}\n{line(3, 'e')}\n"
+    capture, streams = capture_all(tmp_path, first, second)
+    assert written(capture) == [line(1, 'a'), line(2, 'b'), line(2, 'c'), line(2, 'd'), line(3, 'e')]
+    assert streams.commands[1].endswith("-T '10-17 12:00:02.000'")
+
+
+def test_a_cut_line_is_kept_when_the_device_does_not_repeat_it(tmp_path):
+    first = f"{line(1, 'a')}\npartial"
+    capture, _ = capture_all(tmp_path, first, f"{line(1, 'a')}\n{line(4, 'f')}\n")
+    assert written(capture) == [line(1, 'a'), line(4, 'f')]
+    with open(capture.segments()[0].log_path, encoding='utf-8') as f:
+        assert f.read() == f"{line(1, 'a')}\npartial\n{line(4, 'f')}\n"
+
+
+def test_segments_rotate_and_expire(tmp_path):
+    streams = Streams([f"{line(idx, 'x' * 40)}\n" for idx in range(10)])
+    capture = LogcatCapture('FAKE0000', streams, str(tmp_path / 'logs'), max_segment_bytes=100, max_segments=2)
+    capture.retry_interval = 0.01
+    capture.start()
+    assert streams.done.wait(5)
+    capture.stop()
+    assert len(capture.segments()) == 2
+    assert written(capture) == [line(idx, 'x' * 40) for idx in range(6, 10)]
+
+
+def test_parse_time_accepts_relative_and_clock_times():
+    now = datetime(YEAR, 10, 17, 12, 30)
+    assert parse_time('-10m', now) == now.timestamp() - 600
+    assert parse_time('12:00', now) == datetime(YEAR, 10, 17, 12, 0).timestamp()
+    assert parse_time('10-16 08:00:05', now) == datetime(YEAR, 10, 16, 8, 0, 5).timestamp()
@@ -0,0 +1,35 @@
+import pytest
+
+from provisioning import DEFAULT_NAME_TEMPLATE, ProvisionResult, clean_name, render_name, unique_names
+
+FIELDS = {'model': 'Pixel 8 Pro', 'manufacturer': 'Google', 'serial': '3A051FDJH000K2', 'ip': '192.168.1.20'}
+
+
+def test_render_name_fills_fields_and_cleans_the_result():
+    assert render_name(DEFAULT_NAME_TEMPLATE, FIELDS, 1) == 'Pixel-8-Pro-00K2'
+    assert render_name("{manufacturer}/{model} #{index}", FIELDS, 3) == 'Google-Pixel-8-Pro-3'
+    assert render_name("lab-{ip}", FIELDS, 1) == 'lab-192.168.1.20'
+    assert render_name("{serial}", dict(FIELDS, serial='  '), 1) == ''
+    assert clean_name(' --a b/c-- ') == 'a-b-c'
+
+
+@pytest.mark.parametrize('template', ["{name}", "{0}", "{model", "{model!z}"])
+def test_render_name_rejects_bad_templates(template):
+    with pytest.raises(ValueError, match='Invalid name template'):
+        render_name(template, FIELDS, 1)
+
+
+def test_colliding_templates_get_numbered_names():
+    fields = [dict(FIELDS, serial=f"SERIAL{idx}") for idx in range(3)]
+    names = [render_name("{model}", values, idx + 1) for idx, values in enumerate(fields)]
+    assert names == ['Pixel-8-Pro'] * 3
+    assert unique_names(names, set()) == ['Pixel-8-Pro', 'Pixel-8-Pro-2', 'Pixel-8-Pro-3']
+    assert unique_names(names, {'Pixel-8-Pro', 'Pixel-8-Pro-3'}) == ['Pixel-8-Pro-2', 'Pixel-8-Pro-4', 'Pixel-8-Pro-5']
+
+
+def test_unique_names_falls_back_for_empty_names():
+    assert unique_names(['', '', 'device'], {'device'}) == ['device-2', 'device-3', 'device-4']
+
+
+def test_provision_result_address():
+    assert ProvisionResult('S', ip='10.0.0.2', port='5556').address == '10.0.0.2:5556'
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import adb_core
+from adb_client import AdbHostClient
+from shell_session import NativeShellSession, ShellSessionError
+
+
+@pytest.fixture
+def session(server):
+    client = AdbHostClient()
+    shell = NativeShellSession(client, 'FAKE0000')
+    try:
+        yield shell
+    finally:
+        shell.close()
+        client.close()
+
+
+def test_batch_returns_output_and_exit_code_per_command(session):
+    results = session.run_batch(['echo one', 'printf two; exit 4'])
+    assert results == [("one\n", 0), ("two", 4)]
+
+
+def test_commands_after_a_failure_are_skipped(session):
+    results = session.run_batch(['true', 'exit 2', 'echo never'])
+    assert results == [("", 0), ("", 2)]
+    assert session.run_batch(['echo again']) == [("again\n", 0)]
+
+
+def test_output_resembling_a_sentinel_is_passed_through(session):
+    other = "__ADBT_0000000000000000__:0"
+    assert session.token not in other
+    results = session.run_batch([f"echo {other}", 'echo done'])
+    assert results == [(f"{other}\n", 0), ("done\n", 0)]
+
+
+def test_syntax_errors_fail_the_step_without_breaking_the_session(session):
+    output, code = session.run_batch(['if then', 'echo next'])[0]
+    assert code != 0
+    assert session.run_batch(['echo ok']) == [("ok\n", 0)]
+
+
+def test_streamed_output_is_not_repeated_in_results(session):
+    chunks = []
+    results = session.run_batch(['echo streamed'], on_output=chunks.append)
+    assert "".join(chunks) == "streamed\n"
+    assert results == [("", 0)]
+
+
+def test_closed_session_refuses_new_batches(session):
+    session.close()
+    with pytest.raises(ShellSessionError) as error:
+        session.run_batch(['true'])
+    assert not error.value.started
+
+
+def test_concurrent_callers_share_one_session_per_device(core, monkeypatch):
+    opened = []
+    real_open = adb_core.open_shell_session
+
+    def slow_open(client, adb_path, serial):
+        opened.append(serial)
+        time.sleep(0.2)
+        return real_open(client, adb_path, serial)
+
+    monkeypatch.setattr(adb_core, 'open_shell_session', slow_open)
+    barrier = threading.Barrier(8)
+
+    def get(serial):
+        barrier.wait()
+        return core.get_shell_session(serial)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sessions = list(pool.map(get, ['FAKE0000'] * 4 + ['FAKE0001'] * 4))
+    assert sorted(opened) == ['FAKE0000', 'FAKE0001']
+    assert len({id(session) for session in sessions[:4]}) == 1 and len({id(session) for session in sessions[4:]}) == 1
+    assert time.monotonic() - started < 0.4
+    assert core.get_shell_session('FAKE0000').run_batch(['echo ok']) == [("ok\n", 0)]
@@ -0,0 +1,129 @@
+import io
+import os
+import threading
+from typing import Tuple
+
+import pytest
+
+from terminal import (BACKSPACE, CLEAR_SCREEN, ENTER, ESCAPE, EXTENDED, PosixInputBackend, ScriptedInputBackend,
+                      Screen, split_key, visible_width)
+
+UP = EXTENDED + b'H'
+
+
+@pytest.mark.parametrize('buffer, key, rest', [
+    (b'\x1b[Ax', UP, b'x'),
+    (b'\x1bOD', EXTENDED + b'K', b''),
+    (b'\x1b[3~', EXTENDED + b'S', b''),
+    (b'\x1b[99~q', b'', b'q'),
+    (b'\x1bq', ESCAPE, b'q'),
+    (b'\x7fa', BACKSPACE, b'a'),
+    (b'\n', ENTER, b''),
+    ('é!'.encode(), 'é'.encode(), b'!'),
+    ('€'.encode(), '€'.encode(), b''),
+])
+def test_split_key_decodes_one_key(buffer, key, rest):
+    assert split_key(buffer) == (key, rest)
+
+
+@pytest.mark.parametrize('buffer', [b'\x1b', b'\x1b[', b'\x1b[1', '€'.encode()[:2]])
+def test_split_key_waits_for_incomplete_sequences(buffer):
+    assert split_key(buffer) == (None, buffer)
+
+
+@pytest.fixture
+def pipe_backend():
+    read_fd, write_fd = os.pipe()
+    backend = PosixInputBackend(read_fd)
+    try:
+        yield backend, write_fd
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_posix_backend_joins_sequences_split_across_reads(pipe_backend):
+    backend, write_fd = pipe_backend
+    os.write(write_fd, b'\x1b[')
+    threading.Timer(0.01, os.write, args=(write_fd, b'Ab')).start()
+    assert backend.read_key(1) == UP
+    assert backend.read_key(1) == b'b'
+
+
+def test_posix_backend_reports_a_lone_escape_after_the_timeout(pipe_backend):
+    backend, write_fd = pipe_backend
+    os.write(write_fd, b'\x1b')
+    assert backend.read_key(1) == ESCAPE
+    assert backend.read_key(0.01) is None
+
+
+def test_posix_backend_wakes_without_a_key(pipe_backend):
+    backend, _ = pipe_backend
+    backend.wake()
+    assert backend.read_key(1) is None
+
+
+def test_scripted_backend_replays_keys_and_wakes():
+    backend = ScriptedInputBackend([b'a', UP])
+    assert [backend.read_key(0), backend.read_key(0), backend.read_key(0)] == [b'a', UP, None]
+    threading.Timer(0.01, backend.feed, args=(ENTER,)).start()
+    assert backend.read_key(1) == ENTER
+    backend.wake()
+    assert backend.read_key(1) is None
+
+
+class FixedScreen(Screen):
+    def __init__(self, columns: int = 20, rows: int = 10) -> None:
+        super().__init__(io.StringIO())
+        self.columns = columns
+        self.rows = rows
+
+    def size(self) -> Tuple[int, int]:
+        return self.columns, self.rows
+
+    def frame(self, lines):
+        self.stream.seek(0)
+        self.stream.truncate()
+        self.render(lines)
+        return self.stream.getvalue()
+
+
+def test_first_frame_clears_the_screen():
+    screen = FixedScreen()
+    assert screen.frame(['one', 'two']) == CLEAR_SCREEN + "one\ntwo\n"
+
+
+def test_only_changed_lines_are_redrawn():
+    screen = FixedScreen()
+    screen.frame(['one', 'two', 'three'])
+    assert screen.frame(['one', 'TWO', 'three']) == "\033[2;1H\033[2KTWO\033[4;1H\033[J"
+    assert screen.frame(['one', 'TWO', 'three']) == "\033[4;1H\033[J"
+
+
+def test_shorter_frames_erase_the_rest_of_the_screen():
+    screen = FixedScreen()
+    screen.frame(['one', 'two', 'three'])
+    assert screen.frame(['one']) == "\033[2;1H\033[J"
+
+
+def test_wrapped_lines_clear_every_row_they_cover():
+    screen = FixedScreen(columns=4)
+    screen.frame(['ab', 'cd'])
+    assert screen.frame(['abcdefgh', 'cd']) == "\033[2;1H\033[2K\033[1;1H\033[2Kabcdefgh\033[3;1H\033[2Kcd\033[4;1H\033[J"
+
+
+def test_colour_codes_do_not_count_towards_the_width():
+    screen = FixedScreen(columns=3)
+    assert visible_width('\033[31mred\033[0m') == 3
+    screen.frame(['\033[31mred\033[0m', 'x'])
+    assert screen.frame(['\033[31mred\033[0m', 'y']) == "\033[2;1H\033[2Ky\033[3;1H\033[J"
+
+
+def test_frames_taller_than_the_terminal_and_invalidation_redraw_everything():
+    screen = FixedScreen(rows=2)
+    screen.frame(['a'])
+    assert screen.frame(['a', 'b', 'c']).startswith(CLEAR_SCREEN)
+    assert screen.frame(['a']).startswith(CLEAR_SCREEN)
+    screen.frame(['a'])
+    screen.invalidate()
+    assert screen.frame(['a']) == CLEAR_SCREEN + "a\n"
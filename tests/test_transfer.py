@@ -0,0 +1,107 @@
+import os
+import stat
+
+import pytest
+
+from adb_client import AdbHostClient
+from transfer import TransferEngine, TransferReport, parse_transfer, process_transfer
+
+
+@pytest.fixture
+def client(server):
+    adb = AdbHostClient()
+    try:
+        yield adb
+    finally:
+        adb.close()
+
+
+def make_tree(root, files):
+    for relative, data in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def device_file(server, path):
+    return os.path.join(server.device_root('FAKE0000'), path.lstrip('/'))
+
+
+def test_parse_transfer_accepts_quoted_paths():
+    assert parse_transfer("push-tree 'my dir' /sdcard/x") == ('push-tree', 'my dir', '/sdcard/x')
+    assert parse_transfer("pull-tree /sdcard/x") is None
+    assert parse_transfer("push-tree 'unterminated /sdcard") is None
+
+
+def test_push_copies_the_tree_then_skips_matching_files(server, client, tmp_path):
+    make_tree(tmp_path / 'src', {'a.txt': b'alpha', 'sub/b.bin': b'\x00' * 3000})
+    report = TransferEngine(client, 'FAKE0000').run('push-tree', str(tmp_path / 'src'), '/sdcard/dst')
+    assert report.ok and (report.files, report.copied, report.skipped) == (2, 2, 0)
+    with open(device_file(server, '/sdcard/dst/sub/b.bin'), 'rb') as f:
+        assert f.read() == b'\x00' * 3000
+
+    (tmp_path / 'src' / 'a.txt').write_bytes(b'ALPHA')
+    report = TransferEngine(client, 'FAKE0000').run('push-tree', str(tmp_path / 'src'), '/sdcard/dst')
+    assert (report.copied, report.skipped, report.bytes) == (1, 1, 5)
+
+
+def test_plan_push_resends_partial_remote_files_in_full(server, client, tmp_path):
+    make_tree(tmp_path / 'src', {'big.bin': b'0123456789'})
+    os.makedirs(device_file(server, '/sdcard/dst'))
+    with open(device_file(server, '/sdcard/dst/big.bin'), 'wb') as f:
+        f.write(b'01234')
+    report = TransferReport('push-tree', str(tmp_path / 'src'), '/sdcard/dst')
+    items = TransferEngine(client, 'FAKE0000').plan_push(str(tmp_path / 'src'), '/sdcard/dst', report)
+    assert [(item.relative, item.offset) for item in items] == [('big.bin', 0)]
+
+
+def test_pull_resumes_a_partial_local_file(server, client, tmp_path):
+    os.makedirs(device_file(server, '/sdcard/src/sub'))
+    for path, data in (('/sdcard/src/log.txt', b'line one\nline two\n'), ('/sdcard/src/sub/x', b'x')):
+        with open(device_file(server, path), 'wb') as f:
+            f.write(data)
+    make_tree(tmp_path / 'dst', {'log.txt': b'line one\n', 'sub/x': b'x'})
+    report = TransferEngine(client, 'FAKE0000').run('pull-tree', '/sdcard/src', str(tmp_path / 'dst'))
+    assert report.ok and (report.resumed, report.skipped, report.copied) == (1, 1, 0)
+    assert (tmp_path / 'dst' / 'log.txt').read_bytes() == b'line one\nline two\n'
+
+
+def test_pull_without_shell_v2_copies_partial_files_again(server, client, tmp_path):
+    client._features['FAKE0000'] = ['cmd']
+    os.makedirs(device_file(server, '/sdcard/src'))
+    with open(device_file(server, '/sdcard/src/log.txt'), 'wb') as f:
+        f.write(b'line one\nline two\n')
+    make_tree(tmp_path / 'dst', {'log.txt': b'line one\n'})
+    report = TransferEngine(client, 'FAKE0000').run('pull-tree', '/sdcard/src', str(tmp_path / 'dst'))
+    assert report.ok and (report.resumed, report.copied) == (0, 1)
+    assert (tmp_path / 'dst' / 'log.txt').read_bytes() == b'line one\nline two\n'
+
+
+def test_pull_of_a_missing_tree_fails(server, client, tmp_path):
+    report = TransferEngine(client, 'FAKE0000').run('pull-tree', '/sdcard/none', str(tmp_path / 'dst'))
+    assert not report.ok and 'No files found' in report.failed[0][1]
+
+
+def fake_adb_binary(tmp_path, output, code=0):
+    script = tmp_path / 'adb'
+    script.write_text(f"#!/bin/sh\necho \"$@\" >> {tmp_path / 'calls'}\ncase \"$3\" in\n"
+                      f"  shell) echo entry;;\n  *) printf '%s\\n' '{output}'; exit {code};;\nesac\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_process_transfer_parses_the_adb_summary(tmp_path):
+    make_tree(tmp_path / 'src', {'a': b'a', 'b': b'b'})
+    adb = fake_adb_binary(tmp_path, "/sdcard/dst/: 2 files pushed, 1 skipped. 0.1 MB/s (2048 bytes in 0.020s)")
+    report = process_transfer(adb, 'FAKE0000', 'push-tree', str(tmp_path / 'src'), '/sdcard/dst')
+    assert report.ok and (report.copied, report.skipped, report.files, report.bytes) == (2, 1, 3, 2048)
+    calls = (tmp_path / 'calls').read_text().splitlines()
+    assert calls[0] == "-s FAKE0000 shell mkdir -p /sdcard/dst"
+    assert calls[1].startswith("-s FAKE0000 push --sync ") and calls[1].endswith(" /sdcard/dst")
+
+
+def test_process_transfer_reports_adb_failures(tmp_path):
+    adb = fake_adb_binary(tmp_path, "adb: error: failed to copy", code=1)
+    report = process_transfer(adb, 'FAKE0000', 'pull-tree', '/sdcard/src', str(tmp_path / 'dst'))
+    assert report.failed == [('/sdcard/src', "adb: error: failed to copy")]
+    assert (tmp_path / 'calls').read_text().splitlines()[1] == f"-s FAKE0000 pull /sdcard/src/entry {tmp_path / 'dst'}"